@@ -0,0 +1,460 @@
+"""
+Local HTTP/JSON API for web and mobile clients.
+
+The server speaks a small subset of HTTP/1.1 (keep-alive, Content-Length
+bodies) on asyncio streams, so it needs nothing beyond the standard
+library. Handlers never touch SQLite on the event loop: every data call
+runs on a pool of DB_WORKERS threads, each with its own pooled
+connection (see database.py), and requests beyond that wait their turn
+instead of opening more connections.
+
+Card listings are keyset-paginated by card id and score history by
+(timestamp, id), so a page costs the same however deep it is. Listings
+carry an ETag derived from the card change log (see deck_cache.py);
+clients that send it back in If-None-Match get 304 Not Modified until a
+card changes. GET /metrics reports request counts and latency
+percentiles per route, plus call timings when instrumentation is on
+(see perf.py).
+
+Like the other commands, the server works on one user's deck, chosen
+with --user/--deck before the command; run one server per deck.
+
+  GET    /cards?category=&difficulty=&limit=&after=   page of cards; next page via "next"
+  POST   /cards                                        {question, answer, category, difficulty}
+  GET    /cards/<id>   PUT /cards/<id>   DELETE /cards/<id>
+  GET    /categories                                   [{category, cards}]
+  POST   /quiz                                         {category, difficulty, size}: first question
+  POST   /quiz/<session>/answer                        {answer}: result and next question
+  GET    /scores?limit=&before=                        page of scores, newest first
+  GET    /leaderboard   GET /leaderboard/class   GET /stats   GET /metrics
+
+Usage:
+    python main.py serve [--host 127.0.0.1] [--port 8765] [--workers 4]
+    python main.py --user alice --deck Biology serve
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+import uuid
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qsl
+
+import flashcard_db
+import perf
+import profiles
+import score_logger
+from quiz_engine import QuizSession, QuizRecorder, select_cards, SESSION_SIZE
+
+HOST = "127.0.0.1"
+PORT = 8765
+DB_WORKERS = 4
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_SESSION_SIZE = 200
+MAX_BODY = 64 * 1024
+SESSION_TTL = 30 * 60       # seconds an unanswered quiz is kept
+LATENCY_SAMPLES = 4096      # most recent request latencies kept per route
+PERCENTILES = (50, 90, 99)
+
+# Path parameters in route templates.
+ROUTE_PARAMS = {"<id>": r"(\d+)", "<session>": r"(\w+)"}
+
+Request = namedtuple("Request", ["method", "path", "query", "headers", "body", "keep_alive"])
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+async def read_request(reader):
+    """Read one request off the stream; returns None when the client closed it."""
+    line = await reader.readline()
+    if not line.strip():
+        return None
+    try:
+        method, target, version = line.decode("latin-1").split()
+    except ValueError:
+        raise HTTPError(400, "Malformed request line") from None
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise HTTPError(400, "Bad Content-Length") from None
+    if length > MAX_BODY:
+        raise HTTPError(413)
+    body = await reader.readexactly(length) if length else b""
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    url = urlsplit(target)
+    return Request(method.upper(), url.path, dict(parse_qsl(url.query)), headers, body, keep_alive)
+
+
+def encode_response(status, payload=None, headers=None, keep_alive=True):
+    body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+    lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}",
+             f"Content-Length: {len(body)}",
+             f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+    if payload is not None:
+        lines.append("Content-Type: application/json")
+    lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body
+
+
+# ------------- Request parameters -------------
+
+def _int_param(query, name, default, low=1, high=None):
+    try:
+        value = int(query.get(name, default))
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be an integer") from None
+    if value < low:
+        raise HTTPError(400, f"{name} must be at least {low}")
+    return value if high is None else min(value, high)
+
+
+def _difficulty_param(value):
+    """A difficulty filter or field as its canonical name; None if not given."""
+    if value is None or value == "":
+        return None
+    try:
+        return flashcard_db.DIFFICULTIES[flashcard_db.difficulty_code(value)]
+    except ValueError as e:
+        raise HTTPError(400, str(e)) from None
+
+
+def _json_body(request):
+    try:
+        data = json.loads(request.body or b"{}")
+    except ValueError:
+        raise HTTPError(400, "Body must be JSON") from None
+    if not isinstance(data, dict):
+        raise HTTPError(400, "Body must be a JSON object")
+    return data
+
+
+def _card_fields(data):
+    question = str(data.get("question") or "").strip()
+    answer = str(data.get("answer") or "").strip()
+    if not question or not answer:
+        raise HTTPError(400, "question and answer are required")
+    category = str(data.get("category") or "General").strip()
+    return question, answer, category, _difficulty_param(data.get("difficulty")) or "Easy"
+
+
+def _question(session, card):
+    if card is None:
+        return None
+    return {"id": card["id"], "question": card["question"], "category": card["category"],
+            "difficulty": card["difficulty"], "number": session.index + 1, "of": session.total,
+            "time_limit": session.time_limit}
+
+
+# ------------- Metrics -------------
+
+class RouteMetrics:
+    """Request count, error count and a window of recent latencies for one route."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, seconds, status):
+        self.count += 1
+        self.errors += status >= 500
+        self.latencies.append(seconds)
+
+    def summary(self):
+        ordered = sorted(self.latencies)
+        result = {"requests": self.count, "errors": self.errors}
+        for p in PERCENTILES:
+            value = ordered[min(len(ordered) - 1, len(ordered) * p // 100)] if ordered else None
+            result[f"p{p}_ms"] = None if value is None else round(value * 1000, 3)
+        return result
+
+
+# ------------- Server -------------
+
+class ApiServer:
+    def __init__(self, workers=DB_WORKERS):
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="api-db")
+        self.sessions = {}  # session id -> [QuizSession, last used, asyncio.Lock]
+        self.metrics = {}
+        self.started = time.time()
+        self.routes = [
+            ("GET", "/cards", self.list_cards),
+            ("POST", "/cards", self.add_card),
+            ("GET", "/cards/<id>", self.get_card),
+            ("PUT", "/cards/<id>", self.update_card),
+            ("DELETE", "/cards/<id>", self.delete_card),
+            ("GET", "/categories", self.categories),
+            ("POST", "/quiz", self.start_quiz),
+            ("POST", "/quiz/<session>/answer", self.answer_quiz),
+            ("GET", "/scores", self.scores),
+            ("GET", "/leaderboard", self.leaderboard),
+            ("GET", "/leaderboard/class", self.class_leaderboard),
+            ("GET", "/stats", self.stats),
+            ("GET", "/metrics", self.get_metrics),
+        ]
+        self.routes = [(method, template, re.compile(self._regex(template)), handler)
+                       for method, template, handler in self.routes]
+
+    @staticmethod
+    def _regex(template):
+        pattern = re.escape(template)
+        for param, regex in ROUTE_PARAMS.items():
+            pattern = pattern.replace(re.escape(param), regex)
+        return pattern + "/?"
+
+    def db(self, fn, *args):
+        """Run a blocking data call on the DB worker pool."""
+        return asyncio.get_running_loop().run_in_executor(self.pool, partial(fn, *args))
+
+    def route(self, request):
+        """Return (route name for metrics, handler, path arguments)."""
+        allowed = False
+        for method, template, regex, handler in self.routes:
+            match = regex.fullmatch(request.path)
+            if match:
+                allowed = True
+                if method == request.method:
+                    return f"{method} {template}", handler, match.groups()
+        raise HTTPError(405 if allowed else 404)
+
+    async def dispatch(self, request):
+        """Handle one request; returns (status, payload, headers)."""
+        start = time.perf_counter()
+        name = "unrouted"
+        try:
+            name, handler, args = self.route(request)
+            status, payload, headers = await handler(request, *args)
+        except HTTPError as e:
+            status, payload, headers = e.status, {"error": str(e)}, None
+        except Exception as e:
+            status, payload, headers = 500, {"error": f"{type(e).__name__}: {e}"}, None
+        self.metrics.setdefault(name, RouteMetrics()).record(time.perf_counter() - start, status)
+        return status, payload, headers
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    writer.write(encode_response(e.status, {"error": str(e)}, keep_alive=False))
+                    break
+                if request is None:
+                    break
+                status, payload, headers = await self.dispatch(request)
+                writer.write(encode_response(status, payload, headers, request.keep_alive))
+                await writer.drain()
+                if not request.keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    # ------------- Cards -------------
+
+    async def _etag(self, request):
+        """
+        (etag, headers) of a deck listing; etag is None when the client's
+        copy is still current and a 304 should be sent.
+        """
+        etag = '"{}-{}-{}"'.format(*profiles.owner(), await self.db(flashcard_db.deck_version))
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if etag in [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]:
+            return None, headers
+        return etag, headers
+
+    async def list_cards(self, request):
+        query = request.query
+        limit = _int_param(query, "limit", PAGE_SIZE, high=MAX_PAGE_SIZE)
+        after = _int_param(query, "after", 0, low=0) if "after" in query else None
+        etag, headers = await self._etag(request)
+        if etag is None:
+            return 304, None, headers
+        difficulty = _difficulty_param(query.get("difficulty"))
+        cards = await self.db(flashcard_db.query_flashcards, query.get("category"), difficulty, limit, 0, after)
+        cards = [card.to_dict() for card in cards]
+        next_after = cards[-1]["id"] if len(cards) == limit else None
+        return 200, {"cards": cards, "next": next_after}, headers
+
+    async def _owned_card(self, card_id):
+        cards = await self.db(flashcard_db.get_flashcards_by_ids, [int(card_id)])
+        if not cards:
+            raise HTTPError(404, f"No card #{card_id}")
+        return cards[0]
+
+    async def get_card(self, request, card_id):
+        return 200, await self._owned_card(card_id), None
+
+    async def add_card(self, request):
+        question, answer, category, difficulty = _card_fields(_json_body(request))
+        card_id = await self.db(flashcard_db.add_flashcard_db, question, answer, category, difficulty)
+        if card_id is None:
+            raise HTTPError(409, "This card is already in the deck.")
+        card = await self._owned_card(card_id)
+        return 201, card, {"Location": f"/cards/{card_id}"}
+
+    async def update_card(self, request, card_id):
+        fields = _card_fields(_json_body(request))
+        await self._owned_card(card_id)
+        try:
+            await self.db(flashcard_db.update_flashcard, int(card_id), *fields)
+        except ValueError as e:
+            raise HTTPError(409, str(e)) from None
+        return 200, await self._owned_card(card_id), None
+
+    async def delete_card(self, request, card_id):
+        await self._owned_card(card_id)
+        await self.db(flashcard_db.delete_flashcard, int(card_id))
+        return 204, None, None
+
+    async def categories(self, request):
+        etag, headers = await self._etag(request)
+        if etag is None:
+            return 304, None, headers
+        counts = await self.db(flashcard_db.get_category_counts)
+        return 200, [{"category": name, "cards": n} for name, n in counts], headers
+
+    # ------------- Quizzes -------------
+
+    def _expire_sessions(self):
+        cutoff = time.monotonic() - SESSION_TTL
+        for sid in [sid for sid, entry in self.sessions.items() if entry[1] < cutoff]:
+            del self.sessions[sid]
+
+    async def start_quiz(self, request):
+        data = _json_body(request)
+        category, difficulty = data.get("category") or None, _difficulty_param(data.get("difficulty"))
+        size = _int_param({"size": data.get("size", SESSION_SIZE)}, "size", SESSION_SIZE, high=MAX_SESSION_SIZE)
+
+        def start():
+            session = QuizSession(select_cards(category, difficulty, size), difficulty or "All",
+                                  category or "All", recorder=QuizRecorder())
+            return session, session.next_card()
+
+        self._expire_sessions()
+        session, card = await self.db(start)
+        if card is None:
+            raise HTTPError(404, "No flashcards found for the selected filters.")
+        sid = uuid.uuid4().hex
+        self.sessions[sid] = [session, time.monotonic(), asyncio.Lock()]
+        return 201, {"session": sid, "question": _question(session, card)}, None
+
+    async def answer_quiz(self, request, sid):
+        entry = self.sessions.get(sid)
+        if entry is None:
+            raise HTTPError(404, "No such quiz session (it may have expired).")
+        given = _json_body(request).get("answer")
+        session, _, lock = entry
+        async with lock:  # one answer at a time per session
+            if session.finished:
+                raise HTTPError(409, "The quiz is already over.")
+
+            def answer():
+                result = session.answer(None if given is None else str(given))
+                card = session.next_card()
+                return result, card, session.finish() if card is None else None
+
+            result, card, final = await self.db(answer)
+            entry[1] = time.monotonic()
+        payload = {"correct": result.correct, "timed_out": result.timed_out,
+                   "answer": result.card["answer"], "next": _question(session, card)}
+        if final is not None:
+            self.sessions.pop(sid, None)
+            payload["score"], payload["total"] = final
+        return 200, payload, None
+
+    # ------------- Scores -------------
+
+    async def scores(self, request):
+        limit = _int_param(request.query, "limit", score_logger.HISTORY_PAGE_SIZE, high=MAX_PAGE_SIZE)
+        before = None
+        if request.query.get("before"):
+            timestamp, _, entry_id = request.query["before"].rpartition("|")
+            if not timestamp or not entry_id.isdigit():
+                raise HTTPError(400, "before must be a 'next' value from a previous page")
+            before = {"timestamp": timestamp, "id": int(entry_id)}
+        entries = await self.db(score_logger.get_score_history, limit, before)
+        next_before = f"{entries[-1]['timestamp']}|{entries[-1]['id']}" if len(entries) == limit else None
+        return 200, {"scores": entries, "next": next_before}, None
+
+    async def leaderboard(self, request):
+        rows = await self.db(score_logger.get_leaderboard)
+        return 200, [{"difficulty": difficulty, "high_score": score} for difficulty, score in rows], None
+
+    async def class_leaderboard(self, request):
+        rows = await self.db(profiles.class_leaderboard, request.query.get("difficulty"))
+        return 200, [{"user": user, "difficulty": difficulty, "high_score": score}
+                     for user, difficulty, score in rows], None
+
+    async def stats(self, request):
+        def collect():
+            return flashcard_db.count_flashcards(), score_logger.get_difficulty_stats()
+        cards, rows = await self.db(collect)
+        return 200, {
+            "cards": cards,
+            "difficulties": [{"difficulty": difficulty, "correct": correct, "questions": total}
+                             for difficulty, correct, total in rows],
+        }, None
+
+    async def get_metrics(self, request):
+        user, deck = profiles.current()
+        return 200, {
+            "user": user, "deck": deck,
+            "uptime": round(time.time() - self.started, 1),
+            "quiz_sessions": len(self.sessions),
+            "routes": {name: metrics.summary() for name, metrics in sorted(self.metrics.items())},
+            "perf": perf.snapshot() if perf.ENABLED else None,
+        }, None
+
+
+async def serve(host=HOST, port=PORT, workers=DB_WORKERS, ready=None):
+    """Run the API until cancelled; `ready(port)` is called once it is listening."""
+    api = ApiServer(workers)
+    server = await asyncio.start_server(api.handle_connection, host, port)
+    try:
+        if ready:
+            ready(server.sockets[0].getsockname()[1])
+        async with server:
+            await server.serve_forever()
+    finally:
+        api.pool.shutdown(wait=True)
+        score_logger.flush_review_events()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py serve", description="Serve the deck over a local HTTP/JSON API.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT, help="0 picks a free port")
+    parser.add_argument("--workers", type=int, default=DB_WORKERS, help="database worker threads")
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    user, deck = profiles.current()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, ready=lambda port: print(
+            f"🌐 Serving {user}'s {deck} deck on http://{args.host}:{port} (Ctrl+C to stop)", flush=True)))
+    except KeyboardInterrupt:
+        print("\n👋 Stopped.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""
+Image and audio attachments on cards.
+
+Attachments are rows of the attachments table in flashcards.db (see
+migrations.py), one file each, shown on the question or the answer side
+of their card. Listing queries never select the data column, so browsing
+or quizzing reads no media that isn't shown. The bytes go in and out in
+CHUNK_SIZE pieces through incremental blob I/O (Connection.blobopen):
+adding a file reserves a zeroblob of its size and streams into it, and
+exporting streams back out, so a long recording is never held in memory.
+Deleting a card deletes its attachments (a trigger does it).
+
+Usage:
+    python main.py attach add 42 heart.png [--side answer]
+    python main.py attach list 42
+    python main.py attach export 7 heart.png
+    python main.py attach remove 7
+"""
+import argparse
+import mimetypes
+import os
+import tempfile
+
+import flashcard_db
+import perf
+from database import get_connection, transaction
+from profiles import owner
+
+CHUNK_SIZE = 64 * 1024
+MAX_SIZE = 50 * 1024 * 1024
+SIDES = ("question", "answer")
+KINDS = ("image", "audio")
+
+COLUMNS = "a.id, a.card_id, a.side, a.kind, a.name, a.size"
+# Attachments belong to the deck of their card.
+IN_DECK = "JOIN flashcards f ON f.id = a.card_id AND f.user_id = ? AND f.deck_id = ?"
+INSERT_SQL = """
+    INSERT INTO attachments (card_id, side, kind, name, size, data)
+    SELECT id, ?, ?, ?, ?, zeroblob(?) FROM flashcards WHERE id = ? AND user_id = ? AND deck_id = ?
+"""
+SELECT_BY_ID_SQL = f"SELECT {COLUMNS} FROM attachments a {IN_DECK} WHERE a.id = ?"
+SELECT_BY_CARDS_SQL = f"SELECT {COLUMNS} FROM attachments a {IN_DECK} WHERE a.card_id IN ({{marks}}) ORDER BY a.id"
+DELETE_SQL = """
+    DELETE FROM attachments
+    WHERE id = ? AND card_id IN (SELECT id FROM flashcards WHERE user_id = ? AND deck_id = ?)
+"""
+
+
+def kind_of(path):
+    """"image" or "audio" from the file name; ValueError for anything else."""
+    mime = mimetypes.guess_type(path)[0] or ""
+    kind = mime.split("/")[0]
+    if kind not in KINDS:
+        raise ValueError(f"{os.path.basename(path)}: only image and audio files can be attached")
+    return kind
+
+
+def row_to_attachment(row):
+    return {"id": row[0], "card_id": row[1], "side": row[2], "kind": row[3], "name": row[4], "size": row[5]}
+
+
+def add_attachment(card_id, path, side="question"):
+    """Attach the file at `path` to a card of the current deck; returns the attachment id."""
+    if side not in SIDES:
+        raise ValueError(f"side must be one of {', '.join(SIDES)}")
+    kind = kind_of(path)
+    size = os.path.getsize(path)
+    if size > MAX_SIZE:
+        raise ValueError(f"{os.path.basename(path)} is larger than {MAX_SIZE // 2 ** 20} MB")
+    with open(path, "rb") as f, transaction(flashcard_db.DB_NAME) as conn:
+        cursor = conn.execute(INSERT_SQL, (side, kind, os.path.basename(path), size, size, card_id, *owner()))
+        if cursor.rowcount == 0:
+            raise ValueError(f"No card #{card_id} in this deck")
+        attachment_id = cursor.lastrowid
+        with conn.blobopen("attachments", "data", attachment_id) as blob:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+                blob.write(chunk)
+    return attachment_id
+
+
+def get_attachment(attachment_id):
+    """Metadata of one attachment of the current deck, or None."""
+    row = get_connection(flashcard_db.DB_NAME).execute(SELECT_BY_ID_SQL, (*owner(), attachment_id)).fetchone()
+    return row and row_to_attachment(row)
+
+
+def attachments_for(card_ids):
+    """{card_id: [attachment metadata]} for the cards that have any; no data is read."""
+    if not card_ids:
+        return {}
+    sql = SELECT_BY_CARDS_SQL.format(marks=", ".join("?" * len(card_ids)))
+    found = {}
+    for row in get_connection(flashcard_db.DB_NAME).execute(sql, [*owner(), *card_ids]):
+        found.setdefault(row[1], []).append(row_to_attachment(row))
+    return found
+
+
+def list_attachments(card_id, side=None):
+    """Metadata of a card's attachments (of one side, if given), oldest first."""
+    return [a for a in attachments_for([card_id]).get(card_id, []) if side in (None, a["side"])]
+
+
+def _open_blob(attachment_id):
+    if get_attachment(attachment_id) is None:
+        raise ValueError(f"No attachment #{attachment_id} in this deck")
+    conn = get_connection(flashcard_db.DB_NAME)
+    return conn.blobopen("attachments", "data", attachment_id, readonly=True)
+
+
+def read_attachment(attachment_id):
+    """The whole file as bytes; for thumbnails and other small files."""
+    with _open_blob(attachment_id) as blob:
+        return blob.read()
+
+
+def iter_attachment(attachment_id, chunk_size=CHUNK_SIZE):
+    """Yield the file in chunks of `chunk_size` bytes."""
+    with _open_blob(attachment_id) as blob:
+        while True:
+            chunk = blob.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+
+def copy_attachment(attachment_id, dest):
+    """
+    Stream an attachment into the file `dest`; returns the bytes written.
+    It is written to a temporary file beside `dest` first, so a failed
+    copy never leaves `dest` truncated.
+    """
+    written = 0
+    with _open_blob(attachment_id) as blob:
+        fd, tmp = tempfile.mkstemp(prefix=".flashcard-", dir=os.path.dirname(os.path.abspath(dest)))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: blob.read(CHUNK_SIZE), b""):
+                    f.write(chunk)
+                    written += len(chunk)
+            os.replace(tmp, dest)
+        except BaseException:
+            os.remove(tmp)
+            raise
+    return written
+
+
+def extract_attachment(attachment_id):
+    """Copy an attachment to a temporary file (for a media player); returns its path."""
+    attachment = get_attachment(attachment_id)
+    if attachment is None:
+        raise ValueError(f"No attachment #{attachment_id} in this deck")
+    fd, path = tempfile.mkstemp(prefix="flashcard-", suffix=os.path.splitext(attachment["name"])[1])
+    os.close(fd)
+    copy_attachment(attachment_id, path)
+    return path
+
+
+def delete_attachment(attachment_id):
+    """Returns True if the attachment existed."""
+    with transaction(flashcard_db.DB_NAME) as conn:
+        return conn.execute(DELETE_SQL, (attachment_id, *owner())).rowcount > 0
+
+
+def _size(n):
+    return f"{n / 2 ** 20:.1f} MB" if n >= 2 ** 20 else f"{n / 1024:.0f} KB"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py attach", description="Manage image and audio attachments.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="attach a file to a card")
+    add.add_argument("card_id", type=int)
+    add.add_argument("path")
+    add.add_argument("--side", choices=SIDES, default="question", help="show it with the question or the answer")
+    show = commands.add_parser("list", help="list a card's attachments")
+    show.add_argument("card_id", type=int)
+    export = commands.add_parser("export", help="copy an attachment to a file")
+    export.add_argument("attachment_id", type=int)
+    export.add_argument("dest")
+    remove = commands.add_parser("remove", help="delete an attachment")
+    remove.add_argument("attachment_id", type=int)
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    try:
+        if args.command == "add":
+            attachment_id = add_attachment(args.card_id, args.path, args.side)
+            print(f"✅ Attached {os.path.basename(args.path)} to card #{args.card_id} (attachment #{attachment_id})")
+        elif args.command == "list":
+            found = list_attachments(args.card_id)
+            if not found:
+                print(f"Card #{args.card_id} has no attachments.")
+            for a in found:
+                icon = "🖼️" if a["kind"] == "image" else "🔊"
+                print(f"{icon} #{a['id']:<6} {a['side']:<9} {_size(a['size']):>9}  {a['name']}")
+        elif args.command == "export":
+            written = copy_attachment(args.attachment_id, args.dest)
+            print(f"✅ Wrote {_size(written)} to {args.dest}")
+        elif delete_attachment(args.attachment_id):
+            print(f"🗑️ Deleted attachment #{args.attachment_id}")
+        else:
+            print(f"No attachment #{args.attachment_id} in this deck.")
+    except (ValueError, OSError) as e:
+        parser.exit(1, f"❌ {e}\n")
+
+
+# Call counts and latencies when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("kind_of", "row_to_attachment"))
+
+if __name__ == "__main__":
+    main()
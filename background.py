@@ -0,0 +1,178 @@
+"""
+Background execution for the Tk GUI.
+
+Database and file work is submitted to a small thread pool so the Tk main
+loop never blocks on SQLite or disk I/O. Each submission returns a Task
+wrapping a concurrent.futures.Future. Results, errors and progress are
+never delivered on the worker thread: finished tasks are queued and a
+Tk after() poller hands them to the callbacks on the main loop, so
+callbacks may touch widgets freely.
+
+With instrumentation on (see perf.py), every task is timed from
+submission until its callbacks have run, under "gui.<function>".
+"""
+import queue
+import threading
+import time
+import tkinter as tk
+from concurrent.futures import ThreadPoolExecutor
+from tkinter import messagebox
+
+import perf
+
+POLL_MS = 15
+MAX_WORKERS = 4
+
+_executor = None
+
+
+class TaskCancelled(Exception):
+    """Raised inside a running task when it reports progress after cancel()."""
+
+
+class Task:
+    def __init__(self, name=None):
+        self.future = None
+        self.progress = None
+        self.name = name
+        self.started = time.perf_counter() if perf.ENABLED else None
+        self._cancelled = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Stop the task; none of its callbacks will run afterwards."""
+        self._cancelled.set()
+        if self.future is not None:
+            self.future.cancel()
+
+    def report(self, value):
+        """Progress hook passed to the task function (runs on the worker)."""
+        if self.cancelled:
+            raise TaskCancelled()
+        self.progress = value
+
+
+class TkExecutor:
+    def __init__(self, root, max_workers=MAX_WORKERS):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gui-worker")
+        self._finished = queue.Queue()
+        self._active = {}
+        self._idle = []
+        self._polling = False
+
+    def submit(self, fn, *args, on_success=None, on_error=None, on_progress=None, loading=None, **kwargs):
+        """
+        Run fn(*args, **kwargs) on a worker thread.
+
+        on_success(result) / on_error(exception) run on the Tk thread.
+        If on_progress is given, fn receives progress=task.report and
+        on_progress(value) is called on the Tk thread as values arrive.
+        If loading is a widget, a "Loading..." indicator is shown over it
+        until the task finishes, and callbacks are skipped if it has been
+        destroyed by then.
+        """
+        task = Task(getattr(fn, "__qualname__", repr(fn)))
+        if on_progress is not None:
+            kwargs["progress"] = task.report
+        indicator = _show_loading(loading) if loading is not None else None
+        self._active[task] = (on_success, on_error, on_progress, loading, indicator)
+        task.future = self._pool.submit(fn, *args, **kwargs)
+        task.future.add_done_callback(lambda _: self._finished.put(task))
+        if not self._polling:
+            self._polling = True
+            self.root.after(POLL_MS, self._poll)
+        return task
+
+    def _poll(self):
+        while True:
+            try:
+                task = self._finished.get_nowait()
+            except queue.Empty:
+                break
+            self._deliver(task)
+        for task, (_, _, on_progress, owner, _) in list(self._active.items()):
+            if on_progress is not None and task.progress is not None and _alive(owner) and not task.cancelled:
+                on_progress(task.progress)
+        if self._active:
+            self.root.after(POLL_MS, self._poll)
+        else:
+            self._polling = False
+            idle, self._idle = self._idle, []
+            for callback in idle:
+                callback()
+
+    def _deliver(self, task):
+        try:
+            self._run_callbacks(task)
+        finally:
+            if task.started is not None:
+                perf.record(f"gui.{task.name}", time.perf_counter() - task.started)
+
+    def _run_callbacks(self, task):
+        on_success, on_error, _, owner, indicator = self._active.pop(task)
+        if indicator is not None and _alive(indicator):
+            indicator.destroy()
+        if task.cancelled or task.future.cancelled() or not _alive(owner):
+            return
+        error = task.future.exception()
+        if isinstance(error, TaskCancelled):
+            return
+        if error is not None:
+            (on_error or _show_error)(error)
+        elif on_success is not None:
+            on_success(task.future.result())
+
+    def when_idle(self, callback):
+        """Call callback() on the Tk thread as soon as no task is running."""
+        if self._active:
+            self._idle.append(callback)
+        else:
+            callback()
+
+    def shutdown(self):
+        for task in list(self._active):
+            task.cancel()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _alive(widget):
+    try:
+        return widget is None or bool(widget.winfo_exists())
+    except tk.TclError:
+        return False
+
+
+def _show_loading(widget):
+    label = tk.Label(widget, text="⏳ Loading...", relief="groove", padx=10, pady=5)
+    label.place(relx=0.5, rely=0.5, anchor="center")
+    return label
+
+
+def _show_error(error):
+    messagebox.showerror("Error", str(error))
+
+
+def init(root, max_workers=MAX_WORKERS):
+    """Create the GUI executor bound to `root`; call once at startup."""
+    global _executor
+    _executor = TkExecutor(root, max_workers)
+    return _executor
+
+
+def run_async(fn, *args, **kwargs):
+    """Submit work to the GUI executor; see TkExecutor.submit."""
+    return _executor.submit(fn, *args, **kwargs)
+
+
+def when_idle(callback):
+    """See TkExecutor.when_idle."""
+    _executor.when_idle(callback)
+
+
+def shutdown():
+    if _executor is not None:
+        _executor.shutdown()
@@ -0,0 +1,177 @@
+"""
+Load-test the HTTP/JSON API (api.py) with concurrent keep-alive clients.
+
+By default a server is started in a subprocess on a synthetic deck in a
+temporary directory; pass --url to test a running instance instead (its
+deck and scores will be written to). Each client loops over a mixed
+workload: card pages walked with `after`, conditional GETs with the last
+ETag, single cards, a short quiz, score history and the leaderboard.
+Latency percentiles per route and overall throughput are printed, as
+seen by the clients.
+
+Run from the project root:
+    python -m benchmarks.bench_api [--clients 32] [--seconds 10] [--deck-size 20000]
+    python -m benchmarks.bench_api --url http://127.0.0.1:8765
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlsplit
+
+PERCENTILES = (50, 99)
+
+
+class Client:
+    """One keep-alive connection sending JSON requests."""
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def request(self, method, path, payload=None, headers=None):
+        """Returns (status, headers, parsed body or None)."""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = b"" if payload is None else json.dumps(payload).encode("utf-8")
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        status = int((await self.reader.readline()).split()[1])
+        response_headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            response_headers[name.strip().lower()] = value.strip()
+        data = await self.reader.readexactly(int(response_headers.get("content-length", 0)))
+        if response_headers.get("connection") == "close":
+            self.close()
+        return status, response_headers, json.loads(data) if data else None
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+
+async def timed(latencies, route, call):
+    start = time.perf_counter()
+    status, headers, data = await call
+    latencies.setdefault(route, []).append(time.perf_counter() - start)
+    if status >= 500:
+        raise RuntimeError(f"{route}: {status} {data}")
+    return status, headers, data
+
+
+async def run_client(host, port, deadline, seed, latencies, quiz_size):
+    rng = random.Random(seed)
+    client = Client(host, port)
+    after, etag, card_ids = None, None, []
+    try:
+        while time.perf_counter() < deadline:
+            kind = rng.random()
+            if kind < 0.35:
+                path = "/cards?limit=50" + (f"&after={after}" if after else "")
+                _, headers, data = await timed(latencies, "GET /cards", client.request("GET", path))
+                after = data["next"]
+                card_ids = [card["id"] for card in data["cards"]] or card_ids
+            elif kind < 0.5:
+                status, headers, _ = await timed(latencies, "GET /cards (If-None-Match)", client.request(
+                    "GET", "/cards?limit=50", headers={"If-None-Match": etag} if etag else None))
+                etag = headers.get("etag")
+            elif kind < 0.65 and card_ids:
+                await timed(latencies, "GET /cards/<id>", client.request("GET", f"/cards/{rng.choice(card_ids)}"))
+            elif kind < 0.8:
+                _, _, data = await timed(latencies, "POST /quiz", client.request("POST", "/quiz", {"size": quiz_size}))
+                sid = data and data.get("session")
+                question = data and data.get("question")
+                while sid and question:
+                    _, _, data = await timed(latencies, "POST /quiz/<id>/answer", client.request(
+                        "POST", f"/quiz/{sid}/answer", {"answer": str(rng.randint(1, 2000))}))
+                    question = data["next"]
+            elif kind < 0.9:
+                await timed(latencies, "GET /scores", client.request("GET", "/scores?limit=20"))
+            else:
+                await timed(latencies, "GET /leaderboard", client.request("GET", "/leaderboard"))
+    finally:
+        client.close()
+
+
+async def load(host, port, clients, seconds, quiz_size):
+    latencies = {}
+    start = time.perf_counter()
+    await asyncio.gather(*(run_client(host, port, start + seconds, seed, latencies, quiz_size)
+                           for seed in range(clients)))
+    return latencies, time.perf_counter() - start
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, len(ordered) * p // 100)]
+
+
+def report(latencies, elapsed, clients):
+    total = sum(len(values) for values in latencies.values())
+    print(f"{total:,} requests from {clients} clients in {elapsed:.1f}s: {total / elapsed:,.0f} requests/sec\n")
+    print(f"{'route':<30}{'requests':>10}" + "".join(f"{f'p{p} ms':>10}" for p in PERCENTILES))
+    everything = []
+    for route, values in sorted(latencies.items()):
+        ordered = sorted(values)
+        everything += values
+        print(f"{route:<30}{len(values):>10,}" + "".join(f"{_percentile(ordered, p) * 1000:>10.2f}" for p in PERCENTILES))
+    ordered = sorted(everything)
+    print(f"{'all':<30}{len(ordered):>10,}" + "".join(f"{_percentile(ordered, p) * 1000:>10.2f}" for p in PERCENTILES))
+
+
+def start_server(root, tmp, deck_size, workers):
+    """Build a synthetic deck in `tmp` and serve it; returns (process, port)."""
+    subprocess.run([sys.executable, "-c", f"import simulator; simulator.build_deck('flashcards.db', {deck_size})"],
+                   cwd=tmp, env=dict(os.environ, PYTHONPATH=root), check=True)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(root, "main.py"), "serve", "--port", "0", "--workers", str(workers)],
+        cwd=tmp, stdout=subprocess.PIPE, text=True, env=dict(os.environ, PYTHONPATH=root),
+    )
+    line = server.stdout.readline()
+    if "http://" not in line:
+        server.kill()
+        raise RuntimeError(f"server did not start: {line!r}")
+    return server, int(line.split("http://")[1].split()[0].rsplit(":", 1)[1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--url", help="test this running server instead of starting one")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent connections")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--deck-size", type=int, default=20000, help="cards in the synthetic deck")
+    parser.add_argument("--workers", type=int, default=4, help="DB worker threads of the started server")
+    parser.add_argument("--quiz-size", type=int, default=5, help="questions per quiz")
+    args = parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    if args.url:
+        url = urlsplit(args.url)
+        latencies, elapsed = asyncio.run(load(url.hostname, url.port or 80, args.clients, args.seconds, args.quiz_size))
+        report(latencies, elapsed, args.clients)
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        server, port = start_server(root, tmp, args.deck_size, args.workers)
+        try:
+            latencies, elapsed = asyncio.run(load("127.0.0.1", port, args.clients, args.seconds, args.quiz_size))
+        finally:
+            server.terminate()
+            server.wait()
+    report(latencies, elapsed, args.clients)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compare the pooled connection layer against the old open-per-call pattern.
+
+Run from the project root:
+    python -m benchmarks.bench_db --rows 5000
+"""
+import argparse
+import os
+import sqlite3
+import tempfile
+import time
+
+import database
+import flashcard_db
+
+
+LEGACY_SCHEMA_SQL = """
+    CREATE TABLE flashcards (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        category TEXT,
+        difficulty TEXT
+    )
+"""
+
+
+def legacy_add(path, question, answer, category, difficulty):
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(
+        "INSERT INTO flashcards (question, answer, category, difficulty) VALUES (?, ?, ?, ?)",
+        (question, answer, category, difficulty)
+    )
+    conn.commit()
+    conn.close()
+
+
+def legacy_get(path, flashcard_id):
+    with sqlite3.connect(path) as conn:
+        c = conn.cursor()
+        c.execute("SELECT id, question, answer FROM flashcards WHERE id = ?", (flashcard_id,))
+        return c.fetchone()
+
+
+def legacy_init(path):
+    conn = sqlite3.connect(path)
+    conn.execute(LEGACY_SCHEMA_SQL)
+    conn.commit()
+    conn.close()
+
+
+def timed(label, n, fn):
+    start = time.perf_counter()
+    for i in range(n):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28}{n / elapsed:>12,.0f} ops/sec")
+    return n / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=2000)
+    args = parser.parse_args()
+    n = args.rows
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy.db")
+        legacy_init(legacy_path)
+        legacy_ins = timed("open-per-call inserts", n, lambda i: legacy_add(legacy_path, f"Q{i}", f"A{i}", "General", "Easy"))
+        legacy_read = timed("open-per-call reads", n, lambda i: legacy_get(legacy_path, i + 1))
+
+        flashcard_db.DB_NAME = os.path.join(tmp, "pooled.db")
+        flashcard_db.init_db()
+        pooled_ins = timed("pooled inserts", n, lambda i: flashcard_db.add_flashcard_db(f"Q{i}", f"A{i}", "General", "Easy"))
+        pooled_read = timed("pooled reads", n, lambda i: flashcard_db.get_flashcard_by_id(i + 1))
+        database.close_all()
+
+    print(f"\ninsert speed-up: {pooled_ins / legacy_ins:.1f}x")
+    print(f"read speed-up:   {pooled_read / legacy_read:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Measure the import cost of each main.py subcommand with `python -X importtime`.
+
+Each command's modules are imported in a fresh interpreter; the report
+shows the total import time, the slowest modules, and whether any GUI or
+plotting toolkit was loaded on a headless path.
+
+Run from the project root:
+    python -m benchmarks.bench_startup [--repeat 5] [--top 5]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+# The module each subcommand imports first (see main.py).
+COMMANDS = {
+    "gui": "gui",
+    "quiz": "quiz",
+    "import": "importer",
+    "export": "exporter",
+    "stats": "report",
+}
+HEAVY = ("tkinter", "ttkbootstrap", "matplotlib", "numpy")
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def import_times(module, cwd):
+    """Return {module name: (self_us, cumulative_us)} for `import main, <module>`."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import main, {module}"],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = {}
+    for match in _LINE.finditer(result.stderr):
+        times[match.group(4)] = (int(match.group(1)), int(match.group(2)))
+    return times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5, help="runs per command; the fastest is reported")
+    parser.add_argument("--top", type=int, default=5, help="slowest modules to list per command")
+    args = parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    for command, module in COMMANDS.items():
+        try:
+            runs = [import_times(module, root) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"{command:<8} skipped: {e}")
+            continue
+        best = min(runs, key=lambda t: sum(s for s, _ in t.values()))
+        total_ms = sum(s for s, _ in best.values()) / 1000
+        heavy = sorted({name.split(".")[0] for name in best if name.split(".")[0] in HEAVY})
+        print(f"{command:<8}{total_ms:>9.1f} ms  {len(best):>4} modules  heavy: {', '.join(heavy) or 'none'}")
+        slowest = sorted(best.items(), key=lambda item: item[1][0], reverse=True)[:args.top]
+        for name, (self_us, _) in slowest:
+            print(f"          {self_us / 1000:>7.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
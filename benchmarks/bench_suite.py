@@ -0,0 +1,274 @@
+"""
+Benchmark suite: time the core operations on synthetic data and write JSON.
+
+For every deck size a synthetic deck and score history is generated
+(see synthetic.py), or reused from --data if it was generated there with
+the same options, and each operation is run --repeat times:
+
+  get_all_flashcards   cold (deck cache dropped) and warm
+  quiz selection       a quiz from the largest and the smallest category, the due queue
+  log_score            LOG_SCORE_CALLS scores logged one by one (into a
+                       throwaway copy of the scores, so --data stays as
+                       generated and runs on it stay comparable)
+  leaderboard          high scores per difficulty
+  chart aggregation    difficulty chart totals; progress charts (NumPy) cold and warm
+  export               the whole deck to CSV and to gzipped JSONL
+  GUI list             the category tree plus the first page of the largest
+                       categories in a Treeview on a hidden Tk root (needs a
+                       display: run under xvfb-run on headless machines)
+
+Results (min/median/mean/max ms per operation and deck size, with the
+Python version, platform and git revision) are written to --out as JSON.
+--compare checks them against an earlier results file and lists every
+operation whose median got slower by more than --tolerance; the exit
+status is 1 if any did.
+
+Run from the project root:
+    python -m benchmarks.bench_suite --cards 1000,100000 --out baseline.json
+    python -m benchmarks.bench_suite --cards 1000,100000 --compare baseline.json
+    xvfb-run python -m benchmarks.bench_suite --cards 10000000 --data bench-data
+"""
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import database
+import exporter
+import flashcard_db
+import score_logger
+from benchmarks import synthetic
+from quiz_engine import select_cards, SESSION_SIZE
+
+LOG_SCORE_CALLS = 100
+GUI_PAGE_SIZE = 200        # gui.VIEW_PAGE_SIZE
+GUI_OPEN_CATEGORIES = 3    # categories expanded in the GUI list benchmark
+NOISE_MS = 0.5             # differences below this never count as regressions
+
+
+def _quizzes_for(cards):
+    return max(100, min(cards // 10, 100000))
+
+
+def prepare(folder, cards, quizzes, categories, skew, seed, reuse):
+    """Generate (or reuse) the data in `folder`; returns seconds spent generating, or None if reused."""
+    meta = {"cards": cards, "quizzes": quizzes, "categories": categories, "skew": skew, "seed": seed}
+    meta_path = os.path.join(folder, "meta.json")
+    if reuse and os.path.exists(meta_path):
+        with open(meta_path, encoding="utf-8") as f:
+            if json.load(f) == meta:
+                return None
+    start = time.perf_counter()
+    synthetic.generate(folder, cards, quizzes, categories, skew, seed,
+                       progress=lambda text: print(f"\r   generating: {text}...", end="", flush=True))
+    database.close_all()
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    print("\r" + " " * 60 + "\r", end="")
+    return time.perf_counter() - start
+
+
+def measure(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return {"runs": repeat, "min_ms": min(times), "median_ms": statistics.median(times),
+            "mean_ms": statistics.fmean(times), "max_ms": max(times)}
+
+
+def _gui_root():
+    """A hidden Tk root, or the reason there is none."""
+    try:
+        import tkinter as tk
+    except ImportError as e:
+        return None, str(e)
+    try:
+        root = tk.Tk()
+    except tk.TclError as e:
+        return None, str(e)
+    root.withdraw()
+    return root, None
+
+
+def build_card_list(root, category_counts, pages):
+    """Build the card browser's Treeview as gui.build_flashcard_browser does, then drop it."""
+    from tkinter import ttk
+    tree = ttk.Treeview(root, columns=("answer", "difficulty"), show="tree headings")
+    for name, count in category_counts:
+        iid = tree.insert("", "end", text=f"📂 {name} ({count})", open=name in pages)
+        for card in pages.get(name, ()):
+            tree.insert(iid, "end", text=card["question"], values=(card["answer"], card["difficulty"]))
+    tree.pack()
+    root.update_idletasks()
+    tree.destroy()
+
+
+def operations(tmp, gui_root, gui_skipped):
+    """[(name, fn, setup)]; fn is None (and setup the reason) for skipped operations."""
+    counts = sorted(flashcard_db.get_category_counts(), key=lambda item: -item[1])
+    largest, smallest = counts[0][0], counts[-1][0]
+
+    def log_scores():
+        for i in range(LOG_SCORE_CALLS):
+            score_logger.log_score(i % 11, 10, "Medium", largest)
+
+    def gui_list():
+        category_counts = flashcard_db.get_category_counts()
+        pages = {name: flashcard_db.query_flashcards(category=name, limit=GUI_PAGE_SIZE)
+                 for name, _ in counts[:GUI_OPEN_CATEGORIES]}
+        build_card_list(gui_root, category_counts, pages)
+
+    ops = [
+        ("get_all_flashcards (cold)", flashcard_db.get_all_flashcards, flashcard_db.clear_deck_cache),
+        ("get_all_flashcards (warm)", flashcard_db.get_all_flashcards, None),
+        ("quiz selection (largest category)", lambda: list(select_cards(largest, None, SESSION_SIZE)), None),
+        ("quiz selection (smallest category)", lambda: list(select_cards(smallest, "Hard", SESSION_SIZE)), None),
+        ("quiz selection (due queue)", lambda: list(select_cards(size=SESSION_SIZE, due=True)), None),
+        (f"log_score x{LOG_SCORE_CALLS}", log_scores, None),
+        ("leaderboard", score_logger.get_leaderboard, None),
+        ("chart aggregation (difficulty)", score_logger.get_difficulty_stats, None),
+    ]
+    try:
+        import stats
+    except ImportError:
+        ops.append(("chart aggregation (progress)", None, "numpy is not installed"))
+    else:
+        def progress_charts():
+            stats.accuracy_trend()
+            stats.retention_curves()
+            stats.latency_percentiles()
+        ops.append(("chart aggregation (progress, cold)", progress_charts, stats.reset))
+        ops.append(("chart aggregation (progress, warm)", progress_charts, None))
+    ops += [
+        ("export csv", lambda: exporter.export_flashcards(os.path.join(tmp, "deck.csv")), None),
+        ("export jsonl.gz", lambda: exporter.export_flashcards(os.path.join(tmp, "deck.jsonl.gz")), None),
+        ("GUI list", gui_list, None) if gui_root else ("GUI list", None, gui_skipped),
+    ]
+    return ops
+
+
+def copy_db(source, dest):
+    """Copy an SQLite database (WAL included) with the backup API."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(dest)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
+
+
+def run_size(folder, tmp, repeat, gui_root, gui_skipped):
+    flashcard_db.DB_NAME = os.path.join(folder, "flashcards.db")
+    score_logger.SCORE_DB = os.path.join(tmp, "score_history.db")
+    copy_db(os.path.join(folder, "score_history.db"), score_logger.SCORE_DB)
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    flashcard_db.clear_deck_cache()
+    results = {}
+    for name, fn, setup in operations(tmp, gui_root, gui_skipped):
+        if fn is None:
+            results[name] = {"skipped": setup}
+            print(f"   {name:<38} skipped: {setup}")
+            continue
+        results[name] = measure(fn, repeat, setup)
+        r = results[name]
+        print(f"   {name:<38}{r['median_ms']:>11.2f} ms  (min {r['min_ms']:.2f}, max {r['max_ms']:.2f})")
+    database.close_all()
+    return results
+
+
+def git_revision(root):
+    try:
+        result = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=root, capture_output=True, text=True)
+    except OSError:
+        return None
+    return result.stdout.strip() or None
+
+
+def compare(results, baseline, tolerance):
+    """Print median changes against `baseline`; returns the number of regressions."""
+    regressions = 0
+    print(f"\nCompared with {baseline.get('revision') or 'baseline'} ({baseline.get('created', '?')}):")
+    for size, entry in results["sizes"].items():
+        old = baseline.get("sizes", {}).get(size)
+        if old is None:
+            continue
+        for name, new in entry["operations"].items():
+            before = old["operations"].get(name, {})
+            if "median_ms" not in new or "median_ms" not in before:
+                continue
+            ratio = new["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+            slower = ratio > 1 + tolerance and new["median_ms"] - before["median_ms"] > NOISE_MS
+            regressions += slower
+            print(f"   {'❌' if slower else '  '} {int(size):>10,} cards  {name:<38}"
+                  f"{before['median_ms']:>10.2f} → {new['median_ms']:>10.2f} ms  ({ratio:.2f}x)")
+    print(f"{regressions} regression(s) beyond {tolerance:.0%}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", default="1000,10000,100000",
+                        help="comma-separated deck sizes, e.g. 1000,100000,10000000")
+    parser.add_argument("--quizzes", type=int, help="quizzes of score history (default: a tenth of the deck)")
+    parser.add_argument("--categories", type=int, default=synthetic.CATEGORIES)
+    parser.add_argument("--skew", type=float, default=synthetic.SKEW, help="Zipf exponent of category sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per operation")
+    parser.add_argument("--data", help="keep generated data here and reuse it on later runs")
+    parser.add_argument("--out", default="bench_results.json", help="where to write the results")
+    parser.add_argument("--compare", help="earlier results file to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown of a median")
+    args = parser.parse_args()
+    sizes = [int(size.replace("_", "")) for size in args.cards.split(",")]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    gui_root, gui_skipped = _gui_root()
+    results = {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(root),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {"categories": args.categories, "skew": args.skew, "seed": args.seed, "repeat": args.repeat},
+        "sizes": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for cards in sizes:
+            quizzes = args.quizzes or _quizzes_for(cards)
+            folder = os.path.join(args.data or tmp, f"{cards}-cards")
+            print(f"📚 {cards:,} cards, {quizzes:,} quizzes")
+            generated = prepare(folder, cards, quizzes, args.categories, args.skew, args.seed, bool(args.data))
+            if generated is not None:
+                print(f"   generated in {generated:.1f}s")
+            results["sizes"][str(cards)] = {
+                "quizzes": quizzes,
+                "generate_s": generated,
+                "operations": run_size(folder, tmp, args.repeat, gui_root, gui_skipped),
+            }
+    if gui_root is not None:
+        gui_root.destroy()
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\n✅ Results written to {args.out}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""
+Measure sync throughput (changes/sec) between two devices through the reference server.
+
+Device A gets a synthetic deck and score history (see synthetic.py) in a
+temporary directory; device B starts empty. With sync_server.py running
+in a subprocess, the benchmark times:
+
+  initial push   A sends its whole deck and history
+  initial pull   B receives them
+  edits          A and B both edit the same --edits cards: A their
+                 answers, B their categories and every other answer (so
+                 those conflict); A also deletes every 50th of them
+  incremental    A, B and A again, until both have everything
+
+and then checks that A and B hold the same cards, scores and high
+scores. Every sync runs `main.py sync run --json` in the device's own
+directory, so each device has its own databases and device id.
+
+Run from the project root:
+    python -m benchmarks.bench_sync [--cards 20000] [--quizzes 2000] [--edits 500] [--batch-size 2000]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+
+EDIT_SCRIPT = """
+import sys
+import flashcard_db
+flashcard_db.init_db()
+device, count = sys.argv[1], int(sys.argv[2])
+cards = sorted(flashcard_db.get_all_flashcards(), key=lambda card: card["question"])[:count]
+for i, card in enumerate(cards):
+    answer, category = card["answer"], card["category"]
+    if device == "a" and i % 50 == 0:
+        flashcard_db.delete_flashcard(card["id"])
+        continue
+    if device == "a" or i % 2 == 0:
+        answer += f" ({device})"
+    if device == "b":
+        category += " (b)"
+    flashcard_db.update_flashcard(card["id"], card["question"], answer, category, card["difficulty"])
+"""
+SNAPSHOT_SQL = {
+    "flashcards.db": ["SELECT question, answer, category, difficulty FROM flashcards ORDER BY question"],
+    "score_history.db": [
+        "SELECT timestamp, score, total, difficulty, category FROM score_log ORDER BY 1, 2, 3, 4, 5",
+        "SELECT difficulty, high_score FROM leaderboard ORDER BY difficulty",
+    ],
+}
+
+
+def _env(root):
+    return dict(os.environ, PYTHONPATH=root)
+
+
+def start_server(root, tmp):
+    """Start sync_server.py on a free port; returns (process, url)."""
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(root, "main.py"), "sync", "serve", "--port", "0",
+         "--db", os.path.join(tmp, "sync_server.db")],
+        cwd=tmp, stdout=subprocess.PIPE, text=True, env=_env(root),
+    )
+    line = server.stdout.readline()
+    if "http://" not in line:
+        server.kill()
+        raise RuntimeError(f"server did not start: {line!r}")
+    return server, "http://" + line.split("http://")[1].split()[0]
+
+
+def sync(root, folder, url, batch_size):
+    """One `sync run` on the device in `folder`; returns its summed counters."""
+    result = subprocess.run(
+        [sys.executable, os.path.join(root, "main.py"), "sync", "run", url, "--json", "--batch-size", str(batch_size)],
+        cwd=folder, env=_env(root), capture_output=True, text=True, check=True,
+    )
+    totals = {}
+    for counts in json.loads(result.stdout.splitlines()[-1]).values():
+        for name, value in counts.items():
+            totals[name] = totals.get(name, 0) + value
+    return totals
+
+
+def snapshot(folder):
+    rows = []
+    for name, queries in SNAPSHOT_SQL.items():
+        conn = sqlite3.connect(os.path.join(folder, name))
+        try:
+            rows += [conn.execute(sql).fetchall() for sql in queries]
+        finally:
+            conn.close()
+    return rows
+
+
+def report(phases):
+    print(f"{'phase':<16}{'sent':>9}{'received':>10}{'applied':>9}{'lost':>7}{'seconds':>9}"
+          f"{'changes/sec':>13}{'KB sent':>10}{'KB recv':>10}")
+    for name, c in phases:
+        changes = c.get("sent", 0) + c.get("received", 0)
+        rate = changes / c["seconds"] if c.get("seconds") else 0
+        print(f"{name:<16}{c.get('sent', 0):>9,}{c.get('received', 0):>10,}{c.get('applied', 0):>9,}"
+              f"{c.get('lost', 0):>7,}{c.get('seconds', 0):>9.2f}{rate:>13,.0f}"
+              f"{c.get('bytes_sent', 0) / 1024:>10,.0f}{c.get('bytes_received', 0) / 1024:>10,.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--cards", type=int, default=20000)
+    parser.add_argument("--quizzes", type=int, default=2000)
+    parser.add_argument("--edits", type=int, default=500, help="cards edited on both devices")
+    parser.add_argument("--batch-size", type=int, default=2000, help="changes per request")
+    args = parser.parse_args()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        a, b = os.path.join(tmp, "a"), os.path.join(tmp, "b")
+        os.makedirs(b)
+        print(f"📚 Generating {args.cards:,} cards and {args.quizzes:,} quizzes on device A...")
+        subprocess.run([sys.executable, "-m", "benchmarks.synthetic", a, "--cards", str(args.cards),
+                        "--quizzes", str(args.quizzes)], cwd=root, env=_env(root), check=True,
+                       stdout=subprocess.DEVNULL)
+        server, url = start_server(root, tmp)
+        try:
+            phases = [("initial push", sync(root, a, url, args.batch_size)),
+                      ("initial pull", sync(root, b, url, args.batch_size))]
+            for device, folder in (("a", a), ("b", b)):
+                subprocess.run([sys.executable, "-c", EDIT_SCRIPT, device, str(args.edits)],
+                               cwd=folder, env=_env(root), check=True)
+            phases += [("incremental A", sync(root, a, url, args.batch_size)),
+                       ("incremental B", sync(root, b, url, args.batch_size)),
+                       ("incremental A", sync(root, a, url, args.batch_size))]
+        finally:
+            server.terminate()
+            server.wait()
+        print()
+        report(phases)
+        converged = snapshot(a) == snapshot(b)
+    print(f"\n{'✅ Both devices hold the same data' if converged else '❌ The devices diverged'}")
+    if not converged:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Generate synthetic decks and score histories for benchmarks.
+
+Decks get `cards` unique cards (arithmetic and vocabulary questions)
+spread over `categories` categories with Zipf-skewed sizes, so a few
+categories hold most of the deck and a long tail holds a handful of
+cards each, like real collections. Histories get `quizzes` quizzes over
+the last `days` days, each with its score_log row, per-answer review
+events and SM-2 review log entries. Cards are drawn from a studied
+subset of the deck so they come up repeatedly, as retention curves
+need. Everything is seeded, so the same arguments give the same data.
+
+Run from the project root:
+    python -m benchmarks.synthetic DIR --cards 1000000 --quizzes 100000
+"""
+import argparse
+import os
+import random
+import string
+import time
+import uuid
+from datetime import datetime
+from itertools import accumulate
+
+import flashcard_db
+import profiles
+import scheduler
+import score_logger
+from database import get_connection, transaction
+from dedup import content_hash
+
+BATCH_ROWS = 50000
+# Page cache while generating: the deck's indexes (the content hash one
+# is in random order) stop fitting the default cache at a few 100k cards.
+GENERATE_CACHE_KB = 256 * 1024
+CATEGORIES = 50
+SKEW = 1.1             # Zipf exponent of category sizes
+DIFFICULTY_WEIGHTS = (0.5, 0.3, 0.2)
+VOCABULARY = 5000
+ANSWERS_PER_QUIZ = 10
+DAYS = 365
+STUDIED_SHARE = 0.2    # share of reviews' cards drawn from a repeating subset
+DAY = 24 * 60 * 60
+
+
+def category_names(count=CATEGORIES):
+    return [f"Topic {i + 1:03d}" for i in range(count)]
+
+
+def _words(rng, count=VOCABULARY):
+    return ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 10))) for _ in range(count)]
+
+
+def _card_rows(rng, start, count, names, weights, words):
+    categories = rng.choices(names, cum_weights=weights, k=count)
+    difficulties = rng.choices(range(len(DIFFICULTY_WEIGHTS)), weights=DIFFICULTY_WEIGHTS, k=count)
+    owner = profiles.owner()
+    for i, category, difficulty in zip(range(start, start + count), categories, difficulties):
+        if i % 3 == 0:
+            a, b = rng.randint(1, 9999), rng.randint(1, 9999)
+            question, answer = f"What is {a} + {b}? (#{i})", str(a + b)
+        else:
+            question = f"Define '{' '.join(rng.choices(words, k=rng.randint(1, 4)))}' (#{i})"
+            answer = " ".join(rng.choices(words, k=rng.randint(1, 12)))
+        yield (*owner, question, answer, category, difficulty, content_hash(question, answer))
+
+
+def generate_deck(path, cards, categories=CATEGORIES, skew=SKEW, seed=0, progress=None):
+    """Create `path` holding `cards` synthetic cards in Zipf-sized categories."""
+    rng = random.Random(seed)
+    flashcard_db.DB_NAME = path
+    flashcard_db.init_db()
+    names = category_names(categories)
+    weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(categories)))
+    words = _words(rng)
+    conn = get_connection(path)
+    default_cache = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.execute(f"PRAGMA cache_size = {-GENERATE_CACHE_KB}")
+    try:
+        for start in range(0, cards, BATCH_ROWS):
+            with transaction(path) as conn:
+                conn.executemany(flashcard_db.INSERT_SQL,
+                                 _card_rows(rng, start, min(BATCH_ROWS, cards - start), names, weights, words))
+            if progress:
+                progress(min(start + BATCH_ROWS, cards))
+    finally:
+        conn.execute(f"PRAGMA cache_size = {default_cache}")
+
+
+def _history_rows(rng, quizzes, low, high, difficulty_names, names, days, now):
+    studied = max(1, int((high - low + 1) * STUDIED_SHARE))
+    owner = profiles.owner()
+    starts = sorted(now - rng.random() * days * DAY for _ in range(quizzes))
+    for started in starts:
+        session = uuid.UUID(int=rng.getrandbits(128)).hex
+        skill = rng.betavariate(4, 2)
+        events, reviews = [], []
+        at = started
+        for _ in range(ANSWERS_PER_QUIZ):
+            card_id = low + (rng.randrange(studied) if rng.random() < 0.8 else rng.randrange(high - low + 1))
+            latency = rng.expovariate(1 / 8.0)
+            at += latency
+            correct = rng.random() < skill
+            events.append((*owner, session, card_id, at, int(correct), latency, ""))
+            quality = scheduler.quality_from_answer(correct, latency)
+            reviews.append((*owner, card_id, at, quality, 2.5, 1.0))
+        score = sum(event[5] for event in events)
+        timestamp = datetime.fromtimestamp(started).strftime(score_logger.TIMESTAMP_FORMAT)
+        yield ((*owner, timestamp, score, ANSWERS_PER_QUIZ, rng.choice(difficulty_names), rng.choice(names)),
+               events, reviews)
+
+
+def generate_history(flashcards_path, scores_path, quizzes, days=DAYS, categories=CATEGORIES, seed=0,
+                     progress=None):
+    """Fill `scores_path` (and the review log in `flashcards_path`) with `quizzes` synthetic quizzes."""
+    rng = random.Random(seed + 1)
+    score_logger.SCORE_DB = scores_path
+    score_logger.init_score_db()
+    low, high = get_connection(flashcards_path).execute(flashcard_db.ID_RANGE_SQL, profiles.owner() * 2).fetchone()
+    if not high:
+        return
+    rows = _history_rows(rng, quizzes, low, high, ["All", *flashcard_db.DIFFICULTIES],
+                         ["All", *category_names(categories)], days, time.time())
+    done = 0
+    batch_quizzes = max(1, BATCH_ROWS // ANSWERS_PER_QUIZ)
+    while done < quizzes:
+        scores, events, reviews = [], [], []
+        for score, quiz_events, quiz_reviews in (next(rows) for _ in range(min(batch_quizzes, quizzes - done))):
+            scores.append(score)
+            events += quiz_events
+            reviews += quiz_reviews
+        with transaction(scores_path) as conn:
+            conn.executemany(score_logger.INSERT_SCORE_SQL, scores)
+            conn.executemany(score_logger.INSERT_EVENT_SQL, events)
+        with transaction(flashcards_path) as conn:
+            conn.executemany(scheduler.INSERT_HISTORY_SQL, reviews)
+        done += len(scores)
+        if progress:
+            progress(done)
+    score_logger.rebuild_score_stats()
+
+
+def generate(folder, cards, quizzes, categories=CATEGORIES, skew=SKEW, seed=0, progress=None):
+    """Generate a deck and history in `folder`; returns (flashcards path, scores path)."""
+    os.makedirs(folder, exist_ok=True)
+    paths = os.path.join(folder, "flashcards.db"), os.path.join(folder, "score_history.db")
+    for path in paths:
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+    generate_deck(paths[0], cards, categories, skew, seed,
+                  progress=progress and (lambda n: progress(f"{n:,} cards")))
+    generate_history(*paths, quizzes, categories=categories, seed=seed,
+                     progress=progress and (lambda n: progress(f"{n:,} quizzes")))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("folder", help="where to write flashcards.db and score_history.db")
+    parser.add_argument("--cards", type=int, default=10000)
+    parser.add_argument("--quizzes", type=int, default=1000)
+    parser.add_argument("--categories", type=int, default=CATEGORIES)
+    parser.add_argument("--skew", type=float, default=SKEW, help="Zipf exponent of category sizes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    generate(args.folder, args.cards, args.quizzes, args.categories, args.skew, args.seed,
+             progress=lambda text: print(f"\r{text} generated...", end="", flush=True))
+    print(f"\r✅ {args.cards:,} cards and {args.quizzes:,} quizzes in {args.folder} "
+          f"({time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+import perf
+
+# Pragmas applied once to every pooled connection.
+JOURNAL_MODE = "WAL"
+PRAGMAS = [
+    ("synchronous", "NORMAL"),   # safe with WAL, avoids an fsync per commit
+    ("cache_size", -16000),      # ~16 MB page cache (negative = KiB)
+    ("mmap_size", 64 * 1024 * 1024),
+    ("temp_store", "MEMORY"),
+    ("busy_timeout", 5000),
+]
+
+# sqlite3 keeps prepared statements per connection, keyed by SQL text, so
+# callers should pass the same module-level SQL strings every time.
+STATEMENT_CACHE_SIZE = 256
+
+_local = threading.local()
+_lock = threading.Lock()
+_open_connections = []
+_generation = 0
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that reports each statement to perf once it is done with it:
+    the time to execute it plus the time spent fetching its rows.
+    """
+    _pending = None  # [sql, parameters, seconds so far]
+
+    def _timed(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._pending is not None:
+                self._pending[2] += time.perf_counter() - start
+
+    def _report(self):
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            perf.query_done(self.connection, *pending)
+
+    def execute(self, sql, parameters=()):
+        self._report()
+        self._pending = [sql, parameters, 0.0]
+        return self._timed(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._report()
+        # The first parameter set stands in for all of them in the slow-query log.
+        first = seq_of_parameters[0] if isinstance(seq_of_parameters, list) and seq_of_parameters else ()
+        self._pending = [sql, first, 0.0]
+        return self._timed(super().executemany, sql, seq_of_parameters)
+
+    def __next__(self):
+        try:
+            return self._timed(super().__next__)
+        except StopIteration:
+            self._report()
+            raise
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is None:
+            self._report()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, self.arraysize if size is None else size)
+        if not rows:
+            self._report()
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        self._report()
+        return rows
+
+    def close(self):
+        self._report()
+        super().close()
+
+    def __del__(self):
+        try:
+            self._report()
+        except Exception:
+            pass  # the connection may already be closed at shutdown
+
+
+class TimedConnection(sqlite3.Connection):
+    """Connection whose statements and commits are timed by perf (only used when it is enabled)."""
+
+    def execute(self, sql, parameters=()):
+        return self.cursor(TimedCursor).execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor(TimedCursor).executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            perf.query_done(self, "COMMIT", (), time.perf_counter() - start)
+
+
+def _open(path):
+    conn = sqlite3.connect(
+        path,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        factory=TimedConnection if perf.ENABLED else sqlite3.Connection,
+    )
+    conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}")
+    for name, value in PRAGMAS:
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+
+def get_connection(path):
+    """
+    Return the long-lived connection to `path` owned by the calling thread.
+    Connections are opened on first use and reused until close_all().
+    """
+    if getattr(_local, "generation", None) != _generation:
+        _local.connections = {}
+        _local.generation = _generation
+    conn = _local.connections.get(path)
+    if conn is None:
+        conn = _open(path)
+        _local.connections[path] = conn
+        with _lock:
+            _open_connections.append(conn)
+    return conn
+
+
+@contextmanager
+def transaction(path):
+    """
+    Run a block inside a single write transaction on the pooled connection.
+    Nested use joins the outer transaction.
+    """
+    conn = get_connection(path)
+    if conn.in_transaction:
+        yield conn
+        return
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        conn.commit()
+
+
+def close_all():
+    """Close every pooled connection in every thread."""
+    global _generation
+    with _lock:
+        _generation += 1
+        for conn in _open_connections:
+            conn.close()
+        _open_connections.clear()
+
+
+def _forget_inherited_connections():
+    """A forked child must neither use nor close its parent's SQLite handles."""
+    global _generation, _lock
+    _lock = threading.Lock()
+    _generation += 1
+    _open_connections.clear()
+
+
+os.register_at_fork(after_in_child=_forget_inherited_connections)
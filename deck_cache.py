@@ -0,0 +1,168 @@
+"""
+Process-wide in-memory copy of one deck of the flashcards table.
+
+Cards are held as compact __slots__ records with interned category
+strings and the shared difficulty names, in id order. Freshness is
+checked against the card_changes log (see migrations.py): every insert,
+update and delete bumps a sequence number, from any thread or process,
+so a read first asks for MAX(seq) off its index. When nothing changed
+the cached data is served as is; otherwise only the cards changed since
+the last seen seq are re-read and patched in, unless so many changed
+that a full reload is cheaper.
+
+The cache holds the deck of one (user_id, deck_id) owner at a time (see
+profiles.py); asking for another owner or database reloads it. Derived
+results (categories, counts, filtered lists) are memoized until the
+next change.
+"""
+import sys
+import threading
+from bisect import bisect_right
+
+from database import get_connection
+
+FULL_RELOAD_RATIO = 0.25  # reload everything when more than this share of cards changed
+
+SELECT_SEQ_SQL = "SELECT COALESCE(MAX(seq), 0) FROM card_changes"
+SELECT_ALL_SQL = """
+    SELECT id, question, answer, category, difficulty FROM flashcards
+    WHERE user_id = ? AND deck_id = ? ORDER BY id
+"""
+# Changed cards of other decks come back like deleted ones (NULL columns)
+# and are simply not in the cache.
+SELECT_CHANGED_SQL = """
+    SELECT c.card_id, f.question, f.answer, f.category, f.difficulty
+    FROM card_changes c LEFT JOIN flashcards f ON f.id = c.card_id AND f.user_id = ? AND f.deck_id = ?
+    WHERE c.seq > ?
+    ORDER BY c.card_id
+"""
+COUNT_CHANGED_SQL = "SELECT COUNT(*) FROM card_changes WHERE seq > ?"
+
+
+class Card:
+    """A read-only flashcard that also supports card["field"] like the dicts it replaces."""
+    __slots__ = ("id", "question", "answer", "category", "difficulty")
+
+    def __init__(self, id, question, answer, category, difficulty):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.category = category
+        self.difficulty = difficulty
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except (AttributeError, TypeError):
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def keys(self):
+        return self.__slots__
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __repr__(self):
+        return f"Card({self.to_dict()!r})"
+
+
+class DeckCache:
+    def __init__(self, difficulties):
+        self.difficulties = difficulties
+        self._lock = threading.Lock()
+        self._path = None
+        self._owner = None
+        self._seq = None
+        self._cards = {}    # id -> Card, in id order
+        self._derived = {}  # memoized results, cleared on every change
+        self._stats = {"hits": 0, "misses": 0, "reloads": 0, "patched": 0}
+
+    def _card(self, row):
+        return Card(row[0], row[1], row[2], sys.intern(row[3]), self.difficulties[row[4]])
+
+    def _sync(self, path, owner):
+        """Bring the cache up to date with `owner`'s deck in `path`; caller holds the lock."""
+        conn = get_connection(path)
+        seq = conn.execute(SELECT_SEQ_SQL).fetchone()[0]
+        if (path, owner) == (self._path, self._owner) and seq == self._seq:
+            self._stats["hits"] += 1
+            return
+        self._stats["misses"] += 1
+        self._derived = {}
+        if (path, owner) != (self._path, self._owner) or self._seq is None or \
+                conn.execute(COUNT_CHANGED_SQL, (self._seq,)).fetchone()[0] > len(self._cards) * FULL_RELOAD_RATIO:
+            self._cards = {row[0]: self._card(row) for row in conn.execute(SELECT_ALL_SQL, owner)}
+            self._stats["reloads"] += 1
+        else:
+            out_of_order = False
+            for row in conn.execute(SELECT_CHANGED_SQL, (*owner, self._seq)):
+                if row[1] is None:
+                    self._cards.pop(row[0], None)  # deleted
+                else:
+                    if row[0] not in self._cards and self._cards and row[0] < next(reversed(self._cards)):
+                        out_of_order = True
+                    self._cards[row[0]] = self._card(row)
+                self._stats["patched"] += 1
+            if out_of_order:
+                self._cards = dict(sorted(self._cards.items()))
+        self._path, self._owner, self._seq = path, owner, seq
+
+    def _memo(self, path, owner, key, compute):
+        with self._lock:
+            self._sync(path, owner)
+            if key not in self._derived:
+                self._derived[key] = compute()
+            return self._derived[key]
+
+    def _matching(self, path, owner, category, difficulty):
+        return self._memo(path, owner, ("cards", category, difficulty), lambda: tuple(
+            card for card in self._cards.values()
+            if (category is None or card.category == category)
+            and (difficulty is None or card.difficulty == difficulty)
+        ))
+
+    def cards(self, path, owner, category=None, difficulty=None, limit=None, offset=0, after=None):
+        """
+        Return a new list of `owner`'s cards matching the filters, in id
+        order, starting `offset` cards after the card id `after` if given.
+        """
+        matching = self._matching(path, owner, category, difficulty)
+        if after is not None:
+            offset += bisect_right(matching, after, key=lambda card: card.id)
+        return list(matching[offset:None if limit is None else offset + limit])
+
+    def version(self, path):
+        """Sequence number of the latest change to any card in `path`."""
+        return get_connection(path).execute(SELECT_SEQ_SQL).fetchone()[0]
+
+    def count(self, path, owner, category=None, difficulty=None):
+        return len(self._matching(path, owner, category, difficulty))
+
+    def category_counts(self, path, owner):
+        def compute():
+            counts = {}
+            for card in self._cards.values():
+                counts[card.category] = counts.get(card.category, 0) + 1
+            return sorted(counts.items())
+        return list(self._memo(path, owner, ("category_counts",), compute))
+
+    def invalidate(self):
+        with self._lock:
+            self._path = self._owner = self._seq = None
+            self._cards, self._derived = {}, {}
+
+    def info(self):
+        """Hit/miss counters and an estimate of the cache's memory use in bytes."""
+        with self._lock:
+            strings = {}
+            for card in self._cards.values():
+                for text in (card.question, card.answer, card.category):
+                    strings[id(text)] = text
+            size = sys.getsizeof(self._cards) + sum(sys.getsizeof(card) for card in self._cards.values())
+            size += sum(sys.getsizeof(text) for text in strings.values())
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return dict(self._stats, cards=len(self._cards), bytes=size,
+                        hit_rate=self._stats["hits"] / lookups if lookups else 0.0)
@@ -0,0 +1,215 @@
+"""
+Duplicate detection for flashcards.
+
+Exact duplicates: every card stores content_hash, a 16-byte BLAKE2b
+digest of its normalized question and answer, under an index unique
+per deck (see migrations.py). Inserts that hit an existing hash are skipped by
+SQLite in one index probe.
+
+Near duplicates: near_duplicate_clusters() estimates the Jaccard
+similarity of question shingles (overlapping byte runs of the
+normalized text) with MinHash signatures and
+finds candidate pairs with LSH banding, so cost grows with the deck size
+instead of with the number of card pairs. Shingling and signatures are
+vectorized with NumPy in batches; only this part needs NumPy.
+
+Usage:
+    python main.py dedup exact [--merge]
+    python main.py dedup near [--threshold 0.8] [--limit 20]
+"""
+import argparse
+import hashlib
+import re
+import unicodedata
+
+from database import get_connection, transaction
+from profiles import owner
+
+SHINGLE_SIZE = 4
+NUM_PERM = 64          # MinHash signature length
+BANDS = 16             # LSH bands of NUM_PERM // BANDS rows each
+THRESHOLD = 0.8        # estimated Jaccard similarity to report
+BATCH_CARDS = 2000     # cards hashed per vectorized batch
+SEED = 1
+
+COUNT_SQL = "SELECT COUNT(*) FROM flashcards WHERE user_id = ? AND deck_id = ?"
+SELECT_QUESTIONS_SQL = "SELECT id, question FROM flashcards WHERE user_id = ? AND deck_id = ? ORDER BY id"
+SELECT_UNHASHED_SQL = "SELECT id, user_id, deck_id, question, answer FROM flashcards WHERE content_hash IS NULL"
+SELECT_BY_HASH_SQL = "SELECT id FROM flashcards WHERE user_id = ? AND deck_id = ? AND content_hash = ?"
+DELETE_SQL = "DELETE FROM flashcards WHERE id = ?"
+SET_HASH_SQL = "UPDATE flashcards SET content_hash = ? WHERE id = ?"
+
+_WHITESPACE = re.compile(r"\s+")
+_PUNCTUATION = re.compile(r"[^\w\s]")
+
+
+def normalize_content(text):
+    """Case-fold, NFKC-normalize and collapse whitespace; punctuation is kept."""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "").casefold()).strip()
+
+
+def content_hash(question, answer):
+    """Identity of a card's content: equal for cards that differ only in case or spacing."""
+    data = normalize_content(question) + "\x1f" + normalize_content(answer)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).digest()
+
+
+# ------------- Exact duplicates -------------
+
+def exact_duplicates(path):
+    """
+    Cards left without a content_hash because they duplicate an older
+    card (the migration keeps only the first copy hashed).
+    Returns [(duplicate_id, original_id)].
+    """
+    conn = get_connection(path)
+    pairs = []
+    for card_id, user_id, deck_id, question, answer in conn.execute(SELECT_UNHASHED_SQL).fetchall():
+        original = conn.execute(SELECT_BY_HASH_SQL, (user_id, deck_id, content_hash(question, answer))).fetchone()
+        if original is not None:
+            pairs.append((card_id, original[0]))
+    return pairs
+
+
+def merge_exact_duplicates(path):
+    """Delete duplicate copies and hash any remaining unhashed cards; returns cards deleted."""
+    pairs = exact_duplicates(path)
+    with transaction(path) as conn:
+        conn.executemany(DELETE_SQL, [(card_id,) for card_id, _ in pairs])
+        for card_id, _, _, question, answer in conn.execute(SELECT_UNHASHED_SQL).fetchall():
+            conn.execute(SET_HASH_SQL, (content_hash(question, answer), card_id))
+    return len(pairs)
+
+
+# ------------- Near duplicates (MinHash + LSH) -------------
+
+def shingle_text(text, size=SHINGLE_SIZE):
+    """Normalized question text without punctuation, padded to at least one shingle."""
+    text = _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", normalize_content(text))).strip()
+    return text.encode("utf-8").ljust(size)
+
+
+def _signatures(np, questions, a, b, size=SHINGLE_SIZE):
+    """MinHash signatures (len(questions) x NUM_PERM, uint32) for one batch."""
+    texts = [shingle_text(q, size) for q in questions]
+    lengths = np.fromiter(map(len, texts), np.int64, len(texts))
+    data = np.frombuffer(b"".join(texts), np.uint8).astype(np.uint64)
+    # Every run of `size` bytes packed into one integer; runs that cross
+    # into the next card are masked out below.
+    windows = np.zeros(len(data) - size + 1, np.uint64)
+    for i in range(size):
+        windows = (windows << np.uint64(8)) | data[i:len(data) - size + 1 + i]
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    card = np.repeat(np.arange(len(texts)), lengths)[:len(windows)]
+    inside = np.arange(len(windows)) - starts[card] <= lengths[card] - size
+    # Multiply-shift hashing: the top 32 bits of a*x + b (mod 2**64) per permutation.
+    hashed = np.multiply.outer(a, windows)
+    hashed += b[:, None]
+    hashed >>= np.uint64(32)
+    hashed[:, ~inside] = np.iinfo(np.uint32).max
+    return np.minimum.reduceat(hashed, starts, axis=1).T.astype(np.uint32)
+
+
+def _find(parent, i):
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def near_duplicate_clusters(path, threshold=THRESHOLD, num_perm=NUM_PERM, bands=BANDS, progress=None):
+    """
+    Group cards of the current deck whose questions are near duplicates.
+    Returns a list of card id lists (largest clusters first); singletons
+    are omitted.
+    """
+    import numpy as np
+
+    rng = np.random.default_rng(SEED)
+    a = rng.integers(1, 2 ** 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 2 ** 63, num_perm, dtype=np.uint64)
+
+    conn = get_connection(path)
+    count = conn.execute(COUNT_SQL, owner()).fetchone()[0]
+    ids = np.zeros(count, dtype=np.int64)
+    signatures = np.zeros((count, num_perm), dtype=np.uint32)
+    done = 0
+    cursor = conn.execute(SELECT_QUESTIONS_SQL, owner())
+    while done < count:
+        rows = cursor.fetchmany(BATCH_CARDS)
+        if not rows:
+            break
+        rows = rows[:count - done]
+        ids[done:done + len(rows)] = [row[0] for row in rows]
+        signatures[done:done + len(rows)] = _signatures(np, [row[1] for row in rows], a, b)
+        done += len(rows)
+        if progress:
+            progress(done)
+    cursor.close()
+    ids, signatures = ids[:done], signatures[:done]
+
+    # Cards sharing all rows of any band are candidates; within each bucket
+    # every member is compared with the first one and merged if similar.
+    parent = list(range(done))
+    rows_per_band = num_perm // bands
+    multipliers = rng.integers(1, 2 ** 63, rows_per_band, dtype=np.uint64) | np.uint64(1)
+    for band in range(bands):
+        block = signatures[:, band * rows_per_band:(band + 1) * rows_per_band].astype(np.uint64)
+        keys = (block * multipliers).sum(axis=1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        new_bucket = np.concatenate(([True], sorted_keys[1:] != sorted_keys[:-1]))
+        followers = np.flatnonzero(~new_bucket)
+        members = order[followers]
+        anchors = order[np.flatnonzero(new_bucket)[np.cumsum(new_bucket)[followers] - 1]]
+        similar = (signatures[members] == signatures[anchors]).mean(axis=1) >= threshold
+        for anchor, member in zip(anchors[similar].tolist(), members[similar].tolist()):
+            root_a, root_b = _find(parent, anchor), _find(parent, member)
+            if root_a != root_b:
+                parent[root_b] = root_a
+
+    clusters = {}
+    for i in range(done):
+        clusters.setdefault(_find(parent, i), []).append(int(ids[i]))
+    return sorted((c for c in clusters.values() if len(c) > 1), key=len, reverse=True)
+
+
+def main(argv=None):
+    import flashcard_db
+
+    parser = argparse.ArgumentParser(prog="main.py dedup", description="Find duplicate flashcards.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    exact = commands.add_parser("exact", help="report (or merge) exact duplicates")
+    exact.add_argument("--merge", action="store_true", help="delete the duplicate copies")
+    near = commands.add_parser("near", help="report clusters of near-duplicate questions")
+    near.add_argument("--threshold", type=float, default=THRESHOLD)
+    near.add_argument("--limit", type=int, default=20, help="clusters to print")
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    path = flashcard_db.DB_NAME
+    if args.command == "exact":
+        if args.merge:
+            print(f"✅ Removed {merge_exact_duplicates(path):,} duplicate cards")
+        else:
+            pairs = exact_duplicates(path)
+            for card_id, original in pairs[:20]:
+                print(f"   #{card_id} duplicates #{original}")
+            print(f"{len(pairs):,} exact duplicates (run with --merge to remove them)")
+        return
+
+    clusters = near_duplicate_clusters(path, args.threshold,
+                                       progress=lambda n: print(f"\r{n:,} cards hashed...", end="", flush=True))
+    print(f"\r🔍 {len(clusters):,} clusters of near-duplicate questions "
+          f"({sum(len(c) for c in clusters):,} cards)")
+    for cluster in clusters[:args.limit]:
+        print()
+        for card_id in cluster[:5]:
+            card = flashcard_db.get_flashcard_by_id(card_id)
+            print(f"   #{card_id}: {card['question'][:70]}")
+        if len(cluster) > 5:
+            print(f"   ... and {len(cluster) - 5} more")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Streaming flashcard export.
+
+Rows are pulled from SQLite in fetchmany() chunks and written through
+buffered (optionally gzip-compressed) writers, so memory stays flat no
+matter how large the deck is. Every format, the SQL one included, holds
+only the current deck's cards that match the filters.
+
+Usage:
+    python exporter.py deck.jsonl.gz [--format jsonl] [--category Math]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+
+import flashcard_db
+
+CHUNK_SIZE = 1000
+WRITE_BUFFER = 1 << 20
+
+
+def write_csv(f, rows):
+    writer = csv.writer(f)
+    writer.writerow(["Question", "Answer", "Category", "Difficulty"])
+    for card in rows:
+        writer.writerow([card["question"], card["answer"], card["category"], card["difficulty"]])
+
+
+def write_jsonl(f, rows):
+    for card in rows:
+        f.write(json.dumps(card, ensure_ascii=False) + "\n")
+
+
+def write_txt(f, rows):
+    for card in rows:
+        f.write(f"Q: {card['question']}\nA: {card['answer']}\n\n")
+
+
+SQL_HEADER = """BEGIN TRANSACTION;
+CREATE TABLE IF NOT EXISTS flashcards (
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    category TEXT,
+    difficulty TEXT
+);
+"""
+
+
+def _sql_literal(value):
+    return "NULL" if value is None else "'" + str(value).replace("'", "''") + "'"
+
+
+def write_sql(f, rows):
+    f.write(SQL_HEADER)
+    for card in rows:
+        values = ", ".join(_sql_literal(card[field]) for field in ("question", "answer", "category", "difficulty"))
+        f.write(f"INSERT INTO flashcards (question, answer, category, difficulty) VALUES ({values});\n")
+    f.write("COMMIT;\n")
+
+
+WRITERS = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "txt": write_txt,
+    "sql": write_sql,  # INSERT statements, loadable with sqlite3 deck.db < deck.sql
+}
+
+
+def detect_format(path):
+    """Return (format, compressed) from a file name like deck.jsonl.gz."""
+    base, ext = os.path.splitext(path.lower())
+    compressed = ext == ".gz"
+    if compressed:
+        ext = os.path.splitext(base)[1]
+    fmt = ext.lstrip(".")
+    if fmt not in WRITERS:
+        raise ValueError(f"Unsupported export type: .{fmt} (expected one of {', '.join(WRITERS)})")
+    return fmt, compressed
+
+
+def _open(path, compressed):
+    if compressed:
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="", buffering=WRITE_BUFFER)
+
+
+def export_flashcards(path, fmt=None, compress=None, category=None, difficulty=None,
+                      chunk_size=CHUNK_SIZE, progress=None):
+    """
+    Stream flashcards to `path` and return the number of cards written.
+    `progress`, if given, is called with the running count after each chunk.
+    The file is written under a temporary name and renamed when complete,
+    so a failed export never leaves a partial or emptied `path` behind.
+    """
+    if fmt is None:
+        fmt, gz = detect_format(path)
+    else:
+        gz = path.lower().endswith(".gz")
+    if compress is None:
+        compress = gz
+
+    rows = flashcard_db.iter_flashcards(category, difficulty, chunk_size)
+    counter = {"written": 0}
+    tmp = path + ".part"
+    try:
+        with _open(tmp, compress) as f:
+            WRITERS[fmt](f, _counted(rows, counter, chunk_size, progress))
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    if progress:
+        progress(counter["written"])
+    return counter["written"]
+
+
+def _counted(rows, counter, chunk_size, progress):
+    for row in rows:
+        yield row
+        counter["written"] += 1
+        if progress and counter["written"] % chunk_size == 0:
+            progress(counter["written"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export flashcards as CSV, JSONL, TXT or SQL.")
+    parser.add_argument("path", help="output file; add .gz to compress")
+    parser.add_argument("--format", choices=sorted(WRITERS), help="override detection by file extension")
+    parser.add_argument("--gzip", action="store_true", default=None, help="force gzip compression")
+    parser.add_argument("--category")
+    parser.add_argument("--difficulty", choices=flashcard_db.DIFFICULTIES)
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    written = export_flashcards(args.path, args.format, args.gzip, args.category, args.difficulty,
+                                progress=lambda n: print(f"\r{n:,} cards written...", end="", flush=True))
+    print(f"\r✅ Exported {written:,} cards to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,83 +1,307 @@
+import random
 import sqlite3
 
+import perf
+from database import get_connection
+from deck_cache import DeckCache
+from dedup import content_hash
+from migrations import migrate, FLASHCARD_MIGRATIONS
+from profiles import owner
+
 DB_NAME = "flashcards.db"
 
+# Random sampling probes this many ids per query, and switches to a
+# reservoir sample of the matching ids when more than MAX_PROBES_PER_CARD
+# probes per card would be expected (sparse filters).
+PROBE_BATCH = 64
+MAX_PROBES_PER_CARD = 50
+
+# Difficulty is stored as its index in this tuple (see migrations.py).
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+_DIFFICULTY_CODES = {name.lower(): code for code, name in enumerate(DIFFICULTIES)}
+
+# Every card belongs to a (user_id, deck_id) pair; see profiles.py.
+# Cards whose normalized content is already in the deck are skipped (see dedup.py).
+INSERT_SQL = """
+    INSERT INTO flashcards (user_id, deck_id, question, answer, category, difficulty, content_hash)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (user_id, deck_id, content_hash) DO NOTHING
+"""
+SELECT_ALL_SQL = "SELECT id, question, answer, category, difficulty FROM flashcards"
+SELECT_BY_ID_SQL = "SELECT id, question, answer FROM flashcards WHERE id = ? AND user_id = ? AND deck_id = ?"
+SELECT_BY_IDS_SQL = SELECT_ALL_SQL + " WHERE user_id = ? AND deck_id = ? AND id IN ({marks})"
+SELECT_IDS_SQL = "SELECT id FROM flashcards"
+COUNT_SQL = "SELECT COUNT(*) FROM flashcards"
+ID_RANGE_SQL = """
+    SELECT COALESCE((SELECT MIN(id) FROM flashcards WHERE user_id = ? AND deck_id = ?), 0),
+           COALESCE((SELECT MAX(id) FROM flashcards WHERE user_id = ? AND deck_id = ?), 0)
+"""
+DELETE_SQL = "DELETE FROM flashcards WHERE id = ? AND user_id = ? AND deck_id = ?"
+UPDATE_SQL = """
+    UPDATE flashcards
+    SET question = ?, answer = ?, category = ?, difficulty = ?, content_hash = ?
+    WHERE id = ? AND user_id = ? AND deck_id = ?
+"""
+SEARCH_SQL = """
+    SELECT f.id, f.question, f.answer, f.category, f.difficulty,
+           highlight(flashcards_fts, 0, '[', ']'),
+           snippet(flashcards_fts, 1, '[', ']', '…', 12)
+    FROM flashcards_fts JOIN flashcards f ON f.id = flashcards_fts.rowid
+    WHERE flashcards_fts MATCH ? AND f.user_id = ? AND f.deck_id = ?
+    ORDER BY bm25(flashcards_fts, 2.0, 1.0)
+    LIMIT ?
+"""
+
+# Reads of the whole deck are served from memory; see deck_cache.py.
+_deck = DeckCache(DIFFICULTIES)
+
+_change_listeners = []
+
+
+def add_change_listener(callback):
+    """Register callback(card_id), called after a card is updated or deleted."""
+    _change_listeners.append(callback)
+
+
+def _notify_change(card_id):
+    for callback in _change_listeners:
+        callback(card_id)
+
+
 def init_db():
-    conn = sqlite3.connect("flashcards.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS flashcards (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            question TEXT NOT NULL,
-            answer TEXT NOT NULL,
-            category TEXT,
-            difficulty TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
+    """Apply any pending schema migrations (a no-op once current)."""
+    migrate(DB_NAME, FLASHCARD_MIGRATIONS)
+
+
+def difficulty_code(name):
+    """Map a difficulty name (any case) to its stored code; ValueError for unknown names."""
+    code = _DIFFICULTY_CODES.get(str(name or "").strip().lower())
+    if code is None:
+        raise ValueError(f"Unknown difficulty {name!r} (expected one of {', '.join(DIFFICULTIES)})")
+    return code
 
 
 def add_flashcard_db(question, answer, category="General", difficulty="Easy"):
-    conn = sqlite3.connect("flashcards.db")
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO flashcards (question, answer, category, difficulty) VALUES (?, ?, ?, ?)",
-        (question, answer, category, difficulty)
+    """Add a card; returns its id, or None if an identical card already exists."""
+    cursor = get_connection(DB_NAME).execute(
+        INSERT_SQL,
+        (*owner(), question, answer, category, difficulty_code(difficulty), content_hash(question, answer))
     )
-    conn.commit()
-    conn.close()
+    return cursor.lastrowid if cursor.rowcount > 0 else None
+
+
+def row_to_card(row):
+    return {
+        "id": row[0],
+        "question": row[1],
+        "answer": row[2],
+        "category": row[3],
+        "difficulty": DIFFICULTIES[row[4]]
+    }
 
 
 def get_all_flashcards():
-    conn = sqlite3.connect("flashcards.db")
-    c = conn.cursor()
-    c.execute("SELECT id, question, answer, category, difficulty FROM flashcards")
-    rows = c.fetchall()
-    conn.close()
-    return [
-        {
-            "id": row[0],
-            "question": row[1],
-            "answer": row[2],
-            "category": row[3] or "General",
-            "difficulty": row[4] or "Easy"
-        }
-        for row in rows
-    ]
+    return _deck.cards(DB_NAME, owner())
+
+
+def _filters(category, difficulty):
+    """Normalize category/difficulty filters the way _where() interprets them."""
+    return category or None, DIFFICULTIES[difficulty_code(difficulty)] if difficulty else None
+
+
+def _where(category, difficulty):
+    """WHERE clause for the current deck and the optional filters."""
+    clauses, params = ["user_id = ?", "deck_id = ?"], list(owner())
+    if category:
+        clauses.append("category = ?")
+        params.append(category)
+    if difficulty:
+        clauses.append("difficulty = ?")
+        params.append(difficulty_code(difficulty))
+    return " WHERE " + " AND ".join(clauses), params
+
+
+def query_flashcards(category=None, difficulty=None, limit=None, offset=0, after=None):
+    """
+    Return flashcards matching the optional category/difficulty filters,
+    ordered by id, from the deck cache. Pass the last id of a page as
+    `after` to get the next page.
+    """
+    return _deck.cards(DB_NAME, owner(), *_filters(category, difficulty), limit=limit, offset=offset, after=after)
+
+
+def deck_version():
+    """A number that changes whenever any card is added, edited or deleted."""
+    return _deck.version(DB_NAME)
+
+
+def iter_flashcards(category=None, difficulty=None, chunk_size=1000):
+    """
+    Yield flashcards one at a time, fetching `chunk_size` rows per round
+    trip so that the full result set is never held in memory.
+    """
+    where, params = _where(category, difficulty)
+    cursor = get_connection(DB_NAME).execute(SELECT_ALL_SQL + where + " ORDER BY id", params)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield row_to_card(row)
+    finally:
+        cursor.close()
+
+
+def _probe_ids(conn, where, params, low, high, size, rng):
+    """Draw random ids in [low, high] until `size` distinct matching cards are found."""
+    sql = SELECT_IDS_SQL + where + f" AND id IN ({', '.join('?' * PROBE_BATCH)})"
+    picked, seen = [], set()
+    for _ in range(4 * size * MAX_PROBES_PER_CARD // PROBE_BATCH + 1):
+        probes = [rng.randint(low, high) for _ in range(PROBE_BATCH)]
+        found = {row[0] for row in conn.execute(sql, params + probes)}
+        for card_id in probes:
+            if card_id in found and card_id not in seen:
+                seen.add(card_id)
+                picked.append(card_id)
+                if len(picked) == size:
+                    return picked
+    return None  # cards were deleted meanwhile; let the caller fall back
+
+
+def _reservoir(cursor, size, rng):
+    sample = []
+    for i, (card_id,) in enumerate(cursor):
+        if i < size:
+            sample.append(card_id)
+        else:
+            j = rng.randrange(i + 1)
+            if j < size:
+                sample[j] = card_id
+    rng.shuffle(sample)
+    return sample
+
+
+def sample_flashcard_ids(category=None, difficulty=None, size=20, rng=random):
+    """
+    Return up to `size` distinct ids of cards matching the filters, drawn
+    uniformly at random and in random order, without loading the deck.
+    Random ids are probed in batches while matching cards are dense in
+    the id range; otherwise a reservoir sample is taken over a cursor of
+    the matching ids.
+    """
+    conn = get_connection(DB_NAME)
+    where, params = _where(category, difficulty)
+    matching = conn.execute(COUNT_SQL + where, params).fetchone()[0]
+    size = min(size, matching)
+    if not size:
+        return []
+    low, high = conn.execute(ID_RANGE_SQL, owner() * 2).fetchone()
+    if size * 2 <= matching and high - low + 1 <= matching * MAX_PROBES_PER_CARD:
+        ids = _probe_ids(conn, where, params, low, high, size, rng)
+        if ids is not None:
+            return ids
+    return _reservoir(conn.execute(SELECT_IDS_SQL + where, params), size, rng)
+
+
+def get_flashcards_by_ids(ids):
+    """
+    Return the current deck's cards with the given ids, in the same order;
+    missing ids and other decks' cards are skipped.
+    """
+    if not ids:
+        return []
+    sql = SELECT_BY_IDS_SQL.format(marks=", ".join("?" * len(ids)))
+    cards = {row[0]: row for row in get_connection(DB_NAME).execute(sql, [*owner(), *ids])}
+    return [row_to_card(cards[card_id]) for card_id in ids if card_id in cards]
+
+
+def count_flashcards(category=None, difficulty=None):
+    return _deck.count(DB_NAME, owner(), *_filters(category, difficulty))
+
+
+def get_categories():
+    """Return the sorted list of distinct categories."""
+    return [category for category, _ in _deck.category_counts(DB_NAME, owner())]
+
+
+def get_category_counts():
+    """Return [(category, number_of_cards)], sorted by category."""
+    return _deck.category_counts(DB_NAME, owner())
+
+
+def deck_cache_info():
+    """Deck cache counters: hits, misses, reloads, patched cards, size in bytes."""
+    return _deck.info()
+
+
+def clear_deck_cache():
+    """Drop the in-memory deck so the next read reloads it (benchmarks time cold reads this way)."""
+    _deck.invalidate()
+
+
+def _fts_query(text):
+    """
+    Turn free text into an FTS5 query: every word must match, and the
+    last word is treated as a prefix so results update while typing.
+    """
+    words = [w.replace('"', '""') for w in text.split()]
+    if not words:
+        return None
+    terms = [f'"{w}"' for w in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def search_flashcards(text, limit=50):
+    """
+    Full-text search over questions and answers, best matches first.
+    Each result carries highlighted `question_hl` and an `answer_snippet`.
+    """
+    query = _fts_query(text)
+    if query is None:
+        return []
+    results = []
+    for row in get_connection(DB_NAME).execute(SEARCH_SQL, (query, *owner(), limit)):
+        card = row_to_card(row)
+        card["question_hl"] = row[5]
+        card["answer_snippet"] = row[6]
+        results.append(card)
+    return results
 
 
 def get_flashcard_by_id(flashcard_id):
     """
-    Retrieve a specific flashcard by its ID.
+    Retrieve a flashcard of the current deck by its ID.
     Returns a dictionary with id, question, and answer.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        c = conn.cursor()
-        c.execute("SELECT id, question, answer FROM flashcards WHERE id = ?", (flashcard_id,))
-        row = c.fetchone()
-        if row:
-            return {"id": row[0], "question": row[1], "answer": row[2]}
-        return None
+    row = get_connection(DB_NAME).execute(SELECT_BY_ID_SQL, (flashcard_id, *owner())).fetchone()
+    if row:
+        return {"id": row[0], "question": row[1], "answer": row[2]}
+    return None
 
 def delete_flashcard(flashcard_id):
     """
-    Delete a flashcard by its ID.
+    Delete a flashcard of the current deck by its ID.
+    Returns True if the card existed.
     """
-    with sqlite3.connect(DB_NAME) as conn:
-        c = conn.cursor()
-        c.execute("DELETE FROM flashcards WHERE id = ?", (flashcard_id,))
-        conn.commit()
+    deleted = get_connection(DB_NAME).execute(DELETE_SQL, (flashcard_id, *owner())).rowcount > 0
+    if deleted:
+        _notify_change(flashcard_id)
+    return deleted
 
 def update_flashcard(card_id, question, answer, category, difficulty):
-    conn = sqlite3.connect("flashcards.db")
-    c = conn.cursor()
-    c.execute("""
-        UPDATE flashcards
-        SET question = ?, answer = ?, category = ?, difficulty = ?
-        WHERE id = ?
-    """, (question, answer, category, difficulty, card_id))
-    conn.commit()
-    conn.close()
+    """Update a flashcard of the current deck; returns True if the card existed."""
+    try:
+        cursor = get_connection(DB_NAME).execute(UPDATE_SQL, (question, answer, category, difficulty_code(difficulty),
+                                                              content_hash(question, answer), card_id, *owner()))
+    except sqlite3.IntegrityError:
+        raise ValueError("Another flashcard already has this question and answer.") from None
+    updated = cursor.rowcount > 0
+    if updated:
+        _notify_change(card_id)
+    return updated
 
 
+# Call counts and latencies when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("row_to_card", "difficulty_code", "add_change_listener"))
@@ -0,0 +1,279 @@
+"""
+Answer grading.
+
+Answers are compared after normalization (Unicode NFKC, case folding,
+accents, punctuation and whitespace), then by numeric value ("15" ==
+"fifteen" == "15.0"), then by a bounded edit distance for typos that
+leave the answer's digits alone.
+Extra checks can be added with register_grader().
+
+The normalized forms of each card's correct answer are cached per card
+id in an LRU and dropped whenever flashcard_db updates or deletes the card.
+
+After the graders change, stored review events can be re-graded:
+    python main.py regrade [--apply]
+"""
+import argparse
+import re
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+from functools import lru_cache
+
+from database import get_connection, transaction
+import flashcard_db
+import score_logger
+from profiles import owner
+
+CACHE_SIZE = 4096
+MIN_FUZZY_LENGTH = 4      # shorter answers must match exactly
+FUZZY_CHARS_PER_EDIT = 6  # allow one typo per this many characters
+
+# Only true punctuation goes: quotes, brackets, sentence marks, and . , / -
+# outside numbers. Symbols that carry meaning (C++, C#, 2^3, 12:30, 50%,
+# x = 2) are kept.
+_PUNCTUATION = re.compile(
+    r"[\"'`“”‘’«»()\[\]{}!?;¡¿…–—]|(?<!\d)[.,/]|[.,/](?!\d)|(?<![\w])-(?!\d)|-(?![\w])"
+)
+_WHITESPACE = re.compile(r"\s+")
+_NUMBER = re.compile(r"-?\d+(?:,\d{3})*(?:\.\d+)?")
+SELECT_EVENTS_SQL = "SELECT id, card_id, answer, correct FROM review_events WHERE user_id = ? AND deck_id = ? ORDER BY id"
+SELECT_ANSWERS_SQL = "SELECT id, answer FROM flashcards WHERE user_id = ? AND deck_id = ? AND id IN ({marks})"
+UPDATE_EVENT_SQL = "UPDATE review_events SET correct = ? WHERE id = ?"
+
+_FRACTION = re.compile(r"(-?\d+)\s*/\s*(\d+)")
+_DIGITS = re.compile(r"\d+")
+
+_UNITS = {
+    "zero": 0, "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+    "thirteen": 13, "fourteen": 14, "fifteen": 15, "sixteen": 16,
+    "seventeen": 17, "eighteen": 18, "nineteen": 19,
+}
+_TENS = {
+    "twenty": 20, "thirty": 30, "forty": 40, "fifty": 50,
+    "sixty": 60, "seventy": 70, "eighty": 80, "ninety": 90,
+}
+_SCALES = {"hundred": 100, "thousand": 1000, "million": 1000000, "billion": 1000000000}
+
+AnswerKey = namedtuple("AnswerKey", ["normalized", "compact", "number"])
+
+
+def normalize(text):
+    """Lower-case, strip accents and punctuation, and collapse whitespace."""
+    text = unicodedata.normalize("NFKD", unicodedata.normalize("NFKC", text or "").casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _words_to_number(words):
+    """The value of number words, or None if they don't spell one number ("one two")."""
+    total = current = 0
+    last = None  # kind of the previous number word: "unit", "tens" or "scale"
+    for word in words:
+        if word == "and":
+            continue
+        if word in _UNITS:
+            if last == "unit" or (last == "tens" and _UNITS[word] >= 10):
+                return None
+            current += _UNITS[word]
+            last = "unit"
+        elif word in _TENS:
+            if last in ("unit", "tens"):
+                return None
+            current += _TENS[word]
+            last = "tens"
+        elif word == "hundred":
+            current = max(current, 1) * 100
+            last = "scale"
+        elif word in _SCALES:
+            total += max(current, 1) * _SCALES[word]
+            current = 0
+            last = "scale"
+        else:
+            return None
+    if last is None:
+        return None  # no number words at all, e.g. a lone "minus" or "and"
+    return total + current
+
+
+def parse_number(normalized):
+    """Return the numeric value of a normalized answer, or None."""
+    if not normalized:
+        return None
+    if _NUMBER.fullmatch(normalized):
+        return float(normalized.replace(",", ""))
+    fraction = _FRACTION.fullmatch(normalized)
+    if fraction and int(fraction.group(2)):
+        return int(fraction.group(1)) / int(fraction.group(2))
+    words = normalized.replace("-", " ").split()
+    negative = words[:1] == ["minus"] or words[:1] == ["negative"]
+    value = _words_to_number(words[1:] if negative else words)
+    if value is None:
+        return None
+    return float(-value if negative else value)
+
+
+def make_key(answer):
+    normalized = normalize(answer)
+    return AnswerKey(normalized, normalized.replace(" ", ""), parse_number(normalized))
+
+
+def bounded_edit_distance(a, b, limit):
+    """
+    Levenshtein distance between a and b, or limit + 1 as soon as it is
+    known to exceed `limit`. Only a band of width 2 * limit + 1 is computed.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    if len(a) > len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        lo, hi = max(1, i - limit), min(len(b), i + limit)
+        current = [i] + [limit + 1] * len(b)
+        for j in range(lo, hi + 1):
+            cost = 0 if ca == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+        if min(current[lo - 1:hi + 1]) > limit:
+            return limit + 1
+        previous = current
+    return previous[len(b)]
+
+
+# ------------- Graders -------------
+# Each grader takes (expected AnswerKey, given AnswerKey) and returns True
+# when it accepts the answer. They are tried in order.
+
+def exact_grader(expected, given):
+    return expected.compact == given.compact
+
+
+def numeric_grader(expected, given):
+    return expected.number is not None and given.number is not None and \
+        abs(expected.number - given.number) <= 1e-9 * max(1.0, abs(expected.number))
+
+
+def fuzzy_grader(expected, given):
+    if expected.number is not None or len(expected.compact) < MIN_FUZZY_LENGTH:
+        return False
+    if _DIGITS.findall(expected.compact) != _DIGITS.findall(given.compact):
+        return False  # a typo may not change a number: "World War 2" is not "World War 3"
+    limit = len(expected.compact) // FUZZY_CHARS_PER_EDIT or 1
+    return bounded_edit_distance(expected.compact, given.compact, limit) <= limit
+
+
+GRADERS = [exact_grader, numeric_grader, fuzzy_grader]
+
+
+def register_grader(grader):
+    """Add a custom grader, tried after the built-in ones."""
+    GRADERS.append(grader)
+
+
+# ------------- Cache -------------
+_cache = OrderedDict()  # card id -> (answer text, AnswerKey)
+_cache_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def answer_key(card_id, answer):
+    """Return the cached AnswerKey for a card, computing it on a miss."""
+    with _cache_lock:
+        entry = _cache.get(card_id)
+        if entry is not None and entry[0] == answer:
+            _cache.move_to_end(card_id)
+            _stats["hits"] += 1
+            return entry[1]
+        _stats["misses"] += 1
+    key = make_key(answer)
+    with _cache_lock:
+        _cache[card_id] = (answer, key)
+        _cache.move_to_end(card_id)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return key
+
+
+def invalidate_card(card_id):
+    with _cache_lock:
+        _cache.pop(card_id, None)
+
+
+def cache_info():
+    with _cache_lock:
+        return {"size": len(_cache), **_stats}
+
+
+flashcard_db.add_change_listener(invalidate_card)
+
+
+def check_answer(expected, given):
+    """Grade `given` against the answer text `expected` (no caching)."""
+    return _grade(make_key(expected), given)
+
+
+def grade(card, given):
+    """Grade an answer to a card dict, using the per-card answer cache."""
+    return _grade(answer_key(card["id"], card["answer"]), given)
+
+
+# Given answers repeat a lot ("", "i don't know", common typos), so their
+# normalized forms are memoized by text.
+_given_key = lru_cache(maxsize=CACHE_SIZE)(make_key)
+
+
+def _grade(expected, given):
+    given = _given_key(given or "")
+    if not given.normalized:
+        return False
+    return any(grader(expected, given) for grader in GRADERS)
+
+
+def regrade_review_events(apply=False, chunk_size=5000):
+    """
+    Re-grade the current deck's stored review events with the current
+    graders. Returns (checked, changed); with apply=True the correct flags
+    are updated. Quiz scores already in score_log are left as logged.
+    """
+    events = get_connection(score_logger.SCORE_DB).execute(SELECT_EVENTS_SQL, owner())
+    cards = get_connection(flashcard_db.DB_NAME)
+    checked = 0
+    changes = []
+    while True:
+        rows = events.fetchmany(chunk_size)
+        if not rows:
+            break
+        card_ids = sorted({row[1] for row in rows})
+        answers = {}
+        for start in range(0, len(card_ids), 500):
+            chunk = card_ids[start:start + 500]
+            sql = SELECT_ANSWERS_SQL.format(marks=", ".join("?" * len(chunk)))
+            answers.update(cards.execute(sql, [*owner(), *chunk]).fetchall())
+        for event_id, card_id, given, correct in rows:
+            if card_id not in answers:
+                continue
+            checked += 1
+            now_correct = int(grade({"id": card_id, "answer": answers[card_id]}, given))
+            if now_correct != correct:
+                changes.append((now_correct, event_id))
+    if apply and changes:
+        with transaction(score_logger.SCORE_DB) as conn:
+            conn.executemany(UPDATE_EVENT_SQL, changes)
+    return checked, len(changes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py regrade",
+                                     description="Re-grade stored answers with the current graders.")
+    parser.add_argument("--apply", action="store_true", help="update the stored results (default: only report)")
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    checked, changed = regrade_review_events(apply=args.apply)
+    verb = "Changed" if args.apply else "Would change"
+    print(f"🔁 Re-graded {checked:,} answers. {verb} {changed:,} result(s).")
+    if changed and not args.apply:
+        print("Run again with --apply to update them.")
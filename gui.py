@@ -2,56 +2,142 @@ import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import tkinter as tk
 from tkinter import messagebox, filedialog
-from collections import defaultdict
-import csv
-import sqlite3
-import matplotlib.pyplot as plt
+import os
+import subprocess
+import sys
+
+import background
+import perf
+from background import run_async, when_idle, TaskCancelled
+
+from attachments import add_attachment, extract_attachment
+from importer import import_file, PARSERS
+from exporter import export_flashcards as export_to_file
+from quiz_engine import QuizSession, QuizRecorder, select_cards, SESSION_SIZE
+from thumbnails import ThumbnailCache
+from profiles import (
+    current, prepare, activate, get_user, create_user, list_users, list_decks, class_leaderboard, DEFAULT_DECK
+)
 
 from score_logger import (
-    init_score_db, get_score_history, clear_score_history, log_score,
-    update_leaderboard, get_leaderboard, init_leaderboard_db
+    init_score_db, get_score_history, iter_score_history, format_score, clear_score_history,
+    HISTORY_PAGE_SIZE, REVIEW_DIFFICULTY, get_leaderboard, get_difficulty_stats
 )
 from flashcard_db import (
-    init_db, add_flashcard_db, get_all_flashcards as db_get_all_flashcards,
+    init_db, add_flashcard_db, query_flashcards, count_flashcards, get_categories, get_category_counts,
+    search_flashcards,
     delete_flashcard, update_flashcard
 )
 
 # ------------- Utilities -------------
 def get_all_flashcards(category=None, difficulty=None):
-    all_cards = db_get_all_flashcards()
-    if category:
-        all_cards = [card for card in all_cards if card['category'] == category]
-    if difficulty:
-        all_cards = [card for card in all_cards if card['difficulty'] == difficulty]
-    return all_cards
+    return query_flashcards(category=category, difficulty=difficulty)
 
 # ------------- Leaderboard -------------
 def open_leaderboard():
-    leaderboard = get_leaderboard()
     win = tk.Toplevel()
     win.title("🏆 Leaderboard")
 
-    win.geometry("300x250")
+    win.geometry("300x450")
+
+    tk.Label(win, text="🏆 My High Scores by Difficulty", font=("Arial", 12, "bold")).pack(pady=10)
+
+    def show(result):
+        leaderboard, everyone = result
+        if not leaderboard:
+            tk.Label(win, text="No scores recorded yet.").pack()
+        else:
+            for difficulty, score in leaderboard:
+                tk.Label(win, text=f"{difficulty}: {score}").pack(pady=2)
+
+        tk.Label(win, text="👥 Class Leaderboard", font=("Arial", 12, "bold")).pack(pady=(15, 5))
+        if not everyone:
+            tk.Label(win, text="No scores recorded yet.").pack()
+        for name, difficulty, score in everyone[:10]:
+            tk.Label(win, text=f"{name} ({difficulty}): {score}").pack(pady=1)
+
+    run_async(lambda: (get_leaderboard(), class_leaderboard()), on_success=show, loading=win)
+
+# ------------- Users & Decks -------------
+def open_switch_user(on_switch):
+    win = tk.Toplevel()
+    win.title("👤 Switch User")
+    win.geometry("300x300")
+
+    user_name, deck_name = current()
+
+    ttk.Label(win, text="User (type a new name to add one):").pack(pady=(10, 0))
+    user_cb = ttk.Combobox(win, values=[user_name])
+    user_cb.set(user_name)
+    user_cb.pack(pady=5)
+
+    ttk.Label(win, text="Deck (type a new name to add one):").pack(pady=(10, 0))
+    deck_cb = ttk.Combobox(win, values=[deck_name])
+    deck_cb.set(deck_name)
+    deck_cb.pack(pady=5)
+
+    sharded_var = tk.BooleanVar(value=False)
+    ttk.Checkbutton(win, text="Store a new user's data separately", variable=sharded_var).pack(pady=5)
+
+    def show_decks(decks):
+        deck_cb.config(values=decks)
+        if decks and deck_cb.get() not in decks:
+            deck_cb.set(decks[0])
+
+    user_cb.bind("<<ComboboxSelected>>", lambda event: run_async(list_decks, user_cb.get(), on_success=show_decks))
+    run_async(list_users, on_success=lambda users: user_cb.config(values=[name for _, name, _ in users]),
+              loading=win)
+    run_async(list_decks, user_name, on_success=show_decks)
+
+    def switch():
+        user, deck = user_cb.get().strip(), deck_cb.get().strip() or DEFAULT_DECK
+        if not user:
+            messagebox.showwarning("Missing User", "Please enter a user name.", parent=win)
+            return
+        sharded = sharded_var.get()
+
+        def switch_to():
+            if get_user(user) is None:
+                create_user(user, sharded)
+            return prepare(user, deck)
+
+        def switched(profile):
+            # The databases in use are process-wide: change them only
+            # once no task is still reading or writing the old ones.
+            def switch_now():
+                activate(profile)
+                if win.winfo_exists():
+                    win.destroy()
+                on_switch()
+            when_idle(switch_now)
+
+        run_async(switch_to, on_success=switched, loading=win)
 
-    tk.Label(win, text="🏆 High Scores by Difficulty", font=("Arial", 12, "bold")).pack(pady=10)
-    if not leaderboard:
-        tk.Label(win, text="No scores recorded yet.").pack()
-    else:
-        for difficulty, score in leaderboard:
-            tk.Label(win, text=f"{difficulty}: {score}").pack(pady=2)
+    tk.Button(win, text="Switch", command=switch).pack(pady=10)
 
 # ------------- GUI Entry Point -------------
-def main_gui():
+def init_databases():
     init_db()
     init_score_db()
-    init_leaderboard_db()
 
+
+def main_gui():
     root = ttk.Window(themename="cosmo")
     root.title("📚 Flashcard App")
-    root.geometry("400x500") 
+    root.geometry("400x680")
+    background.init(root)
 
     tk.Label(root, text="Flashcard Study App", font=("Arial", 16)).pack(pady=10)
 
+    user_label = tk.Label(root, text="", font=("Segoe UI", 10))
+    user_label.pack()
+
+    def show_user():
+        user_name, deck_name = current()
+        user_label.config(text=f"👤 {user_name} · 🗂️ {deck_name}")
+
+    show_user()
+
     # ---------- Theme Switcher ----------
     theme_var = tk.StringVar(value="cosmo")
     themes = ["cosmo", "darkly", "morph", "journal", "superhero", "cyborg"]
@@ -64,20 +150,36 @@ def main_gui():
 
     # ---------- Main Buttons ----------
     buttons = [
+        ("👤 Switch User / Deck", lambda: open_switch_user(show_user)),
         ("Add Flashcard", open_add_flashcard),
         ("View Flashcards", open_view_flashcards),
         ("Take Quiz (GUI)", open_quiz_gui),
+        ("📅 Review Due Cards", open_due_review),
         ("View Score History", open_score_history_gui),
         ("🏆 Leaderboard", open_leaderboard),
         ("Export / Reports", open_export_window),
         ("View Difficulty Chart 📊", view_chart_by_difficulty),
+        ("📈 Progress Charts", view_progress_charts),
         ("Exit", root.quit)
     ]
 
+    # Buttons stay disabled until the schema check has run in the background
+    data_buttons = []
     for text, cmd in buttons:
-        tk.Button(root, text=text, width=25, command=cmd).pack(pady=5)
+        btn = tk.Button(root, text=text, width=25, command=cmd)
+        btn.pack(pady=5)
+        if cmd is not root.quit:
+            btn.config(state="disabled")
+            data_buttons.append(btn)
+
+    def on_ready(_):
+        for btn in data_buttons:
+            btn.config(state="normal")
+
+    run_async(init_databases, on_success=on_ready, loading=root)
 
     root.mainloop()
+    background.shutdown()
 
 # ------------- Flashcard Management -------------
 def open_add_flashcard():
@@ -85,11 +187,8 @@ def open_add_flashcard():
     win.title("Add Flashcard")
     win.geometry("400x350")
 
-    # --- Get existing categories ---
-    all_flashcards = get_all_flashcards()
-    existing_categories = sorted(set(card['category'] for card in all_flashcards))
-    if not existing_categories:
-        existing_categories = ["General"]
+    # --- Existing categories are filled in once loaded ---
+    existing_categories = ["General"]
 
     # --- Question ---
     tk.Label(win, text="Question").grid(row=0, column=0, padx=10, pady=5, sticky="w")
@@ -122,6 +221,14 @@ def open_add_flashcard():
 
     category_var.trace_add("write", toggle_new_category)
 
+    def show_categories(categories):
+        if categories:
+            category_cb.config(values=categories + ["New Category..."])
+            if category_var.get() not in categories and category_var.get() != "New Category...":
+                category_cb.set(categories[0])
+
+    run_async(get_categories, on_success=show_categories, loading=win)
+
     # --- Difficulty Dropdown ---
     tk.Label(win, text="Difficulty").grid(row=4, column=0, padx=10, pady=5, sticky="w")
     difficulty_cb = ttk.Combobox(win, values=["Easy", "Medium", "Hard"], state="readonly")
@@ -135,71 +242,305 @@ def open_add_flashcard():
         category = new_cat_var.get().strip() if category_var.get() == "New Category..." else category_var.get()
         difficulty = difficulty_cb.get()
 
-        if question and answer and category:
-            add_flashcard_db(question, answer, category, difficulty)
+        def added(is_new):
+            if not is_new:
+                messagebox.showwarning("Duplicate", "This flashcard already exists.", parent=win)
+                return
             messagebox.showinfo("Success", "Flashcard added!")
             win.destroy()
+
+        if question and answer and category:
+            run_async(add_flashcard_db, question, answer, category, difficulty, on_success=added, loading=win)
         else:
             messagebox.showwarning("Input Error", "All fields are required.")
 
     ttk.Button(win, text="Add Flashcard", command=submit, bootstyle="success").grid(row=5, column=0, columnspan=2, pady=15)
 
 
-def open_view_flashcards():
-    def refresh():
-        win.destroy()
-        open_view_flashcards()
+VIEW_PAGE_SIZE = 200
+SEARCH_DEBOUNCE_MS = 250
+SEARCH_MIN_CHARS = 2
+ATTACHMENT_TYPES = [("Images and audio", "*.png *.gif *.jpg *.jpeg *.webp *.mp3 *.wav *.ogg *.m4a"),
+                    ("All files", "*.*")]
+
+# Shared by the card browser and quiz windows; see thumbnails.py.
+thumbnails = ThumbnailCache()
+
+
+def show_media(label, media, image):
+    """Show a side's thumbnail in `label`, captioned with its attachments' names."""
+    label.config(image=image or "", text="  ".join(
+        ("🔊 " if a["kind"] == "audio" else "🖼️ ") + a["name"] for a in media))
+    label.image = image  # Tk drops images nothing in Python refers to
+
+
+def play_attachment(attachment):
+    """Copy an audio attachment to a temporary file and open it with the system player."""
+    def play(path):
+        if hasattr(os, "startfile"):
+            os.startfile(path)
+        else:
+            subprocess.Popen(["open" if sys.platform == "darwin" else "xdg-open", path])
 
+    run_async(extract_attachment, attachment["id"], on_success=play)
+
+
+def open_view_flashcards():
+    """
+    Browse flashcards in a Treeview grouped by category. Each category is
+    loaded lazily, one page at a time, when it is expanded or scrolled to
+    its end, so only the rows that have been looked at are ever built.
+    """
     win = tk.Toplevel()
     win.title("View Flashcards")
-    win.geometry("450x400")
+    win.geometry("600x620")
 
     tk.Label(win, text="📋 Your Flashcards", font=("Arial", 14)).pack(pady=5)
+    run_async(get_category_counts, on_success=lambda counts: build_flashcard_browser(win, counts), loading=win)
 
-    # ---- Scrollable Canvas Setup ----
-    container = tk.Frame(win)
-    canvas = tk.Canvas(container, height=300)
-    scrollbar = tk.Scrollbar(container, orient="vertical", command=canvas.yview)
-    scrollable_frame = tk.Frame(canvas)
 
-    scrollable_frame.bind(
-        "<Configure>",
-        lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-    )
+def build_flashcard_browser(win, category_counts):
+    if not category_counts:
+        tk.Label(win, text="No flashcards available.").pack()
+        return
 
-    canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-    canvas.configure(yscrollcommand=scrollbar.set)
+    search_frame = tk.Frame(win)
+    search_frame.pack(fill="x", padx=5, pady=(0, 5))
+    tk.Label(search_frame, text="🔍").pack(side="left")
+    search_var = tk.StringVar()
+    tk.Entry(search_frame, textvariable=search_var).pack(side="left", fill="x", expand=True)
+    search_status = tk.Label(search_frame, text="", width=12)
+    search_status.pack(side="right")
 
-    container.pack(fill="both", expand=True)
-    canvas.pack(side="left", fill="both", expand=True)
+    # ---- Treeview Setup ----
+    container = tk.Frame(win)
+    container.pack(fill="both", expand=True, padx=5)
+    tree = ttk.Treeview(container, columns=("answer", "difficulty"), show="tree headings")
+    tree.heading("#0", text="Question")
+    tree.heading("answer", text="Answer")
+    tree.heading("difficulty", text="Difficulty")
+    tree.column("#0", width=260)
+    tree.column("answer", width=200)
+    tree.column("difficulty", width=80, stretch=False)
+    scrollbar = ttk.Scrollbar(container, orient="vertical", command=tree.yview)
+    tree.pack(side="left", fill="both", expand=True)
     scrollbar.pack(side="right", fill="y")
 
-    # ✅ Optional: Mouse wheel support
-    def _on_mousewheel(event):
-        canvas.yview_scroll(int(-1 * (event.delta / 120)), "units")
-    scrollable_frame.bind_all("<MouseWheel>", _on_mousewheel)
+    cards = {}        # row iid -> card dict
+    categories = {}   # category iid -> {"name", "count", "last", "more"}
+    category_iids = {}
 
-    # ---- Load flashcards ----
-    cards = get_all_flashcards()
-    if not cards:
-        tk.Label(scrollable_frame, text="No flashcards available.").pack()
-        return
+    def category_text(info):
+        return f"📂 {info['name']} ({info['count']})"
 
-    cards_by_cat = defaultdict(list)
-    for card in cards:
-        cards_by_cat[card['category']].append(card)
+    for name, count in category_counts:
+        iid = tree.insert("", "end", text="", open=False)
+        info = {"name": name, "count": count, "last": None, "loading": False,
+                "more": tree.insert(iid, "end", text="Loading...")}
+        tree.item(iid, text=category_text(info))
+        categories[iid] = info
+        category_iids[name] = iid
 
-    for category, cards_in_cat in cards_by_cat.items():
-        tk.Label(scrollable_frame, text=f"📂 {category}", font=("Arial", 12, "bold")).pack(anchor="w", padx=5, pady=5)
-        for card in cards_in_cat:
-            frame = tk.Frame(scrollable_frame, borderwidth=1, relief="solid", padx=5, pady=5)
-            frame.pack(fill="x", padx=5, pady=5)
-            tk.Label(frame, text=f"Q: {card['question']}", anchor="w", wraplength=350).pack(anchor="w")
-            tk.Label(frame, text=f"A: {card['answer']}", anchor="w", wraplength=350).pack(anchor="w")
-            btn_frame = tk.Frame(frame)
-            btn_frame.pack(anchor="e", pady=3)
-            tk.Button(btn_frame, text="❌ Delete", fg="red", command=lambda c=card: (delete_flashcard(c['id']), refresh())).pack(side="right", padx=2)
-            tk.Button(btn_frame, text="✏️ Edit", command=lambda c=card: open_edit_flashcard(c, refresh)).pack(side="right", padx=2)
+    def load_page(cat_iid):
+        info = categories[cat_iid]
+        if info["more"] is None or info["loading"]:
+            return
+        info["loading"] = True
+        tree.item(info["more"], text="Loading...")
+
+        def show_page(page):
+            info["loading"] = False
+            tree.delete(info["more"])
+            info["more"] = None
+            for card in page:
+                cards[tree.insert(cat_iid, "end", text=card["question"], values=(card["answer"], card["difficulty"]))] = card
+            if page:
+                info["last"] = page[-1]["id"]
+            if len(page) == VIEW_PAGE_SIZE:
+                info["more"] = tree.insert(cat_iid, "end", text="⬇ Load more...")
+
+        # Pages follow the last id shown, so edits moving cards between
+        # categories never make a page skip or repeat a card.
+        run_async(query_flashcards, category=info["name"], limit=VIEW_PAGE_SIZE, after=info["last"],
+                  on_success=show_page, loading=win)
+
+    def on_open(event=None):
+        cat_iid = tree.focus()
+        if cat_iid in categories and categories[cat_iid]["last"] is None:
+            load_page(cat_iid)
+
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if float(last) < 0.98:
+            return
+        for cat_iid, info in categories.items():
+            if info["more"] is not None and tree.item(cat_iid, "open") and tree.bbox(info["more"]):
+                load_page(cat_iid)
+
+    # ---- Attachment preview (thumbnails load off the Tk thread) ----
+    preview = tk.Frame(win)
+    preview.pack(side="bottom", fill="x", padx=5)
+    preview_labels = {side: tk.Label(preview, compound="top", wraplength=280) for side in ("question", "answer")}
+    for label in preview_labels.values():
+        label.pack(side="left", expand=True)
+    previewed = {"card": None}
+
+    def show_preview(card):
+        previewed["card"] = card["id"]
+        for side, label in preview_labels.items():
+            def ready(media, image, label=label):
+                if previewed["card"] == card["id"] and label.winfo_exists():
+                    show_media(label, media, image)
+            thumbnails.get(card["id"], side, ready)
+
+    def on_select(event=None):
+        iid = tree.focus()
+        parent = tree.parent(iid)
+        if parent in categories and iid == categories[parent]["more"]:
+            load_page(parent)
+        if iid in cards:
+            show_preview(cards[iid])
+            following = tree.next(iid)
+            if following in cards:
+                for side in preview_labels:
+                    thumbnails.prefetch(cards[following]["id"], side)
+
+    # ---- Search (debounced, queries run off the Tk thread) ----
+    results_iid = tree.insert("", 0, text="🔍 Search results", open=True)
+    tree.detach(results_iid)
+    search = {"after_id": None, "task": None}
+
+    def show_results(results):
+        old_rows = tree.get_children(results_iid)
+        for iid in old_rows:
+            cards.pop(iid, None)
+        if old_rows:
+            tree.delete(*old_rows)
+        for card in results:
+            iid = tree.insert(results_iid, "end", text=card["question_hl"],
+                              values=(card["answer_snippet"], card["difficulty"]))
+            cards[iid] = card
+        for cat_iid in categories:
+            tree.detach(cat_iid)
+        tree.reattach(results_iid, "", 0)
+        search_status.config(text=f"{len(results)} found")
+
+    def clear_results():
+        tree.detach(results_iid)
+        for index, cat_iid in enumerate(categories):
+            tree.reattach(cat_iid, "", index)
+        search_status.config(text="")
+
+    def run_search():
+        search["after_id"] = None
+        if search["task"] is not None:
+            search["task"].cancel()  # a newer search supersedes this one
+            search["task"] = None
+        text = search_var.get().strip()
+        if len(text) < SEARCH_MIN_CHARS:
+            clear_results()
+            return
+        search_status.config(text="Searching...")
+        search["task"] = run_async(search_flashcards, text, on_success=show_results, loading=tree)
+
+    def on_search_changed(*args):
+        if search["after_id"] is not None:
+            win.after_cancel(search["after_id"])
+        search["after_id"] = win.after(SEARCH_DEBOUNCE_MS, run_search)
+
+    search_var.trace_add("write", on_search_changed)
+
+    tree.configure(yscrollcommand=on_scroll)
+    tree.bind("<<TreeviewOpen>>", on_open)
+    tree.bind("<<TreeviewSelect>>", on_select)
+
+    # ---- Single-row updates ----
+    def selected_card():
+        iid = tree.focus()
+        if iid not in cards:
+            messagebox.showwarning("No Selection", "Select a flashcard first.", parent=win)
+            return None, None
+        return iid, cards[iid]
+
+    def adjust_count(cat_iid, delta):
+        if cat_iid not in categories:
+            return
+        info = categories[cat_iid]
+        info["count"] += delta
+        tree.item(cat_iid, text=category_text(info))
+
+    def rows_for(card_id):
+        # A card can be shown twice: under its category and in search results.
+        return [iid for iid, c in cards.items() if c["id"] == card_id]
+
+    def delete_selected():
+        iid, card = selected_card()
+        if card and messagebox.askyesno("Confirm", "Delete this flashcard?", parent=win):
+            run_async(delete_flashcard, card["id"], on_success=lambda _: remove_rows(card["id"]), loading=win)
+
+    def remove_rows(card_id):
+        for row in rows_for(card_id):
+            adjust_count(tree.parent(row), -1)
+            tree.delete(row)
+            del cards[row]
+
+    def on_edited(updated):
+        for row in rows_for(updated["id"]):
+            update_row(row, updated)
+
+    def update_row(iid, updated):
+        old_parent = tree.parent(iid)
+        cards[iid] = updated
+        tree.item(iid, text=updated["question"], values=(updated["answer"], updated["difficulty"]))
+        if old_parent not in categories or updated["category"] == categories[old_parent]["name"]:
+            return
+        adjust_count(old_parent, -1)
+        new_parent = category_iids.get(updated["category"])
+        info = categories.get(new_parent)
+        if info is not None and info["more"] is None:
+            tree.move(iid, new_parent, "end")
+            adjust_count(new_parent, 1)
+        elif info is not None and info["last"] is not None and updated["id"] < info["last"]:
+            tree.move(iid, new_parent, tree.index(info["more"]))  # before "Load more..."
+            adjust_count(new_parent, 1)
+        else:
+            # The row belongs to a category that is new or not loaded this
+            # far; it will be picked up when that category is paged in.
+            tree.delete(iid)
+            del cards[iid]
+            if new_parent is not None:
+                categories[new_parent]["count"] += 1
+                tree.item(new_parent, text=category_text(categories[new_parent]))
+
+    def edit_selected(event=None):
+        iid, card = selected_card()
+        if card:
+            open_edit_flashcard(card, on_edited)
+
+    def attach_to_selected():
+        iid, card = selected_card()
+        if not card:
+            return
+        file_path = filedialog.askopenfilename(parent=win, filetypes=ATTACHMENT_TYPES)
+        if not file_path:
+            return
+        side = "answer" if messagebox.askyesno(
+            "Attach", "Show it with the answer?\n(No shows it with the question.)", parent=win) else "question"
+
+        def attached(_):
+            thumbnails.discard(card["id"])
+            if previewed["card"] == card["id"]:
+                show_preview(card)
+
+        run_async(add_attachment, card["id"], file_path, side, on_success=attached, loading=win)
+
+    tree.bind("<Double-1>", lambda e: edit_selected() if tree.focus() in cards else None)
+
+    btn_frame = tk.Frame(win)
+    btn_frame.pack(anchor="e", pady=5, padx=5)
+    tk.Button(btn_frame, text="❌ Delete", fg="red", command=delete_selected).pack(side="right", padx=2)
+    tk.Button(btn_frame, text="✏️ Edit", command=edit_selected).pack(side="right", padx=2)
+    tk.Button(btn_frame, text="📎 Attach", command=attach_to_selected).pack(side="right", padx=2)
 
 
 def open_edit_flashcard(card, refresh_callback):
@@ -219,35 +560,32 @@ def open_edit_flashcard(card, refresh_callback):
         fields[key] = e
 
     def save_edits():
-        update_flashcard(card['id'], fields["question"].get(), fields["answer"].get(),
-                         fields["category"].get(), fields["difficulty"].get())
-        messagebox.showinfo("Success", "Flashcard updated successfully!")
-        win.destroy()
-        refresh_callback()
+        updated = dict(card, **{key: entry.get() for key, entry in fields.items()})
+
+        def saved(_):
+            messagebox.showinfo("Success", "Flashcard updated successfully!")
+            win.destroy()
+            refresh_callback(updated)
+
+        run_async(update_flashcard, card['id'], updated["question"], updated["answer"],
+                  updated["category"], updated["difficulty"], on_success=saved, loading=win)
 
     tk.Button(win, text="Save", command=save_edits).pack(pady=10)
 
 # ------------- Quiz Functionality -------------
 
 def open_quiz_gui():
-    flashcards = get_all_flashcards()
-    if not flashcards:
-        messagebox.showwarning("No Flashcards", "Please add some flashcards first.")
-        return
-
     setup_win = tk.Toplevel()
     setup_win.title("Quiz Setup")
-    setup_win.geometry("300x250")
+    setup_win.geometry("300x320")
 
     ttk.Label(setup_win, text="Select Category:").pack(pady=(10, 0))
     category_var = tk.StringVar()
 
-    # ✅ Dynamically fetch unique categories
-    unique_categories = sorted(set(card['category'] for card in flashcards))
     category_cb = ttk.Combobox(
         setup_win,
         textvariable=category_var,
-        values=["All"] + unique_categories,
+        values=["All"],
         state="readonly"
     )
     category_cb.set("All")
@@ -264,34 +602,74 @@ def open_quiz_gui():
     difficulty_cb.set("All")
     difficulty_cb.pack(pady=5)
 
+    ttk.Label(setup_win, text="Number of Questions:").pack(pady=(10, 0))
+    size_var = tk.IntVar(value=SESSION_SIZE)
+    ttk.Spinbox(setup_win, from_=1, to=500, textvariable=size_var, width=8).pack(pady=5)
+
+    # ✅ Dynamically fetch unique categories
+    def show_categories(result):
+        count, unique_categories = result
+        if not count:
+            setup_win.destroy()
+            messagebox.showwarning("No Flashcards", "Please add some flashcards first.")
+            return
+        category_cb.config(values=["All"] + unique_categories)
+
+    run_async(lambda: (count_flashcards(), get_categories()), on_success=show_categories, loading=setup_win)
+
     def start_quiz():
         selected_category = category_cb.get()
         selected_difficulty = difficulty_cb.get()
 
-        filtered = get_all_flashcards(
+        try:
+            size = size_var.get()
+        except tk.TclError:
+            size = 0
+        if size < 1:
+            messagebox.showwarning("Invalid Number", "Please enter how many questions to ask.", parent=setup_win)
+            return
+
+        def launch(cards):
+            if not len(cards):
+                messagebox.showinfo("No Flashcards", "No flashcards found for selected filters.")
+                return
+
+            # ✅ Launch quiz window with the sampled cards
+            setup_win.destroy()
+            start_quiz_window(cards, selected_difficulty, selected_category)
+
+        run_async(
+            select_cards,
             category=None if selected_category == "All" else selected_category,
-            difficulty=None if selected_difficulty == "All" else selected_difficulty
+            difficulty=None if selected_difficulty == "All" else selected_difficulty,
+            size=size, on_success=launch, loading=setup_win
         )
 
-        if not filtered:
-            messagebox.showinfo("No Flashcards", "No flashcards found for selected filters.")
-            return
+    ttk.Button(setup_win, text="Start Quiz", command=start_quiz).pack(pady=10)
 
-        # ✅ Launch quiz window with selected cards
-        setup_win.destroy()
-        start_quiz_window(filtered, selected_difficulty)
 
-    ttk.Button(setup_win, text="Start Quiz", command=start_quiz).pack(pady=10)
+def open_due_review():
+    def launch(cards):
+        if not len(cards):
+            messagebox.showinfo("All Caught Up", "No flashcards are due for review right now.")
+            return
+        start_quiz_window(cards, REVIEW_DIFFICULTY)
 
+    run_async(select_cards, due=True, on_success=launch)
 
-def start_quiz_window(cards, difficulty):
+
+def start_quiz_window(cards, difficulty, category="All"):
     quiz_win = tk.Toplevel()
     quiz_win.title("Quiz")
-    quiz_win.geometry("400x350")
+    quiz_win.geometry("400x560")
+
+    # Card ids in quiz order, to prefetch the next card's thumbnail.
+    upcoming = list(getattr(cards, "ids", None) or (card["id"] for card in cards))
+    session = QuizSession(cards, difficulty, category, recorder=QuizRecorder())
 
-    current_index = 0
-    score = {"correct": 0}
-    time_left = tk.IntVar(value=60)
+    media_label = tk.Label(quiz_win, compound="top", wraplength=350)
+    media_label.pack(pady=(10, 0))
+    play_btn = tk.Button(quiz_win, text="🔊 Play")
 
     question_label = tk.Label(quiz_win, text="", font=("Helvetica", 14), wraplength=350)
     question_label.pack(pady=10)
@@ -302,7 +680,7 @@ def start_quiz_window(cards, difficulty):
     feedback_label = tk.Label(quiz_win, text="", font=("Helvetica", 12))
     feedback_label.pack()
 
-    timer_label = tk.Label(quiz_win, text="Time left: 60 sec", font=("Helvetica", 10))
+    timer_label = tk.Label(quiz_win, text=f"Time left: {session.time_limit} sec", font=("Helvetica", 10))
     timer_label.pack()
 
     progress_label = tk.Label(quiz_win, text="", font=("Helvetica", 10))
@@ -310,50 +688,71 @@ def start_quiz_window(cards, difficulty):
 
     timer_id = None
 
+    def show_side(card, side):
+        def ready(media, image):
+            if not quiz_win.winfo_exists() or (session.asked and session.current is not card):
+                return  # the quiz has moved on to another card
+            if side == "answer" and not media:
+                return  # keep the question's media up
+            show_media(media_label, media, image)
+            audio = next((a for a in media if a["kind"] == "audio"), None)
+            if audio is None:
+                play_btn.pack_forget()
+            else:
+                play_btn.config(command=lambda: play_attachment(audio))
+                play_btn.pack(after=media_label)
+        thumbnails.get(card["id"], side, ready)
+
     def countdown():
         nonlocal timer_id
-        t = time_left.get()
+        t = round(session.time_left())
+        timer_label.config(text=f"Time left: {t} sec")
         if t > 0:
-            time_left.set(t - 1)
-            timer_label.config(text=f"Time left: {t - 1} sec")
             timer_id = quiz_win.after(1000, countdown)
         else:
             submit_answer(auto=True)
 
     def submit_answer(auto=False):
-        nonlocal current_index, timer_id
-        user_ans = answer_entry.get().strip().lower()
-        correct_ans = cards[current_index]['answer'].strip().lower()
-
-        if auto:
+        if not session.asked:
+            return  # still showing feedback for the previous card
+        result = session.timeout() if auto else session.answer(answer_entry.get())
+        correct_ans = result.card['answer']
+        if result.timed_out:
             feedback = f"⏰ Time's up! Correct: {correct_ans}"
-        elif user_ans == correct_ans:
+        elif result.correct:
             feedback = "✅ Correct!"
-            score["correct"] += 1
         else:
             feedback = f"❌ Incorrect! Correct: {correct_ans}"
 
         feedback_label.config(text=feedback)
+        show_side(result.card, "answer")
         quiz_win.after_cancel(timer_id)
-        current_index += 1
         quiz_win.after(1500, next_question)
 
     def next_question():
-        nonlocal timer_id
-        if current_index < len(cards):
-            card = cards[current_index]
-            question_label.config(text=f"Q{current_index + 1}: {card['question']}")
+        if not session.ready:
+            quiz_win.after(50, next_question)  # the next cards are still being read
+            return
+        card = session.next_card()
+        if card is not None:
+            question_label.config(text=f"Q{session.index + 1}: {card['question']}")
+            show_side(card, "question")
+            thumbnails.prefetch(card["id"], "answer")
+            position = upcoming.index(card["id"]) if card["id"] in upcoming else len(upcoming)
+            if position + 1 < len(upcoming):
+                thumbnails.prefetch(upcoming[position + 1])
             answer_entry.delete(0, tk.END)
             feedback_label.config(text="")
-            time_left.set(60)
-            timer_label.config(text="Time left: 60 sec")
-            progress_label.config(text=f"Question {current_index + 1} of {len(cards)}")
+            progress_label.config(text=f"Question {session.index + 1} of {session.total}")
             countdown()
         else:
-            log_score(score['correct'], len(cards), difficulty)
-            update_leaderboard(score['correct'], difficulty)
-            messagebox.showinfo("Quiz Over", f"You scored {score['correct']} out of {len(cards)}.")
-            quiz_win.destroy()
+            def finished(result):
+                score, total = result
+                messagebox.showinfo("Quiz Over", f"You scored {score} out of {total}.")
+                quiz_win.destroy()
+
+            submit_btn.config(state="disabled")
+            run_async(session.finish, on_success=finished, loading=quiz_win)
 
     submit_btn = tk.Button(quiz_win, text="Submit", command=lambda: submit_answer(auto=False), font=("Helvetica", 12))
     submit_btn.pack(pady=10)
@@ -361,13 +760,21 @@ def start_quiz_window(cards, difficulty):
     next_question()
 
 
+def write_score_history(file_path):
+    with open(file_path, "w", encoding="utf-8") as f:
+        f.write("Score History:\n")
+        for entry in iter_score_history():
+            f.write(format_score(entry) + "\n")
+
+
 def open_score_history_gui():
     win = tk.Toplevel()
     win.title("Score History")
-    win.geometry("400x350")
+    win.geometry("520x350")
 
     tk.Label(win, text="📊 Your Quiz Score History", font=("Arial", 12)).pack(pady=5)
-    history = get_score_history()
+    # Newest first, one page at a time; more pages load as the list is scrolled to the end.
+    history = {"last": None, "done": False, "loading": False}
 
     frame = tk.Frame(win)
     frame.pack(fill="both", expand=True)
@@ -375,46 +782,65 @@ def open_score_history_gui():
     scrollbar = tk.Scrollbar(frame)
     scrollbar.pack(side="right", fill="y")
 
-    listbox = tk.Listbox(frame, yscrollcommand=scrollbar.set, width=60)
-    for line in history:
-        listbox.insert(tk.END, line.strip())
+    def on_scroll(first, last):
+        scrollbar.set(first, last)
+        if float(last) >= 1.0:
+            load_page()
+
+    listbox = tk.Listbox(frame, yscrollcommand=on_scroll, width=80)
     listbox.pack(side="left", fill="both", expand=True)
     scrollbar.config(command=listbox.yview)
 
+    def show_page(page):
+        history["loading"] = False
+        for entry in page:
+            listbox.insert(tk.END, format_score(entry))
+        if page:
+            history["last"] = page[-1]
+        history["done"] = len(page) < HISTORY_PAGE_SIZE
+
+    def load_page():
+        if history["done"] or history["loading"]:
+            return
+        history["loading"] = True
+        run_async(get_score_history, HISTORY_PAGE_SIZE, history["last"], on_success=show_page, loading=win)
+
+    load_page()
+
     def export_score_history_txt():
-        if not history:
+        if history["last"] is None:
             messagebox.showwarning("Empty", "No score history found.")
             return
         file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt")])
         if file_path:
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.write("Score History:\n" + "\n".join(history))
-            messagebox.showinfo("Success", f"Exported to:\n{file_path}")
+            run_async(write_score_history, file_path, loading=win,
+                      on_success=lambda _: messagebox.showinfo("Success", f"Exported to:\n{file_path}"))
 
         
     def clear_history():
-        if messagebox.askyesno("Confirm", "Clear all score history?"):
-            clear_score_history()
+        def cleared(_):
+            history.update(last=None, done=True)
             listbox.delete(0, tk.END)
             messagebox.showinfo("Success", "History cleared.")
 
+        if messagebox.askyesno("Confirm", "Clear all score history?"):
+            run_async(clear_score_history, on_success=cleared, loading=win)
+
     tk.Button(win, text="📈 Export Score History", command=export_score_history_txt).pack(pady=5)
     tk.Button(win, text="🗑️ Clear History", command=clear_history).pack(pady=5)
 
 
 def view_chart_by_difficulty():
-    conn = sqlite3.connect("score_history.db")
-    c = conn.cursor()
-    c.execute("SELECT difficulty, score, total FROM score_log")
-    rows = c.fetchall()
-    conn.close()
-
-    performance = {}
-    for difficulty, score, total in rows:
-        if difficulty not in performance:
-            performance[difficulty] = {"score": 0, "total": 0}
-        performance[difficulty]["score"] += score
-        performance[difficulty]["total"] += total
+    run_async(get_difficulty_stats, on_success=plot_difficulty_chart)
+
+
+def plot_difficulty_chart(stats):
+    import matplotlib.pyplot as plt  # only the chart needs matplotlib; keep it off the startup path
+
+    performance = {
+        difficulty: {"score": correct, "total": total}
+        for difficulty, correct, total in stats
+    }
 
     labels = list(performance.keys())
     accuracy = [round((v["score"] / v["total"]) * 100, 2) if v["total"] > 0 else 0 for v in performance.values()]
@@ -428,40 +854,155 @@ def view_chart_by_difficulty():
     plt.show()
 
 
+def load_progress_stats():
+    import stats  # NumPy is only needed for the progress charts
+    return stats.accuracy_trend(), stats.retention_curves(), stats.latency_percentiles()
+
+
+def view_progress_charts():
+    run_async(load_progress_stats, on_success=plot_progress_charts)
+
+
+def plot_progress_charts(progress):
+    import matplotlib.pyplot as plt
+
+    trend, retention, latency = progress
+    fig, (ax_trend, ax_retention, ax_latency) = plt.subplots(3, 1, figsize=(8, 10))
+
+    ax_trend.plot(trend["days"], trend["accuracy"] * 100, "o", color="lightgray", label="Daily")
+    ax_trend.plot(trend["days"], trend["moving_average"] * 100, color="green", label="7-day average")
+    ax_trend.set_ylabel("Accuracy (%)")
+    ax_trend.set_ylim(0, 100)
+    ax_trend.set_title("Accuracy Trend")
+    ax_trend.legend()
+
+    labels = [f"{int(b)}d+" for b in retention["bins"]]
+    for category, (rate, _) in retention["curves"].items():
+        ax_retention.plot(labels, rate * 100, marker=".", label=category)
+    ax_retention.set_ylabel("Recalled (%)")
+    ax_retention.set_xlabel("Days since previous review")
+    ax_retention.set_ylim(0, 100)
+    ax_retention.set_title("Retention by Category")
+    if retention["curves"]:
+        ax_retention.legend(fontsize="small")
+
+    outcomes = ["all", "correct", "wrong"]
+    for offset, p in zip((-0.25, 0, 0.25), sorted(latency["all"])):
+        ax_latency.bar([i + offset for i in range(len(outcomes))], [latency[o][p] for o in outcomes],
+                       width=0.25, label=f"p{p}")
+    ax_latency.set_xticks(range(len(outcomes)), ["All answers", "Correct", "Wrong"])
+    ax_latency.set_ylabel("Response time (s)")
+    ax_latency.set_title("Response Time Percentiles")
+    ax_latency.legend()
+
+    fig.tight_layout()
+    plt.show()
+
+
+def export_or_discard(file_path, fmt, compress, progress):
+    """Export in the background; a cancelled export leaves no partial file."""
+    try:
+        return export_to_file(file_path, fmt, compress, progress=progress)
+    except TaskCancelled:
+        os.remove(file_path)
+        raise
+
+
 def open_export_window():
     win = tk.Toplevel()
     win.title("Export Options")
-    win.geometry("400x300")
+    win.geometry("400x400")
 
     tk.Label(win, text="📁 Export / Reports", font=("Arial", 12)).pack(pady=5)
 
-    def export_flashcards_txt():
-        cards = get_all_flashcards()
-        if not cards:
-            messagebox.showwarning("No Flashcards", "No flashcards to export.")
+    status_label = tk.Label(win, text="")
+    gzip_var = tk.BooleanVar(value=False)
+
+    cancel_btn = tk.Button(win, text="✖ Cancel")
+    current = {"task": None}
+
+    def run_with_progress(verb, task, *args, on_success):
+        """Run task(*args, progress=...) in the background, showing its progress."""
+        if current["task"] is not None:
+            messagebox.showwarning("Busy", "Another import/export is still running.", parent=win)
             return
-        with open("flashcards_export.txt", "w", encoding="utf-8") as f:
-            for card in cards:
-                f.write(f"Q: {card['question']}\nA: {card['answer']}\n\n")
-        messagebox.showinfo("Export Successful", "Exported to flashcards_export.txt")
-
-    def export_flashcards_csv():
-        cards = get_all_flashcards()
-        if not cards:
-            messagebox.showwarning("No Flashcards", "No flashcards to export.")
+
+        def done(result):
+            current["task"] = None
+            cancel_btn.pack_forget()
+            status_label.config(text=f"{verb} finished: {result:,} rows")
+            on_success(result)
+
+        def failed(error):
+            current["task"] = None
+            cancel_btn.pack_forget()
+            status_label.config(text="")
+            messagebox.showerror(f"{verb} Failed", str(error), parent=win)
+
+        def cancel():
+            task = current["task"]
+            task.cancel()
+            cancel_btn.pack_forget()
+            status_label.config(text=f"Cancelling {verb.lower()}...")
+
+            # A cancelled task runs no callbacks, but the worker may still be
+            # rolling back its transaction: stay busy until it has returned.
+            def wait_for_worker():
+                if not task.future.done():
+                    win.after(50, wait_for_worker)
+                    return
+                current["task"] = None
+                if win.winfo_exists():
+                    status_label.config(text=f"{verb} cancelled")
+            wait_for_worker()
+
+        status_label.config(text=f"{verb}...")
+        cancel_btn.config(command=cancel)
+        cancel_btn.pack(pady=2)
+        current["task"] = run_async(
+            task, *args, on_success=done, on_error=failed,
+            on_progress=lambda n: status_label.config(text=f"{verb}... {n:,} rows")
+        )
+
+    def export_flashcards(fmt, file_path=None):
+        run_async(count_flashcards, on_success=lambda n: choose_export_path(fmt, file_path) if n else
+                  messagebox.showwarning("No Flashcards", "No flashcards to export."), loading=win)
+
+    def choose_export_path(fmt, file_path):
+        if file_path is None:
+            ext = f".{fmt}.gz" if gzip_var.get() else f".{fmt}"
+            file_path = filedialog.asksaveasfilename(defaultextension=ext, filetypes=[(f"{fmt.upper()} files", f"*{ext}")])
+            if not file_path:
+                return
+        elif gzip_var.get():
+            file_path += ".gz"
+        run_with_progress(
+            "Exporting", export_or_discard, file_path, fmt, gzip_var.get(),
+            on_success=lambda n: messagebox.showinfo("Export Successful", f"Exported to:\n{file_path}")
+        )
+
+    def import_flashcards():
+        file_path = filedialog.askopenfilename(
+            filetypes=[("Flashcard decks", " ".join(f"*.{ext}" for ext in PARSERS)), ("All files", "*.*")]
+        )
+        if not file_path:
             return
-        file_path = filedialog.asksaveasfilename(defaultextension=".csv", filetypes=[("CSV files", "*.csv")])
-        if file_path:
-            with open(file_path, "w", newline='', encoding="utf-8") as f:
-                writer = csv.writer(f)
-                writer.writerow(["Question", "Answer", "Category", "Difficulty"])
-                for card in cards:
-                    writer.writerow([card["question"], card["answer"], card["category"], card["difficulty"]])
-            messagebox.showinfo("Export Successful", f"Exported to:\n{file_path}")
+        run_with_progress(
+            "Importing", import_file, file_path,
+            on_success=lambda n: messagebox.showinfo("Import Successful", f"Imported {n:,} flashcards.")
+        )
+
+    tk.Button(win, text="📁 Export Flashcards (.txt)", command=lambda: export_flashcards("txt", "flashcards_export.txt")).pack(pady=5)
+    tk.Button(win, text="📁 Export Flashcards (.csv)", command=lambda: export_flashcards("csv")).pack(pady=5)
+    tk.Button(win, text="📁 Export Flashcards (.jsonl)", command=lambda: export_flashcards("jsonl")).pack(pady=5)
+    tk.Button(win, text="💾 Export Flashcards (.sql)", command=lambda: export_flashcards("sql")).pack(pady=5)
+    tk.Checkbutton(win, text="Compress with gzip", variable=gzip_var).pack()
+    tk.Button(win, text="📥 Import Flashcards (.csv/.json/.txt)", command=import_flashcards).pack(pady=5)
+    status_label.pack(pady=5)
 
-    tk.Button(win, text="📁 Export Flashcards (.txt)", command=export_flashcards_txt).pack(pady=5)
-    tk.Button(win, text="📁 Export Flashcards (.csv)", command=export_flashcards_csv).pack(pady=5)
 
+# Window-building and plotting times when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("main_gui",))
 
 if __name__ == "__main__":
     main_gui()
\ No newline at end of file
@@ -0,0 +1,212 @@
+"""
+Bulk import of flashcard decks.
+
+Supports the formats the app itself writes:
+  - JSON arrays like flashcards.json (and JSON Lines, one object per line)
+  - the "Q: ... / A: ..." layout of flashcards_export.txt
+  - the CSV written by the Export window (Question, Answer, Category, Difficulty)
+
+and gzip-compressed copies of them (deck.jsonl.gz, as the exporter writes).
+
+Files are parsed lazily with generators and inserted with executemany in
+fixed-size batches inside a single transaction, so memory use does not
+grow with the size of the file.
+
+Usage:
+    python importer.py deck.csv [--format csv] [--batch-size 5000]
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import re
+
+from database import transaction
+from dedup import content_hash
+import flashcard_db
+import profiles
+
+BATCH_SIZE = 5000
+READ_CHUNK = 1 << 16
+
+_WHITESPACE = re.compile(r"[\s,]*")
+
+
+def _clean(question, answer, category=None, difficulty=None):
+    """Normalize one parsed record, or return None if it is unusable."""
+    question = (question or "").strip()
+    answer = (answer or "").strip()
+    if not question or not answer:
+        return None
+    category = (category or "").strip() or "General"
+    try:
+        code = flashcard_db.difficulty_code(difficulty or "Easy")
+    except ValueError:
+        return None
+    return question, answer, category, code, content_hash(question, answer)
+
+
+def iter_json(path):
+    """
+    Yield records from a JSON array or a JSON Lines file without loading
+    the whole document.
+    """
+    decoder = json.JSONDecoder()
+    with _open(path) as f:
+        buf = ""
+        pos = 0
+        started = False
+        while True:
+            pos = _WHITESPACE.match(buf, pos).end()
+            if not started and pos < len(buf):
+                if buf[pos] == "[":
+                    pos += 1
+                started = True
+                continue
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                obj, pos = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                chunk = f.read(READ_CHUNK)
+                if not chunk:
+                    if buf[pos:].strip():
+                        raise
+                    return
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+            if isinstance(obj, dict):
+                yield obj.get("question"), obj.get("answer"), obj.get("category"), obj.get("difficulty")
+
+
+def iter_txt(path):
+    """Yield records from the "Q: ...\\nA: ...\\n\\n" export layout."""
+    question = answer = None
+    with _open(path) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if line.startswith("Q:"):
+                if question is not None and answer is not None:
+                    yield question, answer, None, None
+                question, answer = line[2:].strip(), None
+            elif line.startswith("A:") and question is not None:
+                answer = line[2:].strip()
+            elif line.strip() and answer is not None:
+                answer += "\n" + line.strip()
+        if question is not None and answer is not None:
+            yield question, answer, None, None
+
+
+def iter_csv(path):
+    """Yield records from a CSV file, with or without a header row."""
+    with _open(path) as f:
+        reader = csv.reader(f)
+        first = next(reader, None)
+        if first is None:
+            return
+        header = [h.strip().lower() for h in first]
+        if "question" in header and "answer" in header:
+            columns = {name: header.index(name) for name in header}
+        else:
+            columns = {"question": 0, "answer": 1, "category": 2, "difficulty": 3}
+            reader = _chain_row(first, reader)
+
+        def col(row, name):
+            i = columns.get(name)
+            return row[i] if i is not None and i < len(row) else None
+
+        for row in reader:
+            yield col(row, "question"), col(row, "answer"), col(row, "category"), col(row, "difficulty")
+
+
+def _chain_row(first, reader):
+    yield first
+    yield from reader
+
+
+PARSERS = {
+    "json": iter_json,
+    "jsonl": iter_json,
+    "txt": iter_txt,
+    "csv": iter_csv,
+}
+
+
+def _open(path):
+    """Open a deck for reading as text, decompressing .gz files on the fly."""
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, "r", newline="", encoding="utf-8")
+
+
+def detect_format(path):
+    """Format from the file name, looking inside .gz: deck.jsonl.gz is jsonl."""
+    base, ext = os.path.splitext(path.lower())
+    if ext == ".gz":
+        ext = os.path.splitext(base)[1]
+    ext = ext.lstrip(".")
+    if ext not in PARSERS:
+        raise ValueError(f"Unsupported file type: .{ext} (expected one of {', '.join(PARSERS)})")
+    return ext
+
+
+def _batches(records, size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_file(path, fmt=None, batch_size=BATCH_SIZE, progress=None):
+    """
+    Import every usable card in `path` and return how many were added;
+    cards go to the current deck (see profiles.py), and cards already in
+    it (or repeated in the file) are skipped.
+    `progress`, if given, is called with the running count of records
+    read after each batch.
+    """
+    parser = PARSERS[fmt or detect_format(path)]
+    owner = profiles.owner()
+    records = (owner + card for card in (_clean(*rec) for rec in parser(path)) if card)
+    added = read = 0
+    with transaction(flashcard_db.DB_NAME) as conn:
+        for batch in _batches(records, batch_size):
+            added += conn.executemany(flashcard_db.INSERT_SQL, batch).rowcount
+            read += len(batch)
+            if progress:
+                progress(read)
+    return added
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Import flashcards from a CSV, JSON or TXT deck.")
+    arg_parser.add_argument("path")
+    arg_parser.add_argument("--format", choices=sorted(PARSERS), help="override detection by file extension")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = arg_parser.parse_args(argv)
+
+    if args.format is None:
+        try:
+            detect_format(args.path)
+        except ValueError as e:
+            arg_parser.error(str(e))
+
+    flashcard_db.init_db()
+    read = [0]
+
+    def report(n):
+        read[0] = n
+        print(f"\r{n:,} cards read...", end="", flush=True)
+
+    added = import_file(args.path, args.format, args.batch_size, progress=report)
+    print(f"\r✅ Imported {added:,} flashcards from {args.path} ({read[0] - added:,} duplicates skipped)")
+
+
+if __name__ == "__main__":
+    main()
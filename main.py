@@ -1,34 +1,132 @@
-from flashcard import add_flashcard, view_flashcards
-from quiz import start_quiz
-from score_logger import view_score_history
-
-def main():
-    while True:
-        print("\n📚 Flashcard App Menu")
-        print("1. Add Flashcard")
-        print("2. View Flashcards")
-        print("3. Take Quiz")
-        print("4. View Score History")
-        print("5. Exit")
-
-        choice = input("Enter your choice (1-5): ").strip()
-
-        if choice == '1':
-            q = input("Enter question: ")
-            a = input("Enter answer: ")
-            add_flashcard(q, a)
-            print("Flashcard added.")
-        elif choice == '2':
-            view_flashcards()
-        elif choice == '3':
-            start_quiz()
-        elif choice == '4':
-            view_score_history()
-        elif choice == '5':
-            print("Goodbye! 👋")
-            break
-        else:
-            print("Invalid choice. Please try again.")
+"""
+Flashcard app entry point.
+
+Usage:
+    python main.py                   # same as `python main.py gui`
+    python main.py gui
+    python main.py quiz [--category Math] [--difficulty Hard] [--size 20]
+    python main.py import deck.csv [--format csv]
+    python main.py export deck.jsonl.gz [--category Math]
+    python main.py stats
+    python main.py regrade [--apply]
+    python main.py simulate [--learners 2000] [--workers 4]
+    python main.py dedup near [--threshold 0.8]
+    python main.py users add alice [--sharded]
+    python main.py attach add 42 heart.png [--side answer]
+    python main.py serve [--port 8765]
+    python main.py sync run http://127.0.0.1:8766
+    python main.py --user alice --deck Biology quiz
+
+--user and --deck (before the command) pick whose cards and scores the
+command works on; by default it is the "default" user's "Default" deck.
+--perf records call timings and slow queries; `stats --perf` prints them.
+
+Each subcommand imports only the modules it uses, so the headless
+commands (quiz, import, export, stats) never load tkinter, ttkbootstrap
+or matplotlib. Run `python main.py <command> --help` for its options.
+"""
+import argparse
+import sys
+
+
+def run_gui(argv):
+    import gui
+    gui.main_gui()
+
+
+def run_quiz(argv):
+    import quiz
+    quiz.main(argv)
+
+
+def run_import(argv):
+    import importer
+    importer.main(argv)
+
+
+def run_export(argv):
+    import exporter
+    exporter.main(argv)
+
+
+def run_simulate(argv):
+    import simulator
+    simulator.main(argv)
+
+
+def run_dedup(argv):
+    import dedup
+    dedup.main(argv)
+
+
+def run_users(argv):
+    import profiles
+    profiles.main(argv)
+
+
+def run_attach(argv):
+    import attachments
+    attachments.main(argv)
+
+
+def run_serve(argv):
+    import api
+    api.main(argv)
+
+
+def run_sync(argv):
+    import sync
+    sync.main(argv)
+
+
+def run_stats(argv):
+    import report
+    report.main(argv)
+
+
+def run_regrade(argv):
+    import grading
+    grading.main(argv)
+
+
+COMMANDS = {
+    "gui": (run_gui, "open the desktop app"),
+    "quiz": (run_quiz, "take a quiz in the terminal"),
+    "import": (run_import, "bulk import a CSV/JSON/TXT deck"),
+    "export": (run_export, "export the deck as CSV/JSONL/TXT/SQL"),
+    "stats": (run_stats, "print deck and score statistics"),
+    "regrade": (run_regrade, "re-grade stored answers after grading changes"),
+    "simulate": (run_simulate, "load-test quizzes with synthetic learners"),
+    "dedup": (run_dedup, "find exact and near-duplicate cards"),
+    "users": (run_users, "manage users and decks"),
+    "attach": (run_attach, "attach images and audio to cards"),
+    "serve": (run_serve, "serve the deck over a local HTTP/JSON API"),
+    "sync": (run_sync, "sync decks and scores with other devices"),
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py", description="📚 Flashcard App")
+    parser.add_argument("--user", help="user whose data to use")
+    parser.add_argument("--deck", help="deck of that user to use")
+    parser.add_argument("--perf", action="store_true",
+                        help="time data-access calls and log slow queries (same as FLASHCARD_PERF=1)")
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    for name, (_, help_text) in COMMANDS.items():
+        # Options are parsed by the command itself, so --help is passed through too.
+        commands.add_parser(name, help=help_text, add_help=False)
+    args, rest = parser.parse_known_args(sys.argv[1:] if argv is None else argv)
+    if args.perf:
+        import perf
+        perf.enable()  # before any data module is imported
+    if args.user or args.deck:
+        import profiles
+        try:
+            profiles.use(args.user or profiles.DEFAULT_USER, args.deck or profiles.DEFAULT_DECK, create=False)
+        except ValueError as e:
+            parser.error(str(e))
+    COMMANDS[args.command or "gui"][0](rest)
+
 
 if __name__ == "__main__":
     main()
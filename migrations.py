@@ -0,0 +1,722 @@
+"""
+Versioned schema migrations.
+
+Each database records its schema version in PRAGMA user_version. On
+startup migrate() reads that one value and returns immediately when the
+schema is current; otherwise it applies every pending migration, in
+order, inside a single transaction, and bumps user_version as it goes.
+
+Migrations are frozen once released: to change the schema, append a new
+numbered step rather than editing an old one.
+
+Usage:
+    python migrations.py          # migrate flashcards.db and score_history.db
+"""
+import hashlib
+import re
+import unicodedata
+
+from database import get_connection, transaction
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def _table_exists(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+
+def _run(conn, statements):
+    for sql in statements:
+        conn.execute(sql)
+
+
+# The sync change log (see sync.py) lives in both databases. Its triggers
+# stamp changes with the wall clock in seconds, and stay quiet while
+# sync.py applies other devices' changes (it logs those itself).
+SYNC_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+SYNC_LOGGING = "NOT EXISTS (SELECT 1 FROM sync_state WHERE key = 'applying')"
+
+
+def _sync_log_tables(conn):
+    """
+    sync_log: every change to a synced row, oldest first; origin is NULL
+    for changes made on this device. sync_ids: the local id of each row
+    received from another device, keyed by (device, id there).
+    """
+    _run(conn, [
+        "CREATE TABLE IF NOT EXISTS sync_state (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+        "INSERT OR IGNORE INTO sync_state (key, value) VALUES ('device', lower(hex(randomblob(8))))",
+        """
+        CREATE TABLE IF NOT EXISTS sync_log (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl TEXT NOT NULL,
+            row_id INTEGER,
+            op TEXT NOT NULL,
+            data TEXT NOT NULL,
+            stamp REAL NOT NULL,
+            origin TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_sync_log_row ON sync_log (tbl, row_id)",
+        """
+        CREATE TABLE IF NOT EXISTS sync_ids (
+            tbl TEXT NOT NULL,
+            origin TEXT NOT NULL,
+            origin_id INTEGER NOT NULL,
+            row_id INTEGER NOT NULL,
+            PRIMARY KEY (tbl, origin, origin_id)
+        ) WITHOUT ROWID
+        """,
+        # A row merged with copies from several devices has several ids.
+        "CREATE INDEX IF NOT EXISTS idx_sync_ids_row ON sync_ids (tbl, row_id)",
+    ])
+
+
+# ------------- flashcards.db -------------
+
+def _flashcards_base(conn):
+    """Create the flashcards table, or bring legacy layouts up to date."""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS flashcards (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            category TEXT,
+            difficulty TEXT
+        )
+    """)
+    columns = _columns(conn, "flashcards")
+    if "category" not in columns:
+        conn.execute("ALTER TABLE flashcards ADD COLUMN category TEXT")
+    if "difficulty" not in columns:
+        conn.execute("ALTER TABLE flashcards ADD COLUMN difficulty TEXT")
+
+
+def _flashcards_difficulty_enum(conn):
+    """
+    Store difficulty as a small integer (0 = Easy, 1 = Medium, 2 = Hard)
+    and make category NOT NULL. SQLite cannot change column types, so the
+    table is rebuilt; triggers on it are dropped and recreated later.
+    """
+    conn.execute("""
+        CREATE TABLE flashcards_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            question TEXT NOT NULL,
+            answer TEXT NOT NULL,
+            category TEXT NOT NULL DEFAULT 'General',
+            difficulty INTEGER NOT NULL DEFAULT 0 CHECK (difficulty BETWEEN 0 AND 2)
+        )
+    """)
+    conn.execute("""
+        INSERT INTO flashcards_new (id, question, answer, category, difficulty)
+        SELECT id, question, answer, COALESCE(NULLIF(category, ''), 'General'),
+               CASE lower(difficulty) WHEN 'medium' THEN 1 WHEN 'hard' THEN 2 ELSE 0 END
+        FROM flashcards
+    """)
+    conn.execute("DROP TABLE flashcards")
+    conn.execute("ALTER TABLE flashcards_new RENAME TO flashcards")
+
+
+def _flashcards_indexes(conn):
+    _run(conn, [
+        "DROP INDEX IF EXISTS idx_flashcards_category_difficulty",
+        "DROP INDEX IF EXISTS idx_flashcards_difficulty",
+        "CREATE INDEX idx_flashcards_category_difficulty ON flashcards (category, difficulty)",
+        "CREATE INDEX idx_flashcards_difficulty ON flashcards (difficulty)",
+    ])
+
+
+def _flashcards_fts(conn):
+    """External-content FTS5 index over question/answer, kept in sync by triggers."""
+    _run(conn, [
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS flashcards_fts USING fts5(
+            question, answer, content='flashcards', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_fts_insert AFTER INSERT ON flashcards
+        BEGIN
+            INSERT INTO flashcards_fts (rowid, question, answer) VALUES (NEW.id, NEW.question, NEW.answer);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_fts_delete AFTER DELETE ON flashcards
+        BEGIN
+            INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer)
+            VALUES ('delete', OLD.id, OLD.question, OLD.answer);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_fts_update AFTER UPDATE OF question, answer ON flashcards
+        BEGIN
+            INSERT INTO flashcards_fts (flashcards_fts, rowid, question, answer)
+            VALUES ('delete', OLD.id, OLD.question, OLD.answer);
+            INSERT INTO flashcards_fts (rowid, question, answer) VALUES (NEW.id, NEW.question, NEW.answer);
+        END
+        """,
+        "INSERT INTO flashcards_fts (flashcards_fts) VALUES ('rebuild')",
+    ])
+
+
+def _flashcards_scheduler(conn):
+    """Spaced-repetition state; every card gets a card_schedule row."""
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS card_schedule (
+            card_id INTEGER PRIMARY KEY,
+            ease REAL NOT NULL DEFAULT 2.5,
+            interval_days REAL NOT NULL DEFAULT 0,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            due_at REAL NOT NULL DEFAULT 0,
+            last_reviewed_at REAL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_card_schedule_due ON card_schedule (due_at)",
+        """
+        CREATE TABLE IF NOT EXISTS review_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            card_id INTEGER NOT NULL,
+            reviewed_at REAL NOT NULL,
+            quality INTEGER NOT NULL,
+            ease REAL NOT NULL,
+            interval_days REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_review_history_card ON review_history (card_id, reviewed_at)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_schedule_insert AFTER INSERT ON flashcards
+        BEGIN
+            INSERT OR IGNORE INTO card_schedule (card_id) VALUES (NEW.id);
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_schedule_delete AFTER DELETE ON flashcards
+        BEGIN
+            DELETE FROM card_schedule WHERE card_id = OLD.id;
+            DELETE FROM review_history WHERE card_id = OLD.id;
+        END
+        """,
+        "INSERT OR IGNORE INTO card_schedule (card_id) SELECT id FROM flashcards",
+    ])
+
+
+def _flashcards_change_log(conn):
+    """
+    card_changes keeps one row per card with the sequence number of its
+    latest insert, update or delete (deleted = 1 marks a tombstone), so
+    readers can ask "what changed since seq N?" off the seq index.
+    """
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS card_changes (
+            card_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL,
+            deleted INTEGER NOT NULL DEFAULT 0
+        )
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_card_changes_seq ON card_changes (seq)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_changes_insert AFTER INSERT ON flashcards
+        BEGIN
+            INSERT INTO card_changes (card_id, seq, deleted)
+            VALUES (NEW.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM card_changes), 0)
+            ON CONFLICT (card_id) DO UPDATE SET seq = excluded.seq, deleted = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_changes_update AFTER UPDATE ON flashcards
+        BEGIN
+            INSERT INTO card_changes (card_id, seq, deleted)
+            VALUES (NEW.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM card_changes), 0)
+            ON CONFLICT (card_id) DO UPDATE SET seq = excluded.seq, deleted = 0;
+        END
+        """,
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_changes_delete AFTER DELETE ON flashcards
+        BEGIN
+            INSERT INTO card_changes (card_id, seq, deleted)
+            VALUES (OLD.id, (SELECT COALESCE(MAX(seq), 0) + 1 FROM card_changes), 1)
+            ON CONFLICT (card_id) DO UPDATE SET seq = excluded.seq, deleted = 1;
+        END
+        """,
+        "INSERT OR IGNORE INTO card_changes (card_id, seq) SELECT id, id FROM flashcards",
+    ])
+
+
+# dedup.content_hash as it was when step 7 was released. The backfill
+# keeps this copy so old databases always migrate to the same hashes,
+# whatever later happens to the live normalisation.
+_HASH_WHITESPACE = re.compile(r"\s+")
+
+
+def _content_hash_v1(question, answer):
+    def normalize(text):
+        return _HASH_WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text or "").casefold()).strip()
+    data = normalize(question) + "\x1f" + normalize(answer)
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).digest()
+
+
+def _flashcards_content_hash(conn):
+    """
+    Unique content_hash per card (see dedup.py). Existing exact duplicates
+    keep a NULL hash, except the oldest copy, so no card is deleted here;
+    `python main.py dedup exact --merge` removes them.
+    """
+    if "content_hash" not in _columns(conn, "flashcards"):
+        conn.execute("ALTER TABLE flashcards ADD COLUMN content_hash BLOB")
+    rows = conn.execute("SELECT id, question, answer FROM flashcards WHERE content_hash IS NULL")
+    while True:
+        chunk = rows.fetchmany(5000)
+        if not chunk:
+            break
+        conn.executemany("UPDATE flashcards SET content_hash = ? WHERE id = ?",
+                         [(_content_hash_v1(question, answer), card_id) for card_id, question, answer in chunk])
+    _run(conn, [
+        """
+        UPDATE flashcards SET content_hash = NULL
+        WHERE id NOT IN (SELECT MIN(id) FROM flashcards GROUP BY content_hash)
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_flashcards_content_hash ON flashcards (content_hash)",
+    ])
+
+
+def _flashcards_owners(conn):
+    """
+    Users and decks (see profiles.py). Every card belongs to a (user,
+    deck) pair; existing cards go to the "default" user's "Default" deck.
+    All card indexes lead with (user_id, deck_id) so one user's queries
+    never touch another's rows, and content hashes are unique per deck.
+    """
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY,
+            name TEXT NOT NULL UNIQUE,
+            sharded INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL DEFAULT (strftime('%s', 'now'))
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS decks (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES users (id),
+            name TEXT NOT NULL,
+            UNIQUE (user_id, name)
+        )
+        """,
+        "INSERT OR IGNORE INTO users (id, name) VALUES (1, 'default')",
+        "INSERT OR IGNORE INTO decks (id, user_id, name) VALUES (1, 1, 'Default')",
+    ])
+    for table in ("flashcards", "card_schedule", "review_history"):
+        columns = _columns(conn, table)
+        for column in ("user_id", "deck_id"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 1")
+    _run(conn, [
+        "DROP INDEX IF EXISTS idx_flashcards_category_difficulty",
+        "DROP INDEX IF EXISTS idx_flashcards_difficulty",
+        "DROP INDEX IF EXISTS idx_flashcards_content_hash",
+        "DROP INDEX IF EXISTS idx_card_schedule_due",
+        # (user_id, deck_id) alone: owner counts and MIN/MAX(id) are index lookups.
+        "CREATE INDEX IF NOT EXISTS idx_flashcards_owner ON flashcards (user_id, deck_id)",
+        "CREATE INDEX IF NOT EXISTS idx_flashcards_owner_category ON flashcards (user_id, deck_id, category, difficulty)",
+        "CREATE INDEX IF NOT EXISTS idx_flashcards_owner_difficulty ON flashcards (user_id, deck_id, difficulty)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_flashcards_owner_hash ON flashcards (user_id, deck_id, content_hash)",
+        "CREATE INDEX IF NOT EXISTS idx_card_schedule_owner_due ON card_schedule (user_id, deck_id, due_at)",
+        "CREATE INDEX IF NOT EXISTS idx_review_history_owner ON review_history (user_id, deck_id)",
+        "DROP TRIGGER IF EXISTS trg_flashcards_schedule_insert",
+        """
+        CREATE TRIGGER trg_flashcards_schedule_insert AFTER INSERT ON flashcards
+        BEGIN
+            INSERT OR IGNORE INTO card_schedule (card_id, user_id, deck_id) VALUES (NEW.id, NEW.user_id, NEW.deck_id);
+        END
+        """,
+    ])
+
+
+def _flashcards_attachments(conn):
+    """
+    Image and audio files attached to cards (see attachments.py). The
+    data column comes last so reading the other columns never touches the
+    BLOB's overflow pages; the bytes are streamed with incremental blob I/O.
+    """
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS attachments (
+            id INTEGER PRIMARY KEY,
+            card_id INTEGER NOT NULL,
+            side TEXT NOT NULL DEFAULT 'question',
+            kind TEXT NOT NULL,
+            name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL DEFAULT (strftime('%s', 'now')),
+            data BLOB NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_attachments_card ON attachments (card_id, side)",
+        """
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_attachments_delete AFTER DELETE ON flashcards
+        BEGIN
+            DELETE FROM attachments WHERE card_id = OLD.id;
+        END
+        """,
+    ])
+
+
+def _flashcards_sync_log(conn):
+    """
+    Log card inserts, edits (only the fields that changed) and deletes
+    for sync.py. Existing cards are logged as inserts so the first sync
+    sends the whole deck.
+    """
+    _sync_log_tables(conn)
+    _run(conn, [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_sync_insert AFTER INSERT ON flashcards
+        WHEN {SYNC_LOGGING}
+        BEGIN
+            INSERT INTO sync_log (tbl, row_id, op, data, stamp)
+            VALUES ('flashcards', NEW.id, 'upsert',
+                    json_object('user_id', NEW.user_id, 'deck_id', NEW.deck_id, 'question', NEW.question,
+                                'answer', NEW.answer, 'category', NEW.category, 'difficulty', NEW.difficulty),
+                    {SYNC_NOW});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_sync_update
+        AFTER UPDATE OF question, answer, category, difficulty ON flashcards
+        WHEN {SYNC_LOGGING} AND (NEW.question IS NOT OLD.question OR NEW.answer IS NOT OLD.answer
+                                 OR NEW.category IS NOT OLD.category OR NEW.difficulty IS NOT OLD.difficulty)
+        BEGIN
+            INSERT INTO sync_log (tbl, row_id, op, data, stamp)
+            VALUES ('flashcards', NEW.id, 'upsert',
+                    json_remove(
+                        json_object('user_id', NEW.user_id, 'deck_id', NEW.deck_id, 'question', NEW.question,
+                                    'answer', NEW.answer, 'category', NEW.category, 'difficulty', NEW.difficulty),
+                        CASE WHEN NEW.question IS OLD.question THEN '$.question' ELSE '$._' END,
+                        CASE WHEN NEW.answer IS OLD.answer THEN '$.answer' ELSE '$._' END,
+                        CASE WHEN NEW.category IS OLD.category THEN '$.category' ELSE '$._' END,
+                        CASE WHEN NEW.difficulty IS OLD.difficulty THEN '$.difficulty' ELSE '$._' END),
+                    {SYNC_NOW});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_flashcards_sync_delete AFTER DELETE ON flashcards
+        WHEN {SYNC_LOGGING}
+        BEGIN
+            INSERT INTO sync_log (tbl, row_id, op, data, stamp) VALUES ('flashcards', OLD.id, 'delete', '{{}}', {SYNC_NOW});
+        END
+        """,
+        f"""
+        INSERT INTO sync_log (tbl, row_id, op, data, stamp)
+        SELECT 'flashcards', id, 'upsert',
+               json_object('user_id', user_id, 'deck_id', deck_id, 'question', question,
+                           'answer', answer, 'category', category, 'difficulty', difficulty),
+               {SYNC_NOW}
+        FROM flashcards ORDER BY id
+        """,
+    ])
+
+
+FLASHCARD_MIGRATIONS = [
+    (1, "flashcards table", _flashcards_base),
+    (2, "difficulty as integer enum", _flashcards_difficulty_enum),
+    (3, "category/difficulty indexes", _flashcards_indexes),
+    (4, "full-text search", _flashcards_fts),
+    (5, "spaced-repetition schedule", _flashcards_scheduler),
+    (6, "card change log", _flashcards_change_log),
+    (7, "content hash for deduplication", _flashcards_content_hash),
+    (8, "users and decks", _flashcards_owners),
+    (9, "card attachments", _flashcards_attachments),
+    (10, "sync change log", _flashcards_sync_log),
+]
+
+
+# ------------- score_history.db -------------
+
+def _scores_base(conn):
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS score_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            timestamp TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            total INTEGER NOT NULL,
+            difficulty TEXT DEFAULT "General"
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS leaderboard (
+            difficulty TEXT PRIMARY KEY,
+            high_score INTEGER
+        )
+        """,
+    ])
+
+
+def _scores_category(conn):
+    if "category" not in _columns(conn, "score_log"):
+        conn.execute("ALTER TABLE score_log ADD COLUMN category TEXT DEFAULT 'All'")
+
+
+def _scores_review_events(conn):
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS review_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            card_id INTEGER NOT NULL,
+            timestamp REAL NOT NULL,
+            correct INTEGER NOT NULL,
+            latency REAL,
+            answer TEXT
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_review_events_session ON review_events (session_id)",
+        "CREATE INDEX IF NOT EXISTS idx_review_events_card ON review_events (card_id, timestamp)",
+    ])
+
+
+def _scores_stats(conn):
+    """Running totals per (difficulty, category), seeded from score_log."""
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS score_stats (
+            difficulty TEXT NOT NULL,
+            category TEXT NOT NULL,
+            sum_score INTEGER NOT NULL DEFAULT 0,
+            sum_total INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            best INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (difficulty, category)
+        )
+        """,
+        "DELETE FROM score_stats",
+        """
+        INSERT INTO score_stats (difficulty, category, sum_score, sum_total, attempts, best)
+        SELECT COALESCE(difficulty, 'General'), COALESCE(category, 'All'),
+               SUM(score), SUM(total), COUNT(*), MAX(score)
+        FROM score_log
+        GROUP BY 1, 2
+        """,
+    ])
+
+
+def _scores_timestamp_index(conn):
+    """Serve the newest-first history pages straight off an index."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_score_log_timestamp ON score_log (timestamp)")
+
+
+def _scores_owners(conn):
+    """
+    Key scores by (user_id, deck_id) like the cards (see profiles.py).
+    score_stats and leaderboard become WITHOUT ROWID tables clustered on
+    their owner-first primary key, so a user's aggregates are one range
+    read; existing rows belong to the default user and deck.
+    """
+    for table in ("score_log", "review_events"):
+        columns = _columns(conn, table)
+        for column in ("user_id", "deck_id"):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} INTEGER NOT NULL DEFAULT 1")
+    _run(conn, [
+        "DROP INDEX IF EXISTS idx_score_log_timestamp",
+        "CREATE INDEX IF NOT EXISTS idx_score_log_owner_timestamp ON score_log (user_id, deck_id, timestamp)",
+        "CREATE INDEX IF NOT EXISTS idx_review_events_owner ON review_events (user_id, deck_id)",
+        """
+        CREATE TABLE score_stats_new (
+            user_id INTEGER NOT NULL,
+            deck_id INTEGER NOT NULL,
+            difficulty TEXT NOT NULL,
+            category TEXT NOT NULL,
+            sum_score INTEGER NOT NULL DEFAULT 0,
+            sum_total INTEGER NOT NULL DEFAULT 0,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            best INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, deck_id, difficulty, category)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO score_stats_new (user_id, deck_id, difficulty, category, sum_score, sum_total, attempts, best)
+        SELECT 1, 1, difficulty, category, sum_score, sum_total, attempts, best FROM score_stats
+        """,
+        "DROP TABLE score_stats",
+        "ALTER TABLE score_stats_new RENAME TO score_stats",
+        """
+        CREATE TABLE leaderboard_new (
+            user_id INTEGER NOT NULL,
+            deck_id INTEGER NOT NULL,
+            difficulty TEXT NOT NULL,
+            high_score INTEGER,
+            PRIMARY KEY (user_id, deck_id, difficulty)
+        ) WITHOUT ROWID
+        """,
+        """
+        INSERT INTO leaderboard_new (user_id, deck_id, difficulty, high_score)
+        SELECT 1, 1, difficulty, high_score FROM leaderboard WHERE difficulty IS NOT NULL
+        """,
+        "DROP TABLE leaderboard",
+        "ALTER TABLE leaderboard_new RENAME TO leaderboard",
+    ])
+
+
+def _scores_sync_log(conn):
+    """
+    Log logged and deleted scores and high score changes for sync.py;
+    existing rows are logged as inserts. Leaderboard rows have no rowid
+    and are identified by their key columns in the data.
+    """
+    _sync_log_tables(conn)
+    _run(conn, [
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_score_log_sync_insert AFTER INSERT ON score_log
+        WHEN {SYNC_LOGGING}
+        BEGIN
+            INSERT INTO sync_log (tbl, row_id, op, data, stamp)
+            VALUES ('score_log', NEW.id, 'upsert',
+                    json_object('user_id', NEW.user_id, 'deck_id', NEW.deck_id, 'timestamp', NEW.timestamp,
+                                'score', NEW.score, 'total', NEW.total, 'difficulty', NEW.difficulty,
+                                'category', NEW.category),
+                    {SYNC_NOW});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_score_log_sync_delete AFTER DELETE ON score_log
+        WHEN {SYNC_LOGGING}
+        BEGIN
+            INSERT INTO sync_log (tbl, row_id, op, data, stamp) VALUES ('score_log', OLD.id, 'delete', '{{}}', {SYNC_NOW});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leaderboard_sync_insert AFTER INSERT ON leaderboard
+        WHEN {SYNC_LOGGING}
+        BEGIN
+            INSERT INTO sync_log (tbl, op, data, stamp)
+            VALUES ('leaderboard', 'upsert',
+                    json_object('user_id', NEW.user_id, 'deck_id', NEW.deck_id, 'difficulty', NEW.difficulty,
+                                'high_score', NEW.high_score),
+                    {SYNC_NOW});
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS trg_leaderboard_sync_update AFTER UPDATE ON leaderboard
+        WHEN {SYNC_LOGGING} AND NEW.high_score IS NOT OLD.high_score
+        BEGIN
+            INSERT INTO sync_log (tbl, op, data, stamp)
+            VALUES ('leaderboard', 'upsert',
+                    json_object('user_id', NEW.user_id, 'deck_id', NEW.deck_id, 'difficulty', NEW.difficulty,
+                                'high_score', NEW.high_score),
+                    {SYNC_NOW});
+        END
+        """,
+        f"""
+        INSERT INTO sync_log (tbl, row_id, op, data, stamp)
+        SELECT 'score_log', id, 'upsert',
+               json_object('user_id', user_id, 'deck_id', deck_id, 'timestamp', timestamp, 'score', score,
+                           'total', total, 'difficulty', difficulty, 'category', category),
+               {SYNC_NOW}
+        FROM score_log ORDER BY id
+        """,
+        f"""
+        INSERT INTO sync_log (tbl, op, data, stamp)
+        SELECT 'leaderboard', 'upsert',
+               json_object('user_id', user_id, 'deck_id', deck_id, 'difficulty', difficulty,
+                           'high_score', high_score),
+               {SYNC_NOW}
+        FROM leaderboard
+        """,
+    ])
+
+
+SCORE_MIGRATIONS = [
+    (1, "score_log and leaderboard tables", _scores_base),
+    (2, "score_log.category", _scores_category),
+    (3, "review events", _scores_review_events),
+    (4, "score aggregates", _scores_stats),
+    (5, "score_log timestamp index", _scores_timestamp_index),
+    (6, "per-user scores", _scores_owners),
+    (7, "sync change log", _scores_sync_log),
+]
+
+
+# ------------- sync_server.db -------------
+
+def _sync_server_base(conn):
+    """
+    Changes relayed by sync_server.py in arrival order, and the last seq
+    each device has pushed to each stream.
+    """
+    _run(conn, [
+        """
+        CREATE TABLE IF NOT EXISTS changes (
+            id INTEGER PRIMARY KEY,
+            stream TEXT NOT NULL,
+            device TEXT NOT NULL,
+            seq INTEGER NOT NULL,
+            change TEXT NOT NULL,
+            UNIQUE (stream, device, seq)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_changes_stream ON changes (stream)",
+        """
+        CREATE TABLE IF NOT EXISTS devices (
+            stream TEXT NOT NULL,
+            device TEXT NOT NULL,
+            last_seq INTEGER NOT NULL,
+            last_seen REAL NOT NULL,
+            PRIMARY KEY (stream, device)
+        ) WITHOUT ROWID
+        """,
+    ])
+
+
+SYNC_SERVER_MIGRATIONS = [
+    (1, "changes and devices", _sync_server_base),
+]
+
+
+# ------------- Engine -------------
+
+def schema_version(path):
+    return get_connection(path).execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(path, migrations):
+    """
+    Bring the database at `path` up to the latest version in `migrations`
+    and return the resulting version. A current schema costs one PRAGMA read.
+    """
+    latest = migrations[-1][0]
+    if schema_version(path) >= latest:
+        return latest
+    with transaction(path) as conn:
+        # Re-check under the write lock in case another process migrated first.
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, _, apply in migrations:
+            if number > version:
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {number}")
+    return latest
+
+
+def migrate_all(flashcards_db=None, score_db=None):
+    """Migrate both application databases; returns {path: version}."""
+    import flashcard_db
+    import score_logger
+    flashcards_db = flashcards_db or flashcard_db.DB_NAME
+    score_db = score_db or score_logger.SCORE_DB
+    return {
+        flashcards_db: migrate(flashcards_db, FLASHCARD_MIGRATIONS),
+        score_db: migrate(score_db, SCORE_MIGRATIONS),
+    }
+
+
+if __name__ == "__main__":
+    for path, version in migrate_all().items():
+        print(f"{path}: schema version {version}")
+    print("Migration complete.")
@@ -0,0 +1,274 @@
+"""
+Optional instrumentation of the data-access functions and GUI actions.
+
+Set FLASHCARD_PERF=1 (or pass --perf to main.py) to turn it on; the
+decision is made once, before the data modules are imported. When it is
+off, instrument() leaves every function untouched and database.py opens
+plain connections, so the hooks cost nothing and stay in production.
+
+When it is on:
+
+  - the public functions of flashcard_db, score_logger, scheduler and
+    gui are wrapped to count calls and add their latency to a log-spaced
+    histogram; GUI background tasks are timed from click to callback
+    (see background.py)
+  - every statement run on a pooled connection is timed, and those
+    slower than SLOW_QUERY_MS are appended to SLOW_QUERY_LOG with their
+    EXPLAIN QUERY PLAN
+  - at exit the counters are merged into PERF_FILE, which
+    `python main.py stats --perf` prints
+
+snapshot() returns the current process's numbers (the API serves them
+at GET /metrics).
+"""
+import atexit
+import bisect
+import json
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+ENABLED = os.environ.get("FLASHCARD_PERF", "") not in ("", "0")
+SLOW_QUERY_MS = float(os.environ.get("FLASHCARD_SLOW_QUERY_MS", 20))
+SLOW_QUERY_LOG = "slow_queries.log"
+PERF_FILE = "perf_stats.json"
+PERCENTILES = (50, 90, 99)
+# Latency histogram: 1 µs to ~70 s, four bins per doubling (~19% wide).
+EDGES = [1e-6 * 2 ** (i / 4) for i in range(105)]
+EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+_WHITESPACE = re.compile(r"\s+")
+_lock = threading.Lock()
+_calls = {}         # name -> [count, total seconds, max seconds, bucket counts]
+_slow_queries = {}  # statement -> [count, max seconds]
+
+
+def enable():
+    """Turn instrumentation on; only affects modules imported afterwards."""
+    global ENABLED
+    if not ENABLED:
+        ENABLED = True
+        atexit.register(save)
+
+
+def record(name, seconds):
+    """Add one call of `name` taking `seconds`."""
+    with _lock:
+        entry = _calls.get(name)
+        if entry is None:
+            entry = _calls[name] = [0, 0.0, 0.0, [0] * (len(EDGES) + 1)]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+        entry[3][bisect.bisect(EDGES, seconds)] += 1
+
+
+def timed(fn, name=None):
+    """Wrap `fn` to record its calls under `name` (its qualified name by default)."""
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+    return wrapper
+
+
+def timed_generator(fn, name=None):
+    """
+    Like timed() for a generator function: one call is the whole
+    iteration, counting only the time spent inside the generator.
+    """
+    name = name or f"{fn.__module__}.{fn.__qualname__}"
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        iterator = fn(*args, **kwargs)
+        spent = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    spent += time.perf_counter() - start
+                yield item
+        finally:
+            iterator.close()
+            record(name, spent)
+    return wrapper
+
+
+def instrument(namespace, exclude=()):
+    """
+    Time every public function and method defined in a module, given its
+    globals(); call it at the end of the module. main() and the names in
+    `exclude` ("function" or "Class.method") are skipped. A no-op unless
+    instrumentation is enabled.
+    """
+    if not ENABLED:
+        return
+    import inspect  # only paid for when instrumentation is on
+
+    def wanted(name, fn):
+        return (inspect.isfunction(fn) and not name.split(".")[-1].startswith("_") and name != "main"
+                and name not in exclude)
+
+    def wrap(fn, name):
+        return (timed_generator if inspect.isgeneratorfunction(fn) else timed)(fn, name)
+
+    module = namespace["__name__"]
+    for name, obj in list(namespace.items()):
+        if getattr(obj, "__module__", None) != module:
+            continue
+        if wanted(name, obj):
+            namespace[name] = wrap(obj, f"{module}.{name}")
+        elif inspect.isclass(obj):
+            for attr, method in list(vars(obj).items()):
+                if wanted(f"{name}.{attr}", method):
+                    setattr(obj, attr, wrap(method, f"{module}.{name}.{attr}"))
+
+
+# ------------- Slow queries -------------
+
+def query_done(conn, sql, params, seconds):
+    """Called by database.TimedConnection after each statement."""
+    if seconds * 1000 < SLOW_QUERY_MS:
+        return
+    statement = _WHITESPACE.sub(" ", sql).strip()
+    with _lock:
+        entry = _slow_queries.setdefault(statement, [0, 0.0])
+        entry[0] += 1
+        entry[1] = max(entry[1], seconds)
+
+    plan = []
+    if statement.upper().startswith(EXPLAINABLE):
+        try:
+            rows = sqlite3.Connection.execute(conn, "EXPLAIN QUERY PLAN " + sql, params).fetchall()
+            plan = [f"    {'  ' * _depth(rows, row)}{row[-1]}" for row in rows]
+        except (sqlite3.Error, ValueError):
+            pass
+    line = (f"{time.strftime('%Y-%m-%d %H:%M:%S')} {seconds * 1000:9.1f} ms  "
+            f"{os.path.basename(_database_file(conn))}  {statement}  params={_short(params)}")
+    with _lock, open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+        f.write("\n".join([line] + plan) + "\n")
+
+
+def _depth(rows, row):
+    parents = {r[0]: r[1] for r in rows}
+    depth, parent = 0, row[1]
+    while parent in parents:
+        depth, parent = depth + 1, parents[parent]
+    return depth
+
+
+def _database_file(conn):
+    try:
+        return sqlite3.Connection.execute(conn, "PRAGMA database_list").fetchone()[2] or ":memory:"
+    except sqlite3.Error:
+        return "?"
+
+
+def _short(params, limit=120):
+    text = repr(params)
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+# ------------- Snapshots -------------
+
+def _percentile(buckets, count, p):
+    """Geometric middle of the bin holding the p-th percentile."""
+    target, seen = math.ceil(count * p / 100), 0
+    for i, n in enumerate(buckets):
+        seen += n
+        if seen >= target:
+            lower, upper = EDGES[max(i - 1, 0)], EDGES[min(i, len(EDGES) - 1)]
+            return math.sqrt(lower * upper)
+    return EDGES[-1]
+
+
+def _summary(calls, slow_queries):
+    summary = {}
+    for name, (count, total, longest, buckets) in sorted(calls.items()):
+        summary[name] = dict(
+            calls=count, total_ms=total * 1000, mean_ms=total / count * 1000, max_ms=longest * 1000,
+            **{f"p{p}_ms": _percentile(buckets, count, p) * 1000 for p in PERCENTILES},
+        )
+    slow = [{"sql": sql, "count": count, "max_ms": longest * 1000}
+            for sql, (count, longest) in sorted(slow_queries.items(), key=lambda item: -item[1][1])]
+    return {"calls": summary, "slow_queries": slow}
+
+
+def snapshot():
+    """Counters of this process: {"enabled", "calls": {name: stats}, "slow_queries": [...]}."""
+    with _lock:
+        calls = {name: [e[0], e[1], e[2], list(e[3])] for name, e in _calls.items()}
+        slow = {sql: list(e) for sql, e in _slow_queries.items()}
+    return dict(_summary(calls, slow), enabled=ENABLED)
+
+
+def load(path=PERF_FILE):
+    """Raw counters saved by earlier runs: {"calls": ..., "slow_queries": ...}."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {"calls": {}, "slow_queries": {}}
+
+
+def saved_snapshot(path=PERF_FILE):
+    """Like snapshot(), for the counters accumulated in PERF_FILE."""
+    data = load(path)
+    return _summary(data["calls"], data["slow_queries"])
+
+
+def save(path=PERF_FILE):
+    """Merge this process's counters into `path` and reset them."""
+    with _lock:
+        if not _calls and not _slow_queries:
+            return
+        data = load(path)
+        for name, (count, total, longest, buckets) in _calls.items():
+            saved = data["calls"].setdefault(name, [0, 0.0, 0.0, [0] * len(buckets)])
+            saved[0] += count
+            saved[1] += total
+            saved[2] = max(saved[2], longest)
+            saved[3] = [a + b for a, b in zip(saved[3], buckets)]
+        for sql, (count, longest) in _slow_queries.items():
+            saved = data["slow_queries"].setdefault(sql, [0, 0.0])
+            saved[0] += count
+            saved[1] = max(saved[1], longest)
+        _calls.clear()
+        _slow_queries.clear()
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def print_snapshot(snap):
+    if not snap["calls"]:
+        print("No measurements yet: run commands with FLASHCARD_PERF=1 (or main.py --perf).")
+        return
+    print(f"{'call':<44}{'calls':>9}{'total ms':>11}{'mean':>9}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES)
+          + f"{'max':>9}")
+    for name, s in sorted(snap["calls"].items(), key=lambda item: -item[1]["total_ms"]):
+        print(f"{name[:43]:<44}{s['calls']:>9,}{s['total_ms']:>11,.1f}{s['mean_ms']:>9.2f}"
+              + "".join(f"{s[f'p{p}_ms']:>9.2f}" for p in PERCENTILES) + f"{s['max_ms']:>9.1f}")
+    if snap["slow_queries"]:
+        print(f"\n🐢 Slow queries (plans in {SLOW_QUERY_LOG})")
+        for query in snap["slow_queries"][:10]:
+            print(f"   {query['count']:>6,}x  max {query['max_ms']:8.1f} ms  {query['sql'][:90]}")
+
+
+if ENABLED:
+    atexit.register(save)
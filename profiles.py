@@ -0,0 +1,249 @@
+"""
+Users and decks.
+
+Every card, review and score belongs to a (user, deck) pair, and the
+data modules key all their reads and writes by owner(), the pair in use.
+Like flashcard_db.DB_NAME it is process-wide: call use() to switch. The
+users and decks tables live in the shared flashcards database, and every
+card and score index leads with (user_id, deck_id), so one user's
+queries only ever read that user's rows.
+
+A user created with sharded=True keeps their cards and scores in their
+own pair of SQLite files under SHARD_DIR instead; use() points
+flashcard_db.DB_NAME and score_logger.SCORE_DB at them, so their writes
+never wait on the shared files' write lock. Reads that span users
+(class_leaderboard) ATTACH the shards on demand, a few at a time.
+
+Usage:
+    python main.py users list
+    python main.py users add alice [--sharded]
+    python main.py users add-deck alice Biology
+    python main.py --user alice --deck Biology quiz
+"""
+import argparse
+import os
+
+from database import get_connection, transaction
+
+DEFAULT_USER = "default"
+DEFAULT_DECK = "Default"
+SHARD_DIR = "users"
+MAX_ATTACHED = 8  # SQLite allows 10 attached databases by default
+
+SELECT_USERS_SQL = "SELECT id, name, sharded FROM users ORDER BY name"
+SELECT_USER_SQL = "SELECT id, name, sharded FROM users WHERE name = ?"
+INSERT_USER_SQL = "INSERT INTO users (name, sharded) VALUES (?, ?) ON CONFLICT (name) DO NOTHING"
+SELECT_DECKS_SQL = "SELECT name FROM decks WHERE user_id = ? ORDER BY name"
+SELECT_DECK_SQL = "SELECT id FROM decks WHERE user_id = ? AND name = ?"
+INSERT_DECK_SQL = "INSERT INTO decks (user_id, name) VALUES (?, ?) ON CONFLICT (user_id, name) DO NOTHING"
+SELECT_OWNERS_SQL = "SELECT d.user_id, d.id, u.name, d.name FROM decks d JOIN users u ON u.id = d.user_id"
+USER_LEADERBOARD_SQL = """
+    SELECT user_id, difficulty, MAX(high_score) FROM {schema}.leaderboard
+    {where} GROUP BY user_id, difficulty
+"""
+
+_owner = (1, 1)
+_current = {"user": DEFAULT_USER, "deck": DEFAULT_DECK}
+_shared = None  # (flashcards db, scores db) holding the catalog and unsharded users
+
+
+def owner():
+    """(user_id, deck_id) that card and score data is keyed by."""
+    return _owner
+
+
+def current():
+    """Names of the user and deck in use."""
+    return _current["user"], _current["deck"]
+
+
+def _shared_paths():
+    global _shared
+    if _shared is None:
+        import flashcard_db
+        import score_logger
+        _shared = (flashcard_db.DB_NAME, score_logger.SCORE_DB)
+    return _shared
+
+
+def shard_paths(user_id):
+    """(flashcards db, scores db) of a sharded user."""
+    folder = os.path.join(SHARD_DIR, str(user_id))
+    return os.path.join(folder, "flashcards.db"), os.path.join(folder, "score_history.db")
+
+
+def _catalog():
+    from migrations import migrate, FLASHCARD_MIGRATIONS
+    path = _shared_paths()[0]
+    migrate(path, FLASHCARD_MIGRATIONS)
+    return path
+
+
+def list_users():
+    """[(id, name, sharded)] for every user."""
+    return get_connection(_catalog()).execute(SELECT_USERS_SQL).fetchall()
+
+
+def get_user(name):
+    return get_connection(_catalog()).execute(SELECT_USER_SQL, (name,)).fetchone()
+
+
+def create_user(name, sharded=False):
+    """Create a user with an empty default deck; returns (id, name, sharded)."""
+    name = name.strip()
+    if not name:
+        raise ValueError("User name cannot be empty.")
+    with transaction(_catalog()) as conn:
+        conn.execute(INSERT_USER_SQL, (name, int(sharded)))
+        user = conn.execute(SELECT_USER_SQL, (name,)).fetchone()
+        conn.execute(INSERT_DECK_SQL, (user[0], DEFAULT_DECK))
+    return user
+
+
+def list_decks(user_name):
+    user = get_user(user_name)
+    if user is None:
+        return []
+    return [row[0] for row in get_connection(_catalog()).execute(SELECT_DECKS_SQL, (user[0],))]
+
+
+def create_deck(user_name, deck_name):
+    """Create a deck for an existing user; returns its id."""
+    user = get_user(user_name)
+    if user is None:
+        raise ValueError(f"No such user: {user_name}")
+    deck_name = deck_name.strip()
+    if not deck_name:
+        raise ValueError("Deck name cannot be empty.")
+    with transaction(_catalog()) as conn:
+        conn.execute(INSERT_DECK_SQL, (user[0], deck_name))
+        return conn.execute(SELECT_DECK_SQL, (user[0], deck_name)).fetchone()[0]
+
+
+def owner_names():
+    """{(user_id, deck_id): (user name, deck name)} for every deck."""
+    return {(user_id, deck_id): (user, deck)
+            for user_id, deck_id, user, deck in get_connection(_catalog()).execute(SELECT_OWNERS_SQL)}
+
+
+def owner_ids(user_name, deck_name):
+    """(user_id, deck_id) of a user's deck, creating the user and the deck if needed."""
+    user = get_user(user_name) or create_user(user_name)
+    deck = get_connection(_catalog()).execute(SELECT_DECK_SQL, (user[0], deck_name)).fetchone()
+    return user[0], deck[0] if deck else create_deck(user_name, deck_name)
+
+
+def prepare(user_name=DEFAULT_USER, deck_name=DEFAULT_DECK, create=True):
+    """
+    The database work of use(): look up (or create, if `create`) the user
+    and deck and migrate the user's databases, without switching to them.
+    Returns the profile to pass to activate().
+    """
+    from migrations import migrate, FLASHCARD_MIGRATIONS, SCORE_MIGRATIONS
+
+    user = get_user(user_name)
+    if user is None:
+        if not create:
+            raise ValueError(f"No such user: {user_name}")
+        user = create_user(user_name)
+    deck_id = get_connection(_catalog()).execute(SELECT_DECK_SQL, (user[0], deck_name)).fetchone()
+    if deck_id is None:
+        if not create:
+            raise ValueError(f"{user_name} has no deck named {deck_name}")
+        deck_id = (create_deck(user_name, deck_name),)
+
+    if user[2]:
+        flashcards_path, scores_path = shard_paths(user[0])
+        os.makedirs(os.path.dirname(flashcards_path), exist_ok=True)
+    else:
+        flashcards_path, scores_path = _shared_paths()
+    migrate(flashcards_path, FLASHCARD_MIGRATIONS)
+    migrate(scores_path, SCORE_MIGRATIONS)
+    return (user[0], deck_id[0]), (user[1], deck_name), (flashcards_path, scores_path)
+
+
+def activate(profile):
+    """
+    Point the data modules at a profile from prepare(). No database work;
+    in the GUI, call it on the Tk thread while no task is running.
+    """
+    global _owner
+    import flashcard_db
+    import score_logger
+
+    ids, (user_name, deck_name), paths = profile
+    flashcard_db.DB_NAME, score_logger.SCORE_DB = paths
+    _owner = ids
+    _current.update(user=user_name, deck=deck_name)
+    return _owner
+
+
+def use(user_name=DEFAULT_USER, deck_name=DEFAULT_DECK, create=True):
+    """
+    Switch to `user_name`'s deck `deck_name` (creating either if `create`)
+    and point the data modules at the user's databases.
+    """
+    return activate(prepare(user_name, deck_name, create))
+
+
+def class_leaderboard(difficulty=None):
+    """
+    Best score per user and difficulty across all users, sharded ones
+    included: [(user name, difficulty, high score)], best first.
+    """
+    users = list_users()
+    names = {user_id: name for user_id, name, _ in users}
+    where, params = ("WHERE difficulty = ?", [difficulty]) if difficulty else ("", [])
+    conn = get_connection(_shared_paths()[1])
+    rows = conn.execute(USER_LEADERBOARD_SQL.format(schema="main", where=where), params).fetchall()
+
+    shards = [shard_paths(user_id)[1] for user_id, _, sharded in users if sharded]
+    shards = [path for path in shards if os.path.exists(path)]
+    for start in range(0, len(shards), MAX_ATTACHED):
+        attached = []
+        try:
+            for path in shards[start:start + MAX_ATTACHED]:
+                schema = f"shard{len(attached)}"
+                conn.execute(f"ATTACH DATABASE ? AS {schema}", (path,))
+                attached.append(schema)
+                rows += conn.execute(USER_LEADERBOARD_SQL.format(schema=schema, where=where), params).fetchall()
+        finally:
+            for schema in attached:
+                conn.execute(f"DETACH DATABASE {schema}")
+
+    return sorted(((names.get(user_id, f"#{user_id}"), diff, score) for user_id, diff, score in rows),
+                  key=lambda row: row[2], reverse=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py users", description="Manage users and decks.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("list", help="list users and their decks")
+    add = commands.add_parser("add", help="create a user")
+    add.add_argument("name")
+    add.add_argument("--sharded", action="store_true", help="store this user's data in separate files")
+    add_deck = commands.add_parser("add-deck", help="create a deck for a user")
+    add_deck.add_argument("user")
+    add_deck.add_argument("deck")
+    commands.add_parser("leaderboard", help="best scores across all users")
+    args = parser.parse_args(argv)
+
+    if args.command == "list":
+        for user_id, name, sharded in list_users():
+            print(f"👤 {name}{' (sharded)' if sharded else ''}: {', '.join(list_decks(name))}")
+    elif args.command == "add":
+        if get_user(args.name):
+            print(f"User {args.name} already exists.")
+        else:
+            create_user(args.name, args.sharded)
+            print(f"✅ Created user {args.name}")
+    elif args.command == "add-deck":
+        create_deck(args.user, args.deck)
+        print(f"✅ Created deck {args.deck} for {args.user}")
+    else:
+        for name, difficulty, score in class_leaderboard():
+            print(f"🏆 {name:<20} {difficulty:<10} {score}")
+
+
+if __name__ == "__main__":
+    main()
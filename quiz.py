@@ -1,24 +1,53 @@
-import random
-from score_logger import log_score
-from flashcard import load_flashcards
+"""
+Terminal quiz.
 
-def start_quiz():
-    flashcards = load_flashcards()
-    if not flashcards:
-            print(f"\n🎯 You got {score}/{len(flashcards)} correct!")
-    log_score(score, len(flashcards))
+Usage:
+    python main.py quiz [--category Math] [--difficulty Hard] [--size 20] [--due]
+"""
+import argparse
+
+import flashcard_db
+from score_logger import init_score_db, REVIEW_DIFFICULTY
+from quiz_engine import QuizSession, QuizRecorder, select_cards, SESSION_SIZE
 
 
-    random.shuffle(flashcards)
-    score = 0
+def start_quiz(category=None, difficulty=None, size=SESSION_SIZE, due=False):
+    """Ask up to `size` randomly chosen (or due) cards; returns (score, total)."""
+    flashcards = select_cards(category, difficulty, size, due)
+    if not flashcards:
+        print("No flashcards found. Add or import some first.")
+        return 0, 0
 
-    for fc in flashcards:
-        user_ans = input(f"Q: {fc['question']}\nYour answer: ").strip().lower()
-        correct = fc['answer'].strip().lower()
-        if user_ans == correct:
+    label = REVIEW_DIFFICULTY if due else difficulty or "All"
+    session = QuizSession(flashcards, label, category or "All", recorder=QuizRecorder())
+    card = session.next_card()
+    while card is not None:
+        result = session.answer(input(f"Q: {card['question']}\nYour answer: "))
+        if result.correct:
             print("✅ Correct!")
-            score += 1
+        elif result.timed_out:
+            print(f"⏰ Too slow! Correct answer: {card['answer']}")
         else:
-            print(f"❌ Wrong! Correct answer: {fc['answer']}")
+            print(f"❌ Wrong! Correct answer: {card['answer']}")
+        card = session.next_card()
+
+    score, total = session.finish()
+    print(f"\n🎯 You got {score}/{total} correct!")
+    return score, total
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py quiz", description="Take a quiz in the terminal.")
+    parser.add_argument("--category")
+    parser.add_argument("--difficulty", choices=flashcard_db.DIFFICULTIES)
+    parser.add_argument("--size", "--limit", type=int, default=SESSION_SIZE, help="ask at most this many questions")
+    parser.add_argument("--due", action="store_true", help="review the cards due in the SM-2 schedule")
+    args = parser.parse_args(argv)
+
+    flashcard_db.init_db()
+    init_score_db()
+    start_quiz(args.category, args.difficulty, args.size, args.due)
+
 
-    print(f"\n🎯 You got {score}/{len(flashcards)} correct!")
+if __name__ == "__main__":
+    main()
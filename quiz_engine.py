@@ -0,0 +1,208 @@
+"""
+Quiz session engine.
+
+QuizSession walks a list of cards, times and grades each answer and
+keeps the score without doing any I/O, so the same logic drives the
+terminal quiz (quiz.py), the Tk quiz window (gui.py) and the load-test
+simulator (simulator.py). Persistence is delegated to a recorder: pass
+QuizRecorder() to log review events, update the SM-2 schedule and log
+the final score, or nothing to keep the session in memory only.
+
+Quizzes stream their cards: select_cards() samples at most SESSION_SIZE
+card ids in SQL and returns a CardStream, which reads the cards
+themselves a few at a time on a prefetch thread. The first question is
+ready after a handful of index lookups and memory stays bounded by the
+session size, however large the deck. A session only moves on to the
+next card when it is asked for, and `ready` tells whether that can
+happen without waiting, so the GUI never blocks on the prefetch thread.
+
+The clock is injectable so simulations can run on synthetic time.
+"""
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import flashcard_db
+import scheduler
+import score_logger
+from grading import grade
+
+TIME_LIMIT = 60
+SESSION_SIZE = 20   # cards drawn per quiz
+PREFETCH = 5        # cards read ahead of the one being asked
+
+AnswerResult = namedtuple("AnswerResult", ["card", "given", "correct", "latency", "timed_out"])
+
+
+_prefetcher = ThreadPoolExecutor(1, thread_name_prefix="card-prefetch")
+
+
+class CardStream:
+    """
+    Iterates over the cards with the given ids, in order. The next
+    `prefetch` cards are always being read on the prefetch thread while
+    the current ones are asked.
+    """
+
+    def __init__(self, ids, prefetch=PREFETCH):
+        self.ids = list(ids)
+        self.prefetch = prefetch
+        self._requested = 0
+        self._buffer = deque()
+        self._pending = None
+        self._request()
+
+    def _request(self):
+        batch = self.ids[self._requested:self._requested + self.prefetch]
+        self._requested += len(batch)
+        self._pending = _prefetcher.submit(flashcard_db.get_flashcards_by_ids, batch) if batch else None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        return self
+
+    def _fill(self, block):
+        while not self._buffer and self._pending is not None and (block or self._pending.done()):
+            self._buffer.extend(self._pending.result())
+            self._request()
+
+    def ready(self):
+        """True if next() can return without waiting for the database."""
+        self._fill(block=False)
+        return bool(self._buffer) or self._pending is None
+
+    def wait(self):
+        """Block until next() can return at once (not on the Tk thread)."""
+        self._fill(block=True)
+
+    def __next__(self):
+        self._fill(block=True)
+        if not self._buffer:
+            raise StopIteration
+        return self._buffer.popleft()
+
+
+def select_cards(category=None, difficulty=None, size=SESSION_SIZE, due=False, prefetch=PREFETCH):
+    """Pick the cards for a quiz: a random sample of the filtered deck, or the due queue."""
+    if due:
+        ids = [card["id"] for card in scheduler.get_due_cards(limit=size, category=category, difficulty=difficulty)]
+    else:
+        ids = flashcard_db.sample_flashcard_ids(category, difficulty, size)
+    cards = CardStream(ids, prefetch)
+    cards.wait()  # the first question is read here, on the caller's thread
+    return cards
+
+
+class QuizRecorder:
+    """Persists a session: review events, SM-2 schedule updates and the final score."""
+
+    def __init__(self, time_limit=TIME_LIMIT):
+        self.session_id = score_logger.new_session_id()
+        self.reviews = scheduler.ReviewSession(time_limit)
+
+    def answered(self, session, result):
+        """Called on the answering thread; only buffers, never touches the database."""
+        card_id = result.card["id"]
+        self.reviews.record(card_id, result.correct, result.latency)
+        score_logger.log_review_event(self.session_id, card_id, result.correct, result.latency, result.given)
+
+    def finished(self, session):
+        self.reviews.commit()
+        score_logger.log_session_score(self.session_id, session.difficulty, session.category)
+
+
+class QuizSession:
+    """
+    One quiz over `cards`: a list or any sized iterable such as a
+    CardStream, consumed one card at a time.
+    """
+
+    def __init__(self, cards, difficulty="All", category="All", time_limit=TIME_LIMIT,
+                 recorder=None, clock=time.monotonic):
+        self._cards = iter(cards)
+        self._total = len(cards)
+        self._current = next(self._cards, None)
+        if self._current is None:
+            self._total = 0
+        self.difficulty = difficulty
+        self.category = category
+        self.time_limit = time_limit
+        self.recorder = recorder
+        self.clock = clock
+        self.index = 0
+        self.correct = 0
+        self.results = []
+        self.shown_at = None
+        self._advanced = True
+
+    @property
+    def total(self):
+        return self._total
+
+    @property
+    def current(self):
+        if not self._advanced:
+            self._current = next(self._cards, None)
+            if self._current is None:
+                self._total = self.index  # cards deleted since sampling are skipped
+            self._advanced = True
+        return self._current
+
+    @property
+    def ready(self):
+        """True if the next card can be shown without waiting for the card stream."""
+        return self._advanced or getattr(self._cards, "ready", lambda: True)()
+
+    @property
+    def finished(self):
+        return self.current is None
+
+    @property
+    def asked(self):
+        """True while a card is shown and waiting for its answer."""
+        return self.shown_at is not None
+
+    def next_card(self):
+        """Show the next card and start its timer; returns None when the quiz is over."""
+        card = self.current
+        if card is not None:
+            self.shown_at = self.clock()
+        return card
+
+    def time_left(self):
+        if self.shown_at is None:
+            return self.time_limit
+        return max(0.0, self.time_limit - (self.clock() - self.shown_at))
+
+    def answer(self, given):
+        """
+        Grade `given` against the current card and advance. An answer
+        arriving after the time limit (or None) counts as a timeout.
+        """
+        card = self.current
+        if card is None:
+            raise RuntimeError("The quiz is already over.")
+        latency = None if self.shown_at is None else self.clock() - self.shown_at
+        timed_out = given is None or (latency is not None and latency >= self.time_limit)
+        correct = not timed_out and grade(card, given)
+        result = AnswerResult(card, given or "", correct, latency, timed_out)
+
+        self.results.append(result)
+        self.correct += correct
+        self.index += 1
+        self._advanced = False  # the next card is taken when it is asked for
+        self.shown_at = None
+        if self.recorder is not None:
+            self.recorder.answered(self, result)
+        return result
+
+    def timeout(self):
+        return self.answer(None)
+
+    def finish(self):
+        """Close the session (persisting it via the recorder); returns (score, total)."""
+        if self.recorder is not None:
+            self.recorder.finished(self)
+        return self.correct, self.total
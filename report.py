@@ -0,0 +1,104 @@
+"""
+Plain-text statistics report for headless use (cron jobs, terminals).
+
+Usage:
+    python main.py stats
+    python main.py stats --perf     # call timings and slow queries (see perf.py)
+"""
+import argparse
+
+import flashcard_db
+import profiles
+import score_logger
+import scheduler
+
+
+def build_report():
+    """Collect deck and score statistics into a dict; analytics need numpy."""
+    report = {
+        "owner": profiles.current(),
+        "cards": flashcard_db.count_flashcards(),
+        "due": scheduler.count_due_cards(),
+        "categories": flashcard_db.get_category_counts(),
+        "accuracy": score_logger.get_difficulty_stats(),
+        "leaderboard": score_logger.get_leaderboard(),
+    }
+    try:
+        import stats
+    except ImportError:
+        return report
+    report["trend"] = stats.accuracy_trend()
+    report["retention"] = stats.retention_curves()
+    report["latency"] = stats.latency_percentiles()
+    return report
+
+
+def print_report(report):
+    print("👤 {} · 🗂️ {}".format(*report["owner"]))
+    print(f"📚 Flashcards: {report['cards']:,} ({report['due']:,} due for review)")
+    for category, count in report["categories"]:
+        print(f"   {category}: {count:,}")
+
+    print("\n📊 Accuracy by difficulty")
+    if not report["accuracy"]:
+        print("   No quiz data yet.")
+    for difficulty, correct, total in report["accuracy"]:
+        percent = correct / total * 100 if total else 0
+        print(f"   {difficulty}: {correct:,}/{total:,} ({percent:.1f}%)")
+
+    print("\n🏆 High scores")
+    if not report["leaderboard"]:
+        print("   No scores recorded yet.")
+    for difficulty, score in report["leaderboard"]:
+        print(f"   {difficulty}: {score}")
+
+    if "trend" not in report:
+        print("\n(Install numpy for accuracy trends, retention curves and response times.)")
+        return
+    trend = report["trend"]
+    print("\n📈 Accuracy trend (last 7 days with quizzes)")
+    active = [i for i, quizzes in enumerate(trend["quizzes"]) if quizzes]
+    if not active:
+        print("   No quiz data yet.")
+    for i in active[-7:]:
+        print(f"   {trend['days'][i]}: {trend['accuracy'][i]:6.1%}   "
+              f"7-day average {trend['moving_average'][i]:6.1%}   ({trend['quizzes'][i]} quizzes)")
+
+    retention = report["retention"]
+    print("\n🧠 Recall rate by days since previous review")
+    if not retention["curves"]:
+        print("   No repeated reviews yet.")
+    else:
+        print("   " + " " * 16 + "".join(f"{int(b):>5}d" for b in retention["bins"]))
+    for category, (rate, _) in retention["curves"].items():
+        cells = "".join("     -" if r != r else f"{r:>6.0%}" for r in rate)
+        print(f"   {category[:16]:<16}{cells}")
+
+    latency = report["latency"]
+    print(f"\n⏱️ Response times over {latency['answers']:,} answers")
+    if not latency["answers"]:
+        print("   No timed answers yet.")
+        return
+    for outcome in ("all", "correct", "wrong"):
+        cells = "   ".join(f"p{p} {'-':>7}" if seconds != seconds else f"p{p} {seconds:6.1f}s"
+                           for p, seconds in latency[outcome].items())
+        print(f"   {outcome:<8}{cells}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py stats", description="Print deck and score statistics.")
+    parser.add_argument("--perf", action="store_true",
+                        help="print the call timings and slow queries recorded with --perf / FLASHCARD_PERF=1")
+    args = parser.parse_args(argv)
+    if args.perf:
+        import perf
+        perf.print_snapshot(perf.saved_snapshot())
+        return
+
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    print_report(build_report())
+
+
+if __name__ == "__main__":
+    main()
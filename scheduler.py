@@ -0,0 +1,149 @@
+"""
+Spaced-repetition scheduling (SM-2).
+
+Every flashcard has a row in card_schedule holding its ease factor,
+current interval and the timestamp it is next due, keyed like the card
+by (user_id, deck_id). A trigger (see migrations.py) creates the row
+when a card is inserted, so a deck's due queue can always be read
+straight off the (user_id, deck_id, due_at) index without scanning.
+
+Reviews are collected in a ReviewSession and written in one batch when
+the session is committed.
+"""
+import time
+
+import perf
+from database import get_connection, transaction
+import flashcard_db
+from profiles import owner
+
+DAY = 24 * 60 * 60
+MIN_EASE = 1.3
+
+SELECT_DUE_SQL = """
+    SELECT f.id, f.question, f.answer, f.category, f.difficulty
+    FROM card_schedule s JOIN flashcards f ON f.id = s.card_id
+    WHERE s.user_id = ? AND s.deck_id = ? AND s.due_at <= ?
+"""
+SELECT_STATE_SQL = "SELECT card_id, ease, interval_days, repetitions, lapses FROM card_schedule WHERE card_id IN ({})"
+UPSERT_STATE_SQL = """
+    INSERT INTO card_schedule (card_id, ease, interval_days, repetitions, lapses, due_at, last_reviewed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (card_id) DO UPDATE SET
+        ease = excluded.ease, interval_days = excluded.interval_days,
+        repetitions = excluded.repetitions, lapses = excluded.lapses,
+        due_at = excluded.due_at, last_reviewed_at = excluded.last_reviewed_at
+"""
+INSERT_HISTORY_SQL = """
+    INSERT INTO review_history (user_id, deck_id, card_id, reviewed_at, quality, ease, interval_days)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+COUNT_DUE_SQL = "SELECT COUNT(*) FROM card_schedule WHERE user_id = ? AND deck_id = ? AND due_at <= ?"
+
+
+def init_scheduler_db():
+    """The schedule tables are part of the flashcards schema (see migrations.py)."""
+    flashcard_db.init_db()
+
+
+def quality_from_answer(correct, latency=None, time_limit=60):
+    """
+    Map a quiz outcome onto the SM-2 0-5 quality scale.
+    Fast correct answers score 5, slow ones 3; misses 1, timeouts 0.
+    """
+    if not correct:
+        return 0 if latency is not None and latency >= time_limit else 1
+    if latency is None:
+        return 4
+    if latency <= time_limit * 0.25:
+        return 5
+    if latency <= time_limit * 0.75:
+        return 4
+    return 3
+
+
+def sm2(ease, interval_days, repetitions, lapses, quality):
+    """Return the next (ease, interval_days, repetitions, lapses) for a review."""
+    if quality < 3:
+        repetitions = 0
+        lapses += 1
+        interval_days = 1
+    else:
+        repetitions += 1
+        if repetitions == 1:
+            interval_days = 1
+        elif repetitions == 2:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease, 2)
+    ease = max(MIN_EASE, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return ease, interval_days, repetitions, lapses
+
+
+def get_due_cards(limit=20, now=None, category=None, difficulty=None):
+    """
+    Return up to `limit` cards of the current deck due at `now`, most
+    overdue first. Reads walk the (owner, due_at) index and stop after
+    `limit` matches.
+    """
+    now = time.time() if now is None else now
+    sql, params = SELECT_DUE_SQL, [*owner(), now]
+    if category:
+        sql += " AND f.category = ?"
+        params.append(category)
+    if difficulty:
+        sql += " AND f.difficulty = ?"
+        params.append(flashcard_db.difficulty_code(difficulty))
+    sql += " ORDER BY s.due_at LIMIT ?"
+    params.append(limit)
+    rows = get_connection(flashcard_db.DB_NAME).execute(sql, params).fetchall()
+    return [flashcard_db.row_to_card(row) for row in rows]
+
+
+def count_due_cards(now=None):
+    now = time.time() if now is None else now
+    return get_connection(flashcard_db.DB_NAME).execute(COUNT_DUE_SQL, (*owner(), now)).fetchone()[0]
+
+
+class ReviewSession:
+    """Collects the reviews of one quiz and writes them in a single batch."""
+
+    def __init__(self, time_limit=60):
+        self.time_limit = time_limit
+        self.reviews = []
+
+    def record(self, card_id, correct, latency=None, reviewed_at=None):
+        quality = quality_from_answer(correct, latency, self.time_limit)
+        self.reviews.append((card_id, quality, time.time() if reviewed_at is None else reviewed_at))
+
+    def commit(self):
+        """Apply all recorded reviews to the schedule in one transaction."""
+        if not self.reviews:
+            return 0
+        card_ids = sorted({card_id for card_id, _, _ in self.reviews})
+        with transaction(flashcard_db.DB_NAME) as conn:
+            state = {}
+            for start in range(0, len(card_ids), 500):
+                chunk = card_ids[start:start + 500]
+                sql = SELECT_STATE_SQL.format(", ".join("?" * len(chunk)))
+                for card_id, *values in conn.execute(sql, chunk):
+                    state[card_id] = values
+
+            history = []
+            for card_id, quality, reviewed_at in self.reviews:
+                if card_id not in state:
+                    continue  # card was deleted during the session
+                ease, interval_days, repetitions, lapses = state[card_id][:4]
+                ease, interval_days, repetitions, lapses = sm2(ease, interval_days, repetitions, lapses, quality)
+                state[card_id] = [ease, interval_days, repetitions, lapses, reviewed_at + interval_days * DAY, reviewed_at]
+                history.append((*owner(), card_id, reviewed_at, quality, ease, interval_days))
+
+            conn.executemany(UPSERT_STATE_SQL, [(card_id, *values) for card_id, values in state.items()])
+            conn.executemany(INSERT_HISTORY_SQL, history)
+        committed = len(self.reviews)
+        self.reviews = []
+        return committed
+
+
+# Call counts and latencies when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("quality_from_answer", "sm2", "ReviewSession.record"))
@@ -1,76 +1,365 @@
+from collections import Counter
 from datetime import datetime
-import sqlite3
+import argparse
+import atexit
+import os
+import re
+import sys
+import threading
+import time
+import uuid
 
-SCORE_FILE = "score_history.txt"
+import perf
+from database import get_connection, transaction
+from migrations import migrate, SCORE_MIGRATIONS
+from profiles import owner
+
+SCORE_FILE = "score_history.txt"  # legacy text log; score_log is the source of truth
 SCORE_DB = "score_history.db"
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+HISTORY_PAGE_SIZE = 50
+TAIL_BLOCK_SIZE = 8192
+
+# Per-answer review events are buffered and flushed in batches by a
+# background thread once FLUSH_SIZE events are pending or every
+# FLUSH_INTERVAL seconds, whichever comes first. Each event keeps the
+# SCORE_DB it was logged under, so switching users never misfiles it.
+FLUSH_SIZE = 200
+FLUSH_INTERVAL = 2.0
+
+# Due-card reviews are logged under this difficulty; they mix difficulties,
+# so they count in the stats but never set a leaderboard high score.
+REVIEW_DIFFICULTY = "Review"
+
+# Every row is keyed by the (user_id, deck_id) in use; see profiles.py.
+INSERT_EVENT_SQL = """
+    INSERT INTO review_events (user_id, deck_id, session_id, card_id, timestamp, correct, latency, answer)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+SESSION_TOTALS_SQL = "SELECT COALESCE(SUM(correct), 0), COUNT(*) FROM review_events WHERE session_id = ?"
+INSERT_SCORE_SQL = """
+    INSERT INTO score_log (user_id, deck_id, timestamp, score, total, difficulty, category)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+# score_stats holds running totals per (owner, difficulty, category), maintained
+# by log_score so that the chart and leaderboard never have to scan score_log.
+UPSERT_STATS_SQL = """
+    INSERT INTO score_stats (user_id, deck_id, difficulty, category, sum_score, sum_total, attempts, best)
+    VALUES (?, ?, ?, ?, ?, ?, 1, ?)
+    ON CONFLICT (user_id, deck_id, difficulty, category) DO UPDATE SET
+        sum_score = sum_score + excluded.sum_score,
+        sum_total = sum_total + excluded.sum_total,
+        attempts = attempts + 1,
+        best = max(best, excluded.best)
+"""
+UPSERT_HIGH_SCORE_SQL = f"""
+    INSERT INTO leaderboard (user_id, deck_id, difficulty, high_score)
+    SELECT ?1, ?2, ?3, ?4 WHERE ?3 <> '{REVIEW_DIFFICULTY}'
+    ON CONFLICT (user_id, deck_id, difficulty) DO UPDATE SET high_score = max(high_score, excluded.high_score)
+"""
+REBUILD_STATS_SQL = [
+    "DELETE FROM score_stats",
+    """
+    INSERT INTO score_stats (user_id, deck_id, difficulty, category, sum_score, sum_total, attempts, best)
+    SELECT user_id, deck_id, COALESCE(difficulty, 'General'), COALESCE(category, 'All'),
+           SUM(score), SUM(total), COUNT(*), MAX(score)
+    FROM score_log
+    GROUP BY 1, 2, 3, 4
+    """,
+    f"""
+    INSERT INTO leaderboard (user_id, deck_id, difficulty, high_score)
+    SELECT user_id, deck_id, difficulty, MAX(best) FROM score_stats
+    WHERE difficulty <> '{REVIEW_DIFFICULTY}' GROUP BY 1, 2, 3
+    ON CONFLICT (user_id, deck_id, difficulty) DO UPDATE SET high_score = max(high_score, excluded.high_score)
+    """,
+]
+SELECT_DIFFICULTY_STATS_SQL = """
+    SELECT difficulty, SUM(sum_score), SUM(sum_total)
+    FROM score_stats WHERE user_id = ? AND deck_id = ? GROUP BY difficulty ORDER BY difficulty
+"""
+SELECT_LEADERBOARD_SQL = """
+    SELECT difficulty, high_score FROM leaderboard
+    WHERE user_id = ? AND deck_id = ? ORDER BY high_score DESC
+"""
+# History pages are keyset-paginated newest first along idx_score_log_owner_timestamp.
+SELECT_HISTORY_SQL = """
+    SELECT id, timestamp, score, total, difficulty, category FROM score_log
+    WHERE user_id = ? AND deck_id = ? {before} ORDER BY timestamp DESC, id DESC LIMIT ?
+"""
+HISTORY_BEFORE_SQL = "AND (timestamp, id) < (?, ?)"
+COUNT_SCORES_AT_SQL = """
+    SELECT COUNT(*) FROM score_log
+    WHERE user_id = ? AND deck_id = ? AND timestamp = ? AND score = ? AND total = ? AND difficulty = ?
+"""
+CLEAR_HISTORY_SQL = [
+    "DELETE FROM score_log WHERE user_id = ? AND deck_id = ?",
+    "DELETE FROM score_stats WHERE user_id = ? AND deck_id = ?",
+]
+
+# Line formats written to score_history.txt by earlier versions:
+#   2025-06-17 00:25:04 - Score: 1/1
+#   2025-06-18 13:59:31.127401 | Score: 2/15 | Difficulty: General
+_LEGACY_LINE = re.compile(
+    r"^(\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2})(?:\.\d+)?\s*[-|]\s*Score:\s*(\d+)\s*/\s*(\d+)"
+    r"(?:\s*\|\s*Difficulty:\s*(.*?))?\s*$"
+)
 
 
 def init_score_db():
-    conn = sqlite3.connect("score_history.db")
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS score_log (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            timestamp TEXT NOT NULL,
-            score INTEGER NOT NULL,
-            total INTEGER NOT NULL,
-            difficulty TEXT DEFAULT "General"
+    """Apply any pending schema migrations (a no-op once current)."""
+    migrate(SCORE_DB, SCORE_MIGRATIONS)
+
+
+def log_score(score, total, difficulty="General", category="All"):
+    """
+    Log the score for the current deck to score_log, updating the
+    score_stats aggregates and the leaderboard in the same transaction.
+    """
+    user_id, deck_id = owner()
+    with transaction(SCORE_DB) as conn:
+        conn.execute(
+            INSERT_SCORE_SQL,
+            (user_id, deck_id, datetime.now().strftime(TIMESTAMP_FORMAT), score, total, difficulty, category)
         )
-    ''')
-    conn.commit()
-    conn.close()
-
-
-def log_score(score, total, difficulty="General"):
-    """Log the score to both a text file and SQLite database."""
-    # Log to text file
-    with open(SCORE_FILE, "a") as f:
-        f.write(f"{datetime.now()} | Score: {score}/{total} | Difficulty: {difficulty}\n")
-
-    # Log to SQLite DB
-    conn = sqlite3.connect(SCORE_DB)
-    c = conn.cursor()
-    c.execute("INSERT INTO score_log (timestamp, score, total, difficulty) VALUES (?, ?, ?, ?)",
-              (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), score, total, difficulty))
-    conn.commit()
-    conn.close()
-
-def get_score_history():
-    """Get score history from the text file."""
-    try:
-        with open(SCORE_FILE, "r") as file:
-            return file.readlines()
-    except FileNotFoundError:
-        return []
+        conn.execute(UPSERT_STATS_SQL, (user_id, deck_id, difficulty, category, score, total, score))
+        conn.execute(UPSERT_HIGH_SCORE_SQL, (user_id, deck_id, difficulty, score))
+
+_event_buffer = []
+_event_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_flush_wakeup = threading.Event()
+_flusher = None
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def log_review_event(session_id, card_id, correct, latency=None, answer=""):
+    """
+    Queue one answered card. This only appends to an in-memory buffer;
+    the database write happens on the background flusher.
+    """
+    global _flusher
+    with _event_lock:
+        _event_buffer.append(
+            (SCORE_DB, (*owner(), session_id, card_id, time.time(), int(bool(correct)), latency, answer)))
+        pending = len(_event_buffer)
+        if _flusher is None:
+            _flusher = threading.Thread(target=_flush_loop, name="review-event-flusher", daemon=True)
+            _flusher.start()
+    if pending >= FLUSH_SIZE:
+        _flush_wakeup.set()
+
+
+def flush_review_events():
+    """
+    Write all buffered review events in one transaction. If the write
+    fails the events go back to the front of the buffer for the next try.
+    """
+    with _flush_lock:
+        with _event_lock:
+            if not _event_buffer:
+                return 0
+            batch = _event_buffer[:]
+            _event_buffer.clear()
+        by_path = {}
+        for path, event in batch:
+            by_path.setdefault(path, []).append(event)
+        written = []
+        try:
+            for path, events in by_path.items():
+                with transaction(path) as conn:
+                    conn.executemany(INSERT_EVENT_SQL, events)
+                written.append(path)
+        except Exception:
+            with _event_lock:
+                _event_buffer[:0] = [(path, event) for path, event in batch if path not in written]
+            raise
+        return len(batch)
+
+
+def _flush_loop():
+    while True:
+        _flush_wakeup.wait(FLUSH_INTERVAL)
+        _flush_wakeup.clear()
+        try:
+            flush_review_events()
+        except Exception as e:  # keep the flusher alive; the events are retried next time
+            print(f"⚠️ Could not save review events, will retry: {e}", file=sys.stderr)
+
+
+atexit.register(flush_review_events)
+
+
+def log_session_score(session_id, difficulty="General", category="All"):
+    """
+    Derive a quiz's aggregate score from its review events and log it.
+    Returns (score, total).
+    """
+    flush_review_events()
+    score, total = get_connection(SCORE_DB).execute(SESSION_TOTALS_SQL, (session_id,)).fetchone()
+    log_score(score, total, difficulty, category)
+    return score, total
+
+
+def get_score_history(limit=HISTORY_PAGE_SIZE, before=None):
+    """
+    Return one page of logged scores, newest first, as dicts.
+    Pass the last entry of a page as `before` to get the next page.
+    """
+    if before is None:
+        sql, params = SELECT_HISTORY_SQL.format(before=""), [*owner(), limit]
+    else:
+        sql = SELECT_HISTORY_SQL.format(before=HISTORY_BEFORE_SQL)
+        params = [*owner(), before["timestamp"], before["id"], limit]
+    rows = get_connection(SCORE_DB).execute(sql, params).fetchall()
+    return [_row_to_entry(row) for row in rows]
+
+
+def iter_score_history(chunk_size=1000):
+    """Yield every logged score, newest first, one page at a time."""
+    page = get_score_history(chunk_size)
+    while page:
+        yield from page
+        page = get_score_history(chunk_size, before=page[-1])
+
+
+def _row_to_entry(row):
+    return dict(zip(("id", "timestamp", "score", "total", "difficulty", "category"), row))
+
+
+def format_score(entry):
+    return (f"{entry['timestamp']} | Score: {entry['score']}/{entry['total']} | "
+            f"Difficulty: {entry['difficulty']} | Category: {entry['category']}")
+
 
 def clear_score_history():
-    """Clear the text-based score history log."""
-    open(SCORE_FILE, "w").close()
+    """Delete the current deck's logged scores and aggregates; high scores are kept."""
+    with transaction(SCORE_DB) as conn:
+        for sql in CLEAR_HISTORY_SQL:
+            conn.execute(sql, owner())
+
+
+def tail_lines(path, n=20, block_size=TAIL_BLOCK_SIZE):
+    """
+    Return the last `n` lines of a text file, reading backwards from the
+    end in blocks so the cost does not depend on the file's size.
+    """
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= n:
+            step = min(block_size, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    return lines[-n:] if n else []
+
+
+def parse_legacy_line(line):
+    """Parse one score_history.txt line into (timestamp, score, total, difficulty), or None."""
+    match = _LEGACY_LINE.match(line.strip())
+    if match is None:
+        return None
+    timestamp, score, total, difficulty = match.groups()
+    return timestamp.replace("T", " "), int(score), int(total), difficulty or "General"
+
+
+def ingest_legacy_log(path=SCORE_FILE):
+    """
+    Import a legacy text score log into score_log and rebuild the
+    aggregates. Entries already in score_log (earlier versions wrote each
+    score to both) are skipped, so running this again adds nothing.
+    Returns (parsed, added, unparsed).
+    """
+    entries = Counter()
+    unparsed = 0
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            entry = parse_legacy_line(line)
+            if entry is None:
+                unparsed += 1
+            else:
+                entries[entry] += 1
+
+    added = 0
+    with transaction(SCORE_DB) as conn:
+        for (timestamp, score, total, difficulty), count in entries.items():
+            existing = conn.execute(COUNT_SCORES_AT_SQL, (*owner(), timestamp, score, total, difficulty)).fetchone()[0]
+            missing = count - existing
+            if missing > 0:
+                conn.executemany(INSERT_SCORE_SQL, [(*owner(), timestamp, score, total, difficulty, "All")] * missing)
+                added += missing
+        if added:
+            for sql in REBUILD_STATS_SQL:
+                conn.execute(sql)
+    return sum(entries.values()), added, unparsed
+
 
 def init_leaderboard_db():
-    with sqlite3.connect("score_history.db") as conn:
-        c = conn.cursor()
-        c.execute("""
-            CREATE TABLE IF NOT EXISTS leaderboard (
-                difficulty TEXT PRIMARY KEY,
-                high_score INTEGER
-            )
-        """)
-        conn.commit()
+    """The leaderboard is part of the score schema (see migrations.py)."""
+    init_score_db()
 
 
 def update_leaderboard(score, difficulty):
-    with sqlite3.connect("score_history.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT high_score FROM leaderboard WHERE difficulty = ?", (difficulty,))
-        row = c.fetchone()
-        if not row or score > row[0]:
-            c.execute("REPLACE INTO leaderboard (difficulty, high_score) VALUES (?, ?)", (difficulty, score))
-            conn.commit()
+    get_connection(SCORE_DB).execute(UPSERT_HIGH_SCORE_SQL, (*owner(), difficulty, score))
 
 
 def get_leaderboard():
-    with sqlite3.connect("score_history.db") as conn:
-        c = conn.cursor()
-        c.execute("SELECT difficulty, high_score FROM leaderboard ORDER BY high_score DESC")
-        return c.fetchall()
+    """High score per difficulty for the current deck; see profiles.class_leaderboard for everyone's."""
+    return get_connection(SCORE_DB).execute(SELECT_LEADERBOARD_SQL, owner()).fetchall()
+
+
+def get_difficulty_stats():
+    """Return [(difficulty, total_correct, total_questions)] from the aggregates."""
+    return get_connection(SCORE_DB).execute(SELECT_DIFFICULTY_STATS_SQL, owner()).fetchall()
+
+
+def rebuild_score_stats():
+    """Recompute score_stats (and raise leaderboard highs) from score_log."""
+    with transaction(SCORE_DB) as conn:
+        for sql in REBUILD_STATS_SQL:
+            conn.execute(sql)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score log maintenance.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild-stats", help="recompute aggregates from score_log")
+    history = commands.add_parser("history", help="print logged scores, newest first")
+    history.add_argument("-n", "--limit", type=int, default=HISTORY_PAGE_SIZE)
+    tail = commands.add_parser("tail", help="print the last lines of a legacy text log")
+    tail.add_argument("path", nargs="?", default=SCORE_FILE)
+    tail.add_argument("-n", "--lines", type=int, default=20)
+    ingest = commands.add_parser("ingest-legacy", help="import a legacy text log into score_log")
+    ingest.add_argument("path", nargs="?", default=SCORE_FILE)
+    args = parser.parse_args(argv)
+
+    if args.command == "tail":
+        for line in tail_lines(args.path, args.lines):
+            print(line)
+        return
+    init_score_db()
+    if args.command == "rebuild-stats":
+        rebuild_score_stats()
+        for difficulty, correct, total in get_difficulty_stats():
+            print(f"{difficulty}: {correct}/{total}")
+    elif args.command == "history":
+        for entry in get_score_history(args.limit):
+            print(format_score(entry))
+    elif args.command == "ingest-legacy":
+        parsed, added, unparsed = ingest_legacy_log(args.path)
+        print(f"✅ Parsed {parsed} entries from {args.path}: {added} added, "
+              f"{parsed - added} already logged, {unparsed} unrecognized lines")
+
+
+# Call counts and latencies when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("new_session_id", "format_score", "parse_legacy_line"))
+
+if __name__ == "__main__":
+    main()
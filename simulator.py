@@ -0,0 +1,198 @@
+"""
+Load-test simulator: synthetic learners taking quizzes through QuizSession.
+
+Learners are spread over a process pool. Every worker opens its own
+connections to the same pair of databases, so SQLite sees concurrent
+writers just like several app instances would. Answer latency runs on a
+virtual clock, so no learner ever sleeps and the numbers measure
+selection, grading, scheduling and logging only.
+
+The simulation never touches the real databases: it runs against a
+synthetic deck in a temporary directory, or against a copy of --deck.
+
+Usage:
+    python main.py simulate [--learners 2000] [--workers 4] [--cards 20] [--deck-size 5000]
+    python main.py simulate --deck flashcards.db --no-db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import string
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import database
+import flashcard_db
+import profiles
+import score_logger
+from database import get_connection, transaction
+from dedup import content_hash
+from quiz_engine import QuizSession, QuizRecorder, TIME_LIMIT
+
+BATCH_LEARNERS = 50     # learners per pool task
+MEAN_LATENCY = 8.0      # seconds per answer
+TYPO_RATE = 0.1         # share of right answers typed with one typo
+WRITE_TABLES = {
+    "flashcards": ["review_history"],
+    "scores": ["review_events", "score_log"],
+}
+
+_deck = []
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def build_deck(path, size, seed=0):
+    """Create a synthetic deck of numeric and word answers at `path`."""
+    rng = random.Random(seed)
+    flashcard_db.DB_NAME = path
+    flashcard_db.init_db()
+    rows = []
+    for i in range(size):
+        if i % 2:
+            a, b = rng.randint(1, 999), rng.randint(1, 999)
+            question, answer = f"What is {a} + {b}?", str(a + b)
+        else:
+            answer = " ".join("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9)))
+                              for _ in range(rng.randint(1, 3)))
+            question = f"Term #{i}?"
+        rows.append((*profiles.owner(), question, answer, f"Category {i % 10}", i % len(flashcard_db.DIFFICULTIES),
+                     content_hash(question, answer)))
+    with transaction(path) as conn:
+        conn.executemany(flashcard_db.INSERT_SQL, rows)
+
+
+def copy_deck(source, path):
+    """Copy an existing flashcards database with the SQLite backup API."""
+    src, dst = sqlite3.connect(source), sqlite3.connect(path)
+    try:
+        src.backup(dst)
+    finally:
+        dst.close()
+        src.close()
+    flashcard_db.DB_NAME = path
+    flashcard_db.init_db()
+
+
+def _typo(rng, text):
+    i = rng.randrange(len(text))
+    return text[:i] + rng.choice(string.ascii_lowercase) + text[i + 1:]
+
+
+def simulate_learner(rng, deck, cards, recorder=None, time_limit=TIME_LIMIT):
+    """Run one synthetic quiz; returns the finished QuizSession."""
+    skill = rng.betavariate(4, 2)
+    clock = VirtualClock()
+    session = QuizSession(rng.sample(deck, min(cards, len(deck))), recorder=recorder,
+                          time_limit=time_limit, clock=clock)
+    card = session.next_card()
+    while card is not None:
+        clock.advance(rng.expovariate(1 / MEAN_LATENCY))
+        level = flashcard_db.DIFFICULTIES.index(card["difficulty"])
+        if rng.random() < skill * (1 - 0.15 * level):
+            given = card["answer"]
+            if rng.random() < TYPO_RATE:
+                given = _typo(rng, given)
+        else:
+            given = rng.choice(deck)["answer"]
+        session.answer(given)
+        card = session.next_card()
+    session.finish()
+    return session
+
+
+def _init_worker(flashcards_path, score_path):
+    global _deck
+    flashcard_db.DB_NAME = flashcards_path
+    score_logger.SCORE_DB = score_path
+    _deck = flashcard_db.query_flashcards()
+
+
+def run_batch(seed, learners, cards, record):
+    """Pool task: simulate `learners` quizzes; returns (sessions, answers, correct)."""
+    rng = random.Random(seed)
+    answers = correct = 0
+    for _ in range(learners):
+        session = simulate_learner(rng, _deck, cards, QuizRecorder() if record else None)
+        answers += session.total
+        correct += session.correct
+    return learners, answers, correct
+
+
+def count_rows(paths):
+    return sum(
+        get_connection(paths[db]).execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for db, tables in WRITE_TABLES.items() for table in tables
+    )
+
+
+def simulate(paths, learners, workers, cards, record=True, seed=0):
+    """Run the simulation against `paths` and return a stats dict."""
+    rows_before = count_rows(paths)
+    database.close_all()  # worker processes open their own connections
+
+    batches = [min(BATCH_LEARNERS, learners - start) for start in range(0, learners, BATCH_LEARNERS)]
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(paths["flashcards"], paths["scores"])) as pool:
+        results = list(pool.map(run_batch, [seed + i for i in range(len(batches))], batches,
+                                [cards] * len(batches), [record] * len(batches)))
+    elapsed = time.perf_counter() - start
+
+    sessions, answers, correct = (sum(column) for column in zip(*results))
+    rows = count_rows(paths) - rows_before
+    return {
+        "sessions": sessions,
+        "answers": answers,
+        "accuracy": correct / answers if answers else 0.0,
+        "seconds": elapsed,
+        "sessions_per_sec": sessions / elapsed,
+        "answers_per_sec": answers / elapsed,
+        "rows_written": rows,
+        "rows_per_sec": rows / elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py simulate", description="Simulate learners to load-test quizzes.")
+    parser.add_argument("--learners", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--cards", type=int, default=20, help="cards per quiz session")
+    parser.add_argument("--deck-size", type=int, default=5000, help="size of the synthetic deck")
+    parser.add_argument("--deck", help="simulate on a copy of this flashcards database instead")
+    parser.add_argument("--no-db", action="store_true", help="grade and score in memory only")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = {"flashcards": os.path.join(tmp, "flashcards.db"), "scores": os.path.join(tmp, "scores.db")}
+        if args.deck:
+            copy_deck(args.deck, paths["flashcards"])
+        else:
+            build_deck(paths["flashcards"], args.deck_size, args.seed)
+        score_logger.SCORE_DB = paths["scores"]
+        score_logger.init_score_db()
+
+        stats = simulate(paths, args.learners, args.workers, args.cards, not args.no_db, args.seed)
+        database.close_all()
+
+    print(f"🧪 {stats['sessions']:,} sessions, {stats['answers']:,} answers "
+          f"on {args.workers} workers in {stats['seconds']:.2f}s (accuracy {stats['accuracy']:.1%})")
+    print(f"   sessions/sec: {stats['sessions_per_sec']:>12,.0f}")
+    print(f"   answers/sec:  {stats['answers_per_sec']:>12,.0f}")
+    print(f"   DB rows/sec:  {stats['rows_per_sec']:>12,.0f}  ({stats['rows_written']:,} rows written)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+"""
+Vectorized analytics over score and review history (requires NumPy).
+
+History tables are read in fixed-size columnar chunks (CHUNK_ROWS rows
+at a time, converted straight to NumPy arrays) and folded into small
+running accumulators:
+
+  - accuracy per calendar day from score_log, for trends and moving averages
+  - recall rate by days since the previous review, per category, from
+    review_history (the SM-2 log), for retention curves
+  - a log-spaced histogram of answer latencies from review_events, for
+    percentile response times
+
+Memory therefore stays bounded by the chunk size and the accumulator
+sizes, however many rows there are. There is one set of accumulators per
+(user, deck) (see profiles.py), each reading only that owner's rows
+through the owner indexes. Each accumulator remembers the
+high-water mark (lowest and highest row id) it has seen: when the table
+is unchanged the cached result is returned, when rows were appended only
+the new ids are read, and when rows were cleared it starts over.
+
+Usage:
+    python main.py stats
+"""
+import threading
+from itertools import chain
+
+import numpy as np
+
+import flashcard_db
+import score_logger
+from database import get_connection
+from profiles import owner
+
+CHUNK_ROWS = 100000
+DAY = 24 * 60 * 60
+MOVING_AVERAGE_DAYS = 7
+PERCENTILES = (50, 90, 99)
+# Retention is bucketed by days since the card's previous review.
+RETENTION_BINS = np.array([0, 1, 2, 4, 7, 14, 30, 60, 120, 365], dtype=np.float64)
+# Latency histogram: log-spaced from 50 ms to an hour, ~1% bin width.
+LATENCY_EDGES = np.geomspace(0.05, 3600, 1121)
+
+HIGH_WATER_SQL = "SELECT COALESCE(MIN(id), 0), COALESCE(MAX(id), 0) FROM {table} WHERE user_id = ? AND deck_id = ?"
+# Row queries select only numeric columns and map NULL to -1, so each
+# fetched chunk converts to an array without a per-row Python loop.
+SCORE_ROWS_SQL = """
+    SELECT CAST(strftime('%s', timestamp) AS INTEGER), score, total
+    FROM score_log WHERE user_id = ? AND deck_id = ? AND id > ? AND strftime('%s', timestamp) IS NOT NULL
+    ORDER BY id
+"""
+REVIEW_ROWS_SQL = """
+    SELECT h.card_id, IFNULL(h.reviewed_at - (
+               SELECT MAX(p.reviewed_at) FROM review_history p
+               WHERE p.card_id = h.card_id AND p.reviewed_at < h.reviewed_at
+           ), -1), h.quality >= 3
+    FROM review_history h WHERE h.user_id = ? AND h.deck_id = ? AND h.id > ? ORDER BY h.id
+"""
+CARD_CATEGORIES_SQL = "SELECT id, category FROM flashcards WHERE user_id = ? AND deck_id = ? AND id IN ({marks})"
+CATEGORY_BATCH = 500  # card ids per lookup, under SQLite's bound-parameter limit
+LATENCY_ROWS_SQL = """
+    SELECT IFNULL(latency, -1), correct FROM review_events
+    WHERE user_id = ? AND deck_id = ? AND id > ? ORDER BY id
+"""
+
+
+def _chunks(path, sql, params, chunk_rows=CHUNK_ROWS):
+    """Yield float64 arrays of shape (rows, columns), chunk_rows rows at a time."""
+    cursor = get_connection(path).execute(sql, params)
+    width = len(cursor.description)
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            yield np.fromiter(chain.from_iterable(rows), np.float64, len(rows) * width).reshape(-1, width)
+    finally:
+        cursor.close()
+
+
+class _Accumulator:
+    """Running totals over one owner's rows of a history table, advanced by its high-water mark."""
+    table = None
+    sql = None
+
+    def __init__(self, owner):
+        self.owner = owner
+        self.high_water = (0, 0)
+        self.reset()
+
+    def path(self):
+        raise NotImplementedError
+
+    def reset(self):
+        raise NotImplementedError
+
+    def add(self, chunk):
+        raise NotImplementedError
+
+    def refresh(self):
+        """Fold in rows appended since the last call; returns True if anything changed."""
+        path = self.path()
+        low, high = get_connection(path).execute(HIGH_WATER_SQL.format(table=self.table), self.owner).fetchone()
+        if (low, high) == self.high_water:
+            return False
+        last_id = self.high_water[1]
+        if low != self.high_water[0] or high < last_id:
+            self.reset()  # rows were removed: start over
+            last_id = 0
+        for chunk in _chunks(path, self.sql, (*self.owner, last_id)):
+            self.add(chunk)
+        self.high_water = (low, high)
+        return True
+
+
+class _DailyAccuracy(_Accumulator):
+    table = "score_log"
+    sql = SCORE_ROWS_SQL
+
+    def path(self):
+        return score_logger.SCORE_DB
+
+    def reset(self):
+        self.first_day = None
+        self.score = np.zeros(0)
+        self.total = np.zeros(0)
+        self.quizzes = np.zeros(0)
+
+    def add(self, chunk):
+        days = (chunk[:, 0] // DAY).astype(np.int64)
+        lo, hi = int(days.min()), int(days.max())
+        if self.first_day is None:
+            self.first_day = lo
+        first = min(self.first_day, lo)
+        front = self.first_day - first
+        back = max(self.first_day + len(self.score), hi + 1) - first - front - len(self.score)
+        if front or back:
+            self.score = np.pad(self.score, (front, back))
+            self.total = np.pad(self.total, (front, back))
+            self.quizzes = np.pad(self.quizzes, (front, back))
+            self.first_day = first
+        index = days - self.first_day
+        size = len(self.score)
+        self.score += np.bincount(index, weights=chunk[:, 1], minlength=size)
+        self.total += np.bincount(index, weights=chunk[:, 2], minlength=size)
+        self.quizzes += np.bincount(index, minlength=size)
+
+
+class _Retention(_Accumulator):
+    table = "review_history"
+    sql = REVIEW_ROWS_SQL
+
+    def path(self):
+        return flashcard_db.DB_NAME
+
+    def reset(self):
+        self.categories = []
+        self.recalled = np.zeros((0, len(RETENTION_BINS)))
+        self.reviews = np.zeros((0, len(RETENTION_BINS)))
+
+    def _category_codes(self, card_ids):
+        """Row in the accumulators of each card id (-1 for cards no longer in the deck)."""
+        unique, inverse = np.unique(card_ids, return_inverse=True)
+        ids = unique.tolist()
+        conn = get_connection(self.path())
+        found = {}
+        for start in range(0, len(ids), CATEGORY_BATCH):
+            batch = ids[start:start + CATEGORY_BATCH]
+            sql = CARD_CATEGORIES_SQL.format(marks=", ".join("?" * len(batch)))
+            found.update(conn.execute(sql, (*self.owner, *batch)))
+        rows = {name: i for i, name in enumerate(self.categories)}
+        for category in found.values():
+            if category not in rows:
+                rows[category] = len(self.categories)
+                self.categories.append(category)
+        grow = len(self.categories) - len(self.recalled)
+        if grow:
+            self.recalled = np.pad(self.recalled, ((0, grow), (0, 0)))
+            self.reviews = np.pad(self.reviews, ((0, grow), (0, 0)))
+        codes = np.fromiter((rows[found[i]] if i in found else -1 for i in ids), np.int64, len(ids))
+        return codes[inverse]
+
+    def add(self, chunk):
+        elapsed_days = chunk[:, 1] / DAY
+        keep = elapsed_days >= 0  # first reviews have no gap
+        categories = np.full(len(chunk), -1, dtype=np.int64)
+        categories[keep] = self._category_codes(chunk[keep, 0].astype(np.int64))
+        keep &= categories >= 0
+        bins = np.digitize(elapsed_days[keep], RETENTION_BINS) - 1
+        flat = categories[keep] * len(RETENTION_BINS) + bins
+        size = self.reviews.size
+        self.reviews += np.bincount(flat, minlength=size).reshape(self.reviews.shape)
+        self.recalled += np.bincount(flat, weights=chunk[keep, 2], minlength=size).reshape(self.reviews.shape)
+
+
+class _Latency(_Accumulator):
+    table = "review_events"
+    sql = LATENCY_ROWS_SQL
+
+    def path(self):
+        return score_logger.SCORE_DB
+
+    def reset(self):
+        # Row 0: wrong answers, row 1: right answers; one extra bin at each end.
+        self.counts = np.zeros((2, len(LATENCY_EDGES) + 1))
+
+    def add(self, chunk):
+        timed = chunk[:, 0] >= 0
+        bins = np.searchsorted(LATENCY_EDGES, chunk[timed, 0])
+        flat = chunk[timed, 1].astype(np.int64) * self.counts.shape[1] + bins
+        self.counts += np.bincount(flat, minlength=self.counts.size).reshape(self.counts.shape)
+
+
+_KINDS = {"daily": _DailyAccuracy, "retention": _Retention, "latency": _Latency}
+_lock = threading.Lock()
+_accumulators = {}
+_results = {}
+
+
+def _cached(name, key, compute):
+    """
+    Refresh the named accumulator of the current owner and databases, and
+    memoize `compute` until its table changes.
+    """
+    with _lock:
+        scope = (name, flashcard_db.DB_NAME, score_logger.SCORE_DB, owner())
+        if scope not in _accumulators:
+            _accumulators[scope] = _KINDS[name](scope[-1])
+        accumulator = _accumulators[scope]
+        if accumulator.refresh():
+            for stale in [k for k in _results if k[0] == scope]:
+                del _results[stale]
+        if (scope, key) not in _results:
+            _results[(scope, key)] = compute(accumulator)
+        return _results[(scope, key)]
+
+
+def _rolling_sum(values, window):
+    cumulative = np.concatenate(([0.0], np.cumsum(values)))
+    end = np.arange(1, len(values) + 1)
+    return cumulative[end] - cumulative[np.maximum(end - window, 0)]
+
+
+def accuracy_trend(window=MOVING_AVERAGE_DAYS):
+    """
+    Daily accuracy from score_log. Returns a dict of equal-length arrays:
+    days (datetime64[D]), quizzes, accuracy (NaN on days without quizzes)
+    and moving_average (question-weighted over the last `window` days).
+    """
+    def compute(acc):
+        days = np.datetime64("1970-01-01", "D") + (acc.first_day or 0) + np.arange(len(acc.total))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            accuracy = np.where(acc.total > 0, acc.score / acc.total, np.nan)
+            moving = _rolling_sum(acc.score, window) / _rolling_sum(acc.total, window)
+        return {"days": days, "quizzes": acc.quizzes.astype(np.int64),
+                "accuracy": accuracy, "moving_average": moving}
+    return _cached("daily", window, compute)
+
+
+def retention_curves():
+    """
+    Recall rate by days since the previous review, per category. Returns
+    {"bins": lower bin edges in days, "curves": {category: (rate, reviews)}};
+    rate is NaN where a bin has no reviews.
+    """
+    def compute(acc):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            rates = acc.recalled / acc.reviews
+        curves = {
+            category: (rates[i], acc.reviews[i].astype(np.int64))
+            for i, category in enumerate(acc.categories) if acc.reviews[i].any()
+        }
+        return {"bins": RETENTION_BINS, "curves": curves}
+    return _cached("retention", None, compute)
+
+
+def _percentiles(counts, percentiles):
+    total = counts.sum()
+    if not total:
+        return {p: float("nan") for p in percentiles}
+    cumulative = np.cumsum(counts)
+    bins = np.searchsorted(cumulative, np.asarray(percentiles, dtype=np.float64) / 100 * total)
+    # Report the geometric middle of the bin (its edges for the open end bins).
+    lower = LATENCY_EDGES[np.clip(bins - 1, 0, len(LATENCY_EDGES) - 1)]
+    upper = LATENCY_EDGES[np.clip(bins, 0, len(LATENCY_EDGES) - 1)]
+    return dict(zip(percentiles, np.sqrt(lower * upper).tolist()))
+
+
+def latency_percentiles(percentiles=PERCENTILES):
+    """Response-time percentiles in seconds: {"all"|"correct"|"wrong": {p: seconds}}."""
+    def compute(acc):
+        return {
+            "all": _percentiles(acc.counts.sum(axis=0), percentiles),
+            "correct": _percentiles(acc.counts[1], percentiles),
+            "wrong": _percentiles(acc.counts[0], percentiles),
+            "answers": int(acc.counts.sum()),
+        }
+    return _cached("latency", tuple(percentiles), compute)
+
+
+def reset():
+    """Drop all cached accumulators (e.g. after switching databases)."""
+    with _lock:
+        _accumulators.clear()
+        _results.clear()
@@ -0,0 +1,424 @@
+"""
+Incremental sync of decks and score histories between devices.
+
+Triggers (see migrations.py) append every insert, edit and delete on
+flashcards, score_log and leaderboard to a sync_log table in the same
+database, with the changed fields and a timestamp. A sync exchanges
+gzip-compressed batches of BATCH_SIZE changes with a server (see
+sync_server.py): each request carries this device's log entries the
+server has not acknowledged yet, and each reply the other devices'
+changes that this device's sync vector ({device: last seq applied})
+does not cover, until both sides are caught up. Only changes travel,
+never whole tables.
+
+Rows are known across devices by (device that created them, their id
+there); sync_ids maps other devices' rows to local ids, and users and
+decks travel by name. Every device resolves conflicts the same way, so
+they all end up with the same data whatever order they sync in:
+
+  - each field keeps the value with the latest (timestamp, device)
+    stamp: last writer wins per field, so edits of different fields of
+    the same card both survive
+  - deletes win over edits
+  - a card whose content is already in the deck is merged with that card
+  - high scores keep the maximum, as they do locally
+
+Stamps come from each device's clock; a device whose clock is far off
+wins (or loses) edits it should not. Attachments, the review schedule
+and review events are not synced.
+
+A database restored from a backup (or copied to a second machine) is
+behind what the server has acknowledged for its device id, and its new
+changes reuse seqs the server already holds. When a reply shows that
+(the server refused the push as "diverged", or acknowledged seqs this
+database never wrote), the database carries on as a new device: rows
+the server already had keep their old ids, the rest of its log is sent
+again under the new one, and the changes it lost come back from the
+server like any other device's.
+
+Usage:
+    python main.py sync serve [--port 8766]                # reference server
+    python main.py sync run http://127.0.0.1:8766 [--space alice]
+    python main.py sync status
+"""
+import argparse
+import gzip
+import json
+import re
+import secrets
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+
+import flashcard_db
+import perf
+import profiles
+import score_logger
+from database import get_connection, transaction
+from dedup import content_hash
+
+BATCH_SIZE = 2000   # changes per request, each way
+TIMEOUT = 60
+DEFAULT_SPACE = "default"
+SPACE_NAME = re.compile(r"[\w-]+")
+
+# Synced columns of each table, besides user_id and deck_id (which travel
+# as the user and deck names under "owner").
+TABLES = {
+    "flashcards": ("question", "answer", "category", "difficulty"),
+    "score_log": ("timestamp", "score", "total", "difficulty", "category"),
+    "leaderboard": ("difficulty", "high_score"),
+}
+# Each database syncs as its own stream: {name: path}.
+DATABASES = {
+    "flashcards": lambda: flashcard_db.DB_NAME,
+    "scores": lambda: score_logger.SCORE_DB,
+}
+NO_STAMP = (0.0, "")
+
+SELECT_STATE_SQL = "SELECT value FROM sync_state WHERE key = ?"
+SET_STATE_SQL = """
+    INSERT INTO sync_state (key, value) VALUES (?, ?)
+    ON CONFLICT (key) DO UPDATE SET value = excluded.value
+"""
+CLEAR_STATE_SQL = "DELETE FROM sync_state WHERE key = ?"
+# This device's own changes after a seq, with the ids other devices gave
+# the rows they created (lowest device first when a row has several).
+SELECT_OUTGOING_SQL = """
+    SELECT l.seq, l.tbl, l.row_id, l.op, l.data, l.stamp, i.origin, i.origin_id
+    FROM sync_log l LEFT JOIN sync_ids i ON i.tbl = l.tbl AND i.row_id = l.row_id
+    WHERE l.seq > ? AND l.origin IS NULL
+    ORDER BY l.seq, i.origin LIMIT ?
+"""
+COUNT_PENDING_SQL = "SELECT COUNT(*) FROM sync_log WHERE seq > ? AND origin IS NULL"
+LAST_SEQ_SQL = "SELECT COALESCE(MAX(seq), 0) FROM sync_log"
+# Rows this device created that the server had acknowledged, known to the
+# other devices by (this device's old id, row id).
+KEEP_OLD_IDS_SQL = """
+    INSERT OR IGNORE INTO sync_ids (tbl, origin, origin_id, row_id)
+    SELECT DISTINCT tbl, ?, row_id, row_id FROM sync_log
+    WHERE tbl = ? AND op = 'upsert' AND origin IS NULL AND seq <= ?
+      AND row_id NOT IN (SELECT row_id FROM sync_ids WHERE tbl = ?)
+"""
+SELECT_LOCAL_ID_SQL = "SELECT row_id FROM sync_ids WHERE tbl = ? AND origin = ? AND origin_id = ?"
+INSERT_ID_SQL = "INSERT OR IGNORE INTO sync_ids (tbl, origin, origin_id, row_id) VALUES (?, ?, ?, ?)"
+SELECT_ROW_LOG_SQL = "SELECT data, stamp, COALESCE(origin, ?) FROM sync_log WHERE tbl = ? AND row_id = ?"
+INSERT_LOG_SQL = "INSERT INTO sync_log (tbl, row_id, op, data, stamp, origin) VALUES (?, ?, ?, ?, ?, ?)"
+SELECT_CARD_SQL = "SELECT question, answer, category, difficulty FROM flashcards WHERE id = ?"
+SELECT_CARD_BY_HASH_SQL = "SELECT id FROM flashcards WHERE user_id = ? AND deck_id = ? AND content_hash = ?"
+# OR IGNORE: an edit that would make the card a duplicate of another is dropped.
+UPDATE_CARD_SQL = """
+    UPDATE OR IGNORE flashcards SET question = ?, answer = ?, category = ?, difficulty = ?, content_hash = ?
+    WHERE id = ?
+"""
+DELETE_SQL = {
+    "flashcards": "DELETE FROM flashcards WHERE id = ?",
+    "score_log": "DELETE FROM score_log WHERE id = ?",
+}
+
+
+def _state(conn, key, default=None):
+    row = conn.execute(SELECT_STATE_SQL, (key,)).fetchone()
+    return row[0] if row else default
+
+
+def outgoing_changes(conn, device, after, limit, owners):
+    """Up to `limit` of this device's log entries after seq `after`, as sent to the server."""
+    changes = []
+    for seq, table, row_id, op, data, stamp, origin, origin_id in conn.execute(SELECT_OUTGOING_SQL, (after, limit)):
+        if changes and changes[-1]["seq"] == seq:
+            continue  # a second id of a merged row
+        data = json.loads(data)
+        user_id, deck_id = data.pop("user_id", None), data.pop("deck_id", None)
+        if user_id is not None:
+            data["owner"] = owners.get((user_id, deck_id), (profiles.DEFAULT_USER, profiles.DEFAULT_DECK))
+        key = [*data["owner"], data["difficulty"]] if table == "leaderboard" else [origin or device, origin_id or row_id]
+        changes.append({"device": device, "seq": seq, "table": table, "key": key, "op": op,
+                        "data": data, "stamp": stamp})
+    return changes
+
+
+class ChangeApplier:
+    """Applies other devices' changes to one database, inside the caller's transaction."""
+
+    def __init__(self, conn, device):
+        self.conn = conn
+        self.device = device
+        self.counts = Counter()
+        self.rebuild_stats = False  # scores were deleted: score_stats must be recomputed
+        self._owners = {}
+
+    def apply(self, change):
+        if change["table"] == "leaderboard":
+            self._high_score(change)
+        elif change["op"] == "delete":
+            self._delete(change)
+        else:
+            self._upsert(change)
+
+    def _owner(self, names):
+        names = tuple(names)
+        if names not in self._owners:
+            self._owners[names] = profiles.owner_ids(*names)
+        return self._owners[names]
+
+    def _local_id(self, table, key):
+        origin, origin_id = key
+        if origin == self.device:
+            return origin_id
+        row = self.conn.execute(SELECT_LOCAL_ID_SQL, (table, origin, origin_id)).fetchone()
+        return row and row[0]
+
+    def _log(self, table, row_id, op, data, change):
+        self.conn.execute(INSERT_LOG_SQL, (table, row_id, op, json.dumps(data), change["stamp"], change["device"]))
+
+    def _high_score(self, change):
+        data = change["data"]
+        self.conn.execute(score_logger.UPSERT_HIGH_SCORE_SQL,
+                          (*self._owner(data["owner"]), data["difficulty"], data["high_score"]))
+        self.counts["applied"] += 1
+
+    def _delete(self, change):
+        table = change["table"]
+        row_id = self._local_id(table, change["key"])
+        if row_id is not None and self.conn.execute(DELETE_SQL[table], (row_id,)).rowcount:
+            self._log(table, row_id, "delete", {}, change)
+            self.counts["applied"] += 1
+            self.rebuild_stats |= table == "score_log"
+
+    def _upsert(self, change):
+        table = change["table"]
+        row_id = self._local_id(table, change["key"])
+        if row_id is None:
+            row_id, inserted = self._insert(table, change["data"])
+            if row_id is None:
+                self.counts["skipped"] += 1  # an edit of a row this device never had
+                return
+            self.conn.execute(INSERT_ID_SQL, (table, *change["key"], row_id))
+            if inserted:
+                self._log(table, row_id, "upsert", {f: change["data"][f] for f in TABLES[table]}, change)
+                self.counts["applied"] += 1
+                return
+            self.counts["merged"] += 1
+        if table == "flashcards":
+            self._update_card(row_id, change)
+
+    def _insert(self, table, data):
+        """Insert a row from another device: (local id, True), (id of the card it duplicates, False) or (None, False)."""
+        if "owner" not in data or any(field not in data for field in TABLES[table]):
+            return None, False
+        user_id, deck_id = self._owner(data["owner"])
+        if table == "score_log":
+            cursor = self.conn.execute(score_logger.INSERT_SCORE_SQL,
+                                       (user_id, deck_id, *(data[field] for field in TABLES[table])))
+            # Keep the aggregates and the leaderboard in step, as log_score does.
+            self.conn.execute(score_logger.UPSERT_STATS_SQL, (user_id, deck_id, data["difficulty"], data["category"],
+                                                              data["score"], data["total"], data["score"]))
+            self.conn.execute(score_logger.UPSERT_HIGH_SCORE_SQL, (user_id, deck_id, data["difficulty"], data["score"]))
+            return cursor.lastrowid, True
+        digest = content_hash(data["question"], data["answer"])
+        cursor = self.conn.execute(flashcard_db.INSERT_SQL, (user_id, deck_id, *(data[field] for field in TABLES[table]),
+                                                             digest))
+        if cursor.rowcount:
+            return cursor.lastrowid, True
+        return self.conn.execute(SELECT_CARD_BY_HASH_SQL, (user_id, deck_id, digest)).fetchone()[0], False
+
+    def _field_stamps(self, table, row_id):
+        """{field: (stamp, device)} of the latest change of each field of a row."""
+        stamps = {}
+        for data, stamp, device in self.conn.execute(SELECT_ROW_LOG_SQL, (self.device, table, row_id)):
+            for field in json.loads(data):
+                stamps[field] = max(stamps.get(field, NO_STAMP), (stamp, device))
+        return stamps
+
+    def _update_card(self, row_id, change):
+        row = self.conn.execute(SELECT_CARD_SQL, (row_id,)).fetchone()
+        if row is None:
+            self.counts["skipped"] += 1  # deleted here, and deletes win
+            return
+        fields = TABLES["flashcards"]
+        stamps = self._field_stamps("flashcards", row_id)
+        stamp = (change["stamp"], change["device"])
+        changed = [field for field in fields if field in change["data"]]
+        won = {field: change["data"][field] for field in changed if stamp > stamps.get(field, NO_STAMP)}
+        self.counts["lost"] += len(changed) - len(won)
+        if not won:
+            return
+        card = dict(zip(fields, row), **won)
+        cursor = self.conn.execute(UPDATE_CARD_SQL, (*card.values(), content_hash(card["question"], card["answer"]),
+                                                     row_id))
+        if cursor.rowcount:
+            self._log("flashcards", row_id, "upsert", won, change)
+            self.counts["applied"] += 1
+        else:
+            self.counts["skipped"] += 1
+
+
+def _post(url, payload):
+    """POST gzip-compressed JSON; returns (reply, bytes sent, bytes received)."""
+    body = gzip.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+    request = urllib.request.Request(url, data=body, method="POST", headers={
+        "Content-Type": "application/json", "Content-Encoding": "gzip", "Accept-Encoding": "gzip"})
+    with urllib.request.urlopen(request, timeout=TIMEOUT) as response:
+        data = response.read()
+        received = len(data)
+        if response.headers.get("Content-Encoding") == "gzip":
+            data = gzip.decompress(data)
+    return json.loads(data), len(body), received
+
+
+def apply_changes(path, device, changes):
+    """Apply a batch of other devices' changes in one transaction; returns the applier's counters."""
+    if not changes:
+        return Counter()
+    with transaction(path) as conn:
+        conn.execute(SET_STATE_SQL, ("applying", "1"))  # silences the sync_log triggers
+        applier = ChangeApplier(conn, device)
+        vector = json.loads(_state(conn, "vector", "{}"))
+        for change in changes:
+            applier.apply(change)
+            vector[change["device"]] = max(vector.get(change["device"], 0), change["seq"])
+        if applier.rebuild_stats:
+            for sql in score_logger.REBUILD_STATS_SQL:
+                conn.execute(sql)
+        conn.execute(CLEAR_STATE_SQL, ("applying",))
+        conn.execute(SET_STATE_SQL, ("vector", json.dumps(vector)))
+    return applier.counts
+
+
+def new_device(path, old, pushed):
+    """
+    Give a database that is behind the server's record of its device a
+    new device id (see the module docstring); returns the new id.
+    """
+    device = secrets.token_hex(8)
+    with transaction(path) as conn:
+        for table in ("flashcards", "score_log"):
+            conn.execute(KEEP_OLD_IDS_SQL, (old, table, pushed, table))
+        vector = json.loads(_state(conn, "vector", "{}"))
+        vector[old] = pushed  # the old device's later changes are the ones lost here
+        conn.execute(SET_STATE_SQL, ("vector", json.dumps(vector)))
+        conn.execute(SET_STATE_SQL, ("device", device))
+        conn.execute(SET_STATE_SQL, ("pushed", "0"))
+    return device
+
+
+def sync_database(url, stream, path, batch_size=BATCH_SIZE):
+    """
+    Exchange one database's changes with the server at `url` until both
+    are caught up; returns counters (sent, received, applied, merged,
+    lost, skipped, new_device, bytes_sent, bytes_received, seconds).
+    """
+    start = time.perf_counter()
+    conn = get_connection(path)
+    device = _state(conn, "device")
+    owners = profiles.owner_names()
+    counts = Counter()
+    while True:
+        pushed = int(_state(conn, "pushed", 0))
+        outgoing = outgoing_changes(conn, device, pushed, batch_size, owners)
+        vector = json.loads(_state(conn, "vector", "{}"))
+        reply, sent, received = _post(f"{url.rstrip('/')}/sync/{stream}", {
+            "device": device, "vector": vector, "limit": batch_size, "changes": outgoing})
+        counts.update(bytes_sent=sent, bytes_received=received)
+        if reply.get("diverged") or reply["acked"] > conn.execute(LAST_SEQ_SQL).fetchone()[0]:
+            # The server holds other changes under this device's seqs:
+            # this database was restored. Carry on as a new device.
+            device = new_device(path, device, pushed)
+            counts["new_device"] += 1
+            continue
+        counts.update(apply_changes(path, device, reply["changes"]))
+        # The server's acknowledgement, not what was sent: if it lost
+        # changes (say it was reset), they are sent again.
+        conn.execute(SET_STATE_SQL, ("pushed", str(reply["acked"])))
+        counts.update(sent=len(outgoing), received=len(reply["changes"]))
+        last = outgoing[-1]["seq"] if outgoing else pushed
+        if len(outgoing) < batch_size and not reply["more"] and reply["acked"] >= last:
+            break
+    counts["seconds"] = time.perf_counter() - start
+    return counts
+
+
+def sync_all(url, space=DEFAULT_SPACE, batch_size=BATCH_SIZE):
+    """Sync the deck and the score history with the devices sharing `space`; returns {database: counters}."""
+    if not SPACE_NAME.fullmatch(space):
+        raise ValueError("The space name may only contain letters, digits, - and _.")
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    return {name: sync_database(url, f"{space}.{name}", path(), batch_size) for name, path in DATABASES.items()}
+
+
+def sync_status():
+    """{database: {"device", "pending", "vector"}} for this device."""
+    flashcard_db.init_db()
+    score_logger.init_score_db()
+    status = {}
+    for name, path in DATABASES.items():
+        conn = get_connection(path())
+        status[name] = {
+            "device": _state(conn, "device"),
+            "pending": conn.execute(COUNT_PENDING_SQL, (int(_state(conn, "pushed", 0)),)).fetchone()[0],
+            "vector": json.loads(_state(conn, "vector", "{}")),
+        }
+    return status
+
+
+def _size(n):
+    if n >= 2 ** 20:
+        return f"{n / 2 ** 20:,.1f} MB"
+    return f"{n / 1024:,.1f} KB" if n >= 1024 else f"{n} B"
+
+
+def print_counts(name, c):
+    changes = c["sent"] + c["received"]
+    rate = changes / c["seconds"] if c["seconds"] else 0
+    print(f"🔄 {name}: ↑ {c['sent']:,} sent, ↓ {c['received']:,} received "
+          f"({c['applied']:,} applied, {c['merged']:,} merged, {c['lost']:,} fields lost to newer edits, "
+          f"{c['skipped']:,} skipped) in {c['seconds']:.2f}s: {rate:,.0f} changes/sec, "
+          f"{_size(c['bytes_sent'])} ↑ {_size(c['bytes_received'])} ↓")
+    if c["new_device"]:
+        print(f"   ⚠️ This {name} database was behind the server (restored from a backup?) "
+              f"and now syncs as a new device.")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py sync", description="Sync decks and scores between devices.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run = commands.add_parser("run", help="exchange changes with a sync server")
+    run.add_argument("url", help="server address, e.g. http://127.0.0.1:8766")
+    run.add_argument("--space", default=DEFAULT_SPACE, help="name shared by the devices that sync together")
+    run.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="changes per request")
+    run.add_argument("--json", action="store_true", help="print the counters as JSON")
+    commands.add_parser("status", help="show this device's id and unsent changes")
+    # The server parses its own options.
+    commands.add_parser("serve", help="run the reference sync server", add_help=False)
+    args, rest = parser.parse_known_args(argv)
+
+    if args.command == "serve":
+        import sync_server
+        sync_server.main(rest)
+        return
+    if rest:
+        parser.error(f"unrecognized arguments: {' '.join(rest)}")
+    if args.command == "status":
+        for name, status in sync_status().items():
+            print(f"📱 {name}: device {status['device']}, {status['pending']:,} changes not sent yet, "
+                  f"seen {len(status['vector'])} other device(s)")
+        return
+    try:
+        results = sync_all(args.url, args.space, args.batch_size)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        parser.exit(1, f"❌ Sync failed: {e}\n")
+    if args.json:
+        print(json.dumps(results))
+    else:
+        for name, counts in results.items():
+            print_counts(name, counts)
+
+
+# Call counts and latencies when instrumentation is on; see perf.py.
+perf.instrument(globals(), exclude=("print_counts", "ChangeApplier.apply"))
+
+if __name__ == "__main__":
+    main()
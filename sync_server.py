@@ -0,0 +1,215 @@
+"""
+Reference sync server for sync.py.
+
+A relay: it keeps the changes each device pushes, per stream and in
+arrival order, in SERVER_DB, and hands every device the other devices'
+changes its sync vector does not cover yet. It never looks inside a
+change; devices resolve conflicts themselves, all the same way. Bodies
+are gzip-compressed JSON both ways.
+
+  POST /sync/<stream>   {device, vector, limit, changes}  ->  {acked, diverged, more, changes}
+  GET  /status          devices per stream with their last seq
+
+Arrival order matters: a device only edits a row after receiving it, so
+handing out changes in the order they arrived never delivers an edit
+before the row it edits. Pushes are idempotent (a change is stored once
+per device and seq), and "acked" tells the device how far it has got.
+A push that resends a seq with a different change (the device's
+database was restored from a backup) is refused with "diverged", and
+the device carries on under a new id (see sync.py).
+
+It runs on http.server from the standard library with SQLite work on
+DB_WORKERS threads, which suits local tests and a handful of devices.
+
+Usage:
+    python main.py sync serve [--host 127.0.0.1] [--port 8766] [--db sync_server.db]
+"""
+import argparse
+import gzip
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from database import get_connection, transaction
+from migrations import migrate, SYNC_SERVER_MIGRATIONS
+
+HOST = "127.0.0.1"
+PORT = 8766
+SERVER_DB = "sync_server.db"
+DB_WORKERS = 4
+MAX_BODY = 64 * 1024 * 1024
+MAX_LIMIT = 10000      # changes per reply
+SCAN_ROWS = 5000       # rows read per step while collecting a reply
+
+STREAM_PATH = re.compile(r"/sync/([\w.-]+)/?")
+
+INSERT_CHANGE_SQL = "INSERT OR IGNORE INTO changes (stream, device, seq, change) VALUES (?, ?, ?, ?)"
+UPSERT_DEVICE_SQL = """
+    INSERT INTO devices (stream, device, last_seq, last_seen) VALUES (?, ?, ?, ?)
+    ON CONFLICT (stream, device) DO UPDATE SET
+        last_seq = max(last_seq, excluded.last_seq), last_seen = excluded.last_seen
+"""
+SELECT_LAST_SEQ_SQL = "SELECT last_seq FROM devices WHERE stream = ? AND device = ?"
+SELECT_STORED_SQL = "SELECT seq, change FROM changes WHERE stream = ? AND device = ? AND seq BETWEEN ? AND ?"
+SELECT_DEVICES_SQL = "SELECT device, last_seq FROM devices WHERE stream = ?"
+FIRST_UNSEEN_SQL = "SELECT id FROM changes WHERE stream = ? AND device = ? AND seq > ? ORDER BY seq LIMIT 1"
+SELECT_CHANGES_SQL = "SELECT id, device, seq, change FROM changes WHERE stream = ? AND id >= ? ORDER BY id LIMIT ?"
+SELECT_STATUS_SQL = "SELECT stream, device, last_seq, last_seen FROM devices ORDER BY stream, device"
+
+
+def _diverged(conn, stream, device, changes):
+    """True if any of `changes` has a seq already stored with a different change."""
+    row = conn.execute(SELECT_LAST_SEQ_SQL, (stream, device)).fetchone()
+    resent = {change["seq"]: change for change in changes if row and change["seq"] <= row[0]}
+    if not resent:
+        return False
+    stored = conn.execute(SELECT_STORED_SQL, (stream, device, min(resent), max(resent)))
+    return any(seq in resent and json.loads(change)["stamp"] != resent[seq]["stamp"] for seq, change in stored)
+
+
+def store_changes(path, stream, device, changes):
+    """
+    Keep a device's pushed changes; returns (the last seq stored for it,
+    whether the push was refused because it diverged from what is stored).
+    """
+    with transaction(path) as conn:
+        diverged = _diverged(conn, stream, device, changes)
+        if not diverged:
+            conn.executemany(INSERT_CHANGE_SQL, [
+                (stream, device, change["seq"], json.dumps(change, separators=(",", ":"))) for change in changes])
+        last = 0 if diverged else max((change["seq"] for change in changes), default=0)
+        conn.execute(UPSERT_DEVICE_SQL, (stream, device, last, time.time()))
+        return conn.execute(SELECT_LAST_SEQ_SQL, (stream, device)).fetchone()[0], diverged
+
+
+def changes_for(path, stream, device, vector, limit):
+    """
+    The other devices' changes that `vector` does not cover, in arrival
+    order, as stored JSON: (up to `limit` changes, whether there are more).
+    """
+    conn = get_connection(path)
+    starts = []
+    for other, last_seq in conn.execute(SELECT_DEVICES_SQL, (stream,)).fetchall():
+        if other != device and last_seq > vector.get(other, 0):
+            starts.append(conn.execute(FIRST_UNSEEN_SQL, (stream, other, vector.get(other, 0))).fetchone()[0])
+    if not starts:
+        return [], False
+    found, position = [], min(starts)
+    while len(found) <= limit:
+        rows = conn.execute(SELECT_CHANGES_SQL, (stream, position, SCAN_ROWS)).fetchall()
+        found += [change for _, other, seq, change in rows if other != device and seq > vector.get(other, 0)]
+        if len(rows) < SCAN_ROWS:
+            break
+        position = rows[-1][0] + 1
+    return found[:limit], len(found) > limit
+
+
+def exchange(path, stream, request):
+    """Handle one sync request; returns the reply body (uncompressed JSON bytes)."""
+    device = str(request["device"])
+    vector = {str(other): int(seq) for other, seq in (request.get("vector") or {}).items()}
+    limit = max(1, min(int(request.get("limit") or MAX_LIMIT), MAX_LIMIT))
+    changes = list(request.get("changes") or [])
+    for change in changes:
+        change["device"] = device  # a device only speaks for itself
+        change["seq"] = int(change["seq"])
+    acked, diverged = store_changes(path, stream, device, changes)
+    found, more = ([], False) if diverged else changes_for(path, stream, device, vector, limit)
+    # The stored changes are JSON already: splice them in without parsing them.
+    return (f'{{"acked":{acked},"diverged":{json.dumps(diverged)},"more":{json.dumps(more)},'
+            f'"changes":[{",".join(found)}]}}').encode("utf-8")
+
+
+class SyncHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FlashcardSync/1"
+
+    def do_POST(self):
+        match = STREAM_PATH.fullmatch(self.path)
+        if match is None:
+            return self._send(HTTPStatus.NOT_FOUND, {"error": "Not Found"})
+        try:
+            request = self._read_json()
+            body = self.server.db(exchange, match.group(1), request)
+        except (KeyError, TypeError, ValueError, AttributeError, OSError) as e:
+            return self._send(HTTPStatus.BAD_REQUEST, {"error": f"Bad sync request: {e}"})
+        self._send(HTTPStatus.OK, body=body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") != "/status":
+            return self._send(HTTPStatus.NOT_FOUND, {"error": "Not Found"})
+        rows = self.server.db(lambda path: get_connection(path).execute(SELECT_STATUS_SQL).fetchall())
+        streams = {}
+        for stream, device, last_seq, last_seen in rows:
+            streams.setdefault(stream, []).append({"device": device, "last_seq": last_seq, "last_seen": last_seen})
+        self._send(HTTPStatus.OK, {"streams": streams})
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_BODY:
+            raise ValueError("body too large")
+        body = self.rfile.read(length)
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        request = json.loads(body or b"{}")
+        if not isinstance(request, dict):
+            raise ValueError("body must be a JSON object")
+        return request
+
+    def _send(self, status, payload=None, body=None):
+        if body is None:
+            body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        if "gzip" in self.headers.get("Accept-Encoding", ""):
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # one line per request drowns the console during a sync
+
+
+class SyncServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, path=SERVER_DB, workers=DB_WORKERS):
+        super().__init__(address, SyncHandler)
+        self.path = path
+        self.pool = ThreadPoolExecutor(workers, thread_name_prefix="sync-db")
+        migrate(path, SYNC_SERVER_MIGRATIONS)
+
+    def db(self, fn, *args):
+        """Run fn(database path, *args) on the DB worker pool and wait for it."""
+        return self.pool.submit(fn, self.path, *args).result()
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="main.py sync serve", description="Run the reference sync server.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT, help="0 picks a free port")
+    parser.add_argument("--db", default=SERVER_DB, help="where to keep the relayed changes")
+    parser.add_argument("--workers", type=int, default=DB_WORKERS, help="database worker threads")
+    args = parser.parse_args(argv)
+
+    server = SyncServer((args.host, args.port), args.db, args.workers)
+    print(f"🔄 Sync server on http://{args.host}:{server.server_address[1]} (Ctrl+C to stop)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,32 @@
+"""Answer grading: symbols that carry meaning are not punctuation."""
+import pytest
+
+from grading import check_answer
+
+
+@pytest.mark.parametrize("expected, given", [
+    ("C", "C++"),
+    ("C", "C#"),
+    ("23", "2^3"),
+    ("1230", "12:30"),
+    ("5", "5%"),
+    ("x = 2", "x2"),
+    ("World War 3", "World War 2"),
+    ("x = 0.5, x = -3", "x = 0.5, x = -2"),
+])
+def test_rejects(expected, given):
+    assert not check_answer(expected, given)
+
+
+@pytest.mark.parametrize("expected, given", [
+    ("Paris", '"Paris!"'),
+    ("Paris", "(paris)."),
+    ("Yes", "yes?"),
+    ("C++", "c++"),
+    ("12:30", "12:30"),
+    ("x = 0.5, x = -3", "x=0.5, x=-3"),
+    ("fifteen", "15"),
+    ("Photosynthesis", "photosynthesys"),
+])
+def test_accepts(expected, given):
+    assert check_answer(expected, given)
@@ -0,0 +1,108 @@
+"""
+Attachment thumbnails for the Tk GUI.
+
+ThumbnailCache keeps the last THUMBNAIL_CACHE_SIZE decoded thumbnails,
+one per (card, side), with the side's attachment list. On a miss the
+attachments are looked up and the first image's bytes read on a GUI
+worker (see background.py); only the decoding happens on the Tk thread,
+as Tk requires. Windows prefetch() the card after the one shown, so its
+thumbnail is usually ready by the time it is needed.
+
+Tk decodes PNG and GIF itself. If Pillow is installed other formats
+(JPEG, WebP, ...) work too, and images are shrunk on the worker so only
+the thumbnail's pixels ever reach Tk.
+"""
+import base64
+import io
+import tkinter as tk
+from collections import OrderedDict
+
+import attachments
+from background import run_async
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+THUMBNAIL_SIZE = 160        # longest side in pixels
+THUMBNAIL_CACHE_SIZE = 64   # decoded thumbnails kept
+
+
+def load_media(card_id, side, size=THUMBNAIL_SIZE):
+    """Worker half of a miss: (the side's attachments, bytes of its first image or None)."""
+    media = attachments.list_attachments(card_id, side)
+    image = next((a for a in media if a["kind"] == "image"), None)
+    if image is None:
+        return media, None
+    data = attachments.read_attachment(image["id"])
+    if Image is None:
+        return media, data
+    try:
+        with Image.open(io.BytesIO(data)) as picture:
+            picture.thumbnail((size, size))
+            out = io.BytesIO()
+            picture.save(out, "PNG")
+    except (OSError, ValueError):
+        return media, None
+    return media, out.getvalue()
+
+
+def _decode(data, size):
+    try:
+        image = tk.PhotoImage(data=base64.b64encode(data).decode("ascii"))
+    except tk.TclError:
+        return None  # a format Tk cannot read without Pillow
+    factor = -(-max(image.width(), image.height()) // size)
+    return image.subsample(factor) if factor > 1 else image
+
+
+class ThumbnailCache:
+    """LRU of (attachments, PhotoImage or None) per (card id, side); use it from the Tk thread."""
+
+    def __init__(self, capacity=THUMBNAIL_CACHE_SIZE, size=THUMBNAIL_SIZE):
+        self.capacity = capacity
+        self.size = size
+        self.hits = self.misses = 0
+        self._entries = OrderedDict()
+        self._waiting = {}  # key -> on_ready callbacks of a load in flight
+
+    def get(self, card_id, side="question", on_ready=None):
+        """
+        Call on_ready(attachments, image) with the side's attachment list
+        and thumbnail (None if it has no image it can show): at once on
+        a hit, from the Tk loop once loaded on a miss.
+        """
+        key = (card_id, side)
+        if key in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if on_ready is not None:
+                on_ready(*self._entries[key])
+            return
+        callbacks = self._waiting.get(key)
+        if callbacks is None:
+            self.misses += 1
+            callbacks = self._waiting[key] = []
+            run_async(load_media, card_id, side, self.size,
+                      on_success=lambda result: self._loaded(key, *result),
+                      on_error=lambda error: self._loaded(key, [], None))
+        if on_ready is not None:
+            callbacks.append(on_ready)
+
+    def prefetch(self, card_id, side="question"):
+        """Start loading a thumbnail that will probably be shown next."""
+        self.get(card_id, side)
+
+    def discard(self, card_id):
+        """Forget a card's thumbnails, e.g. after attaching a file to it."""
+        for key in [key for key in self._entries if key[0] == card_id]:
+            del self._entries[key]
+
+    def _loaded(self, key, media, data):
+        image = _decode(data, self.size) if data else None
+        self._entries[key] = (media, image)
+        while len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+        for on_ready in self._waiting.pop(key, []):
+            on_ready(media, image)